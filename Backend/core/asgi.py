@@ -1,7 +1,11 @@
 """
 ASGI config for core project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
+Solo sirve el stream de progreso (SSE, /api/videos/events/), que
+mantiene conexiones abiertas. El resto de la API corre en WSGI
+(core.wsgi): Django ASGI guarda el cuerpo entero de cada request en un
+archivo temporal antes de llamar a la vista, así que una subida por acá
+se escribiría dos veces en disco (ver videos.uploads.SpoolUploadHandler).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -13,4 +17,23 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.urls import reverse  # noqa: E402 (después de django.setup())
+
+EVENTS_PATH = reverse("videos:events")
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] != EVENTS_PATH:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 404,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"Not Found"})
+        return
+
+    await django_application(scope, receive, send)
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import socket
 import dj_database_url
 from dotenv import load_dotenv
 import cloudinary
@@ -10,6 +11,8 @@ cloudinary.config(
     cloud_name=os.getenv("CLOUD_NAME"),
     api_key=os.getenv("API_KEY"),
     api_secret=os.getenv("API_SECRET"),
+    # Permite apuntar a un servidor local que imite la API (pruebas)
+    upload_prefix=os.getenv("CLOUDINARY_UPLOAD_PREFIX"),
 )
 
 # ===========================
@@ -134,9 +137,22 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Dónde quedan los videos procesados y las imágenes de perfil:
+# cloudinary | local (videos/storage.py). En local todo va a MEDIA_ROOT
+# y Django lo sirve en /media/ (con Range)
+MEDIA_STORE = os.getenv("MEDIA_STORE", "cloudinary")
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))
+# Con nginx delante: location internal que apunta a MEDIA_ROOT. Django
+# responde con X-Accel-Redirect y nginx entrega el archivo
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "")
+
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": (
+            "django.core.files.storage.FileSystemStorage"
+            if MEDIA_STORE == "local"
+            else "cloudinary_storage.storage.MediaCloudinaryStorage"
+        ),
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -148,7 +164,12 @@ CLOUDINARY_STORAGE = {
     "API_KEY": os.getenv("API_KEY"),
     "API_SECRET": os.getenv("API_SECRET"),
 }
-MEDIA_URL = "/verticalia/"
+if MEDIA_STORE == "local":
+    # Absoluta: es la que queda en file_url y cover_url de la base
+    MEDIA_URL = os.getenv("MEDIA_URL", "http://localhost:8000/media/")
+else:
+    MEDIA_URL = "/verticalia/"
+
 # ===========================
 # CELERY
 # ===========================
@@ -160,6 +181,166 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_BACKEND = "django-db"
 CELERY_RESULT_EXTENDED = True
 
+# celery beat: drena el outbox de operaciones sobre el almacenamiento
+# aunque se pierda el aviso que se encola al hacer commit
+MEDIA_OUTBOX_INTERVAL = int(os.getenv("MEDIA_OUTBOX_INTERVAL", "60"))
+# y descarta las subidas por partes vencidas
+VIDEO_UPLOAD_CLEANUP_INTERVAL = int(os.getenv("VIDEO_UPLOAD_CLEANUP_INTERVAL", "900"))
+CELERY_BEAT_SCHEDULE = {
+    "dispatch-media-operations": {
+        "task": "videos.outbox.dispatch_media_operations",
+        "schedule": MEDIA_OUTBOX_INTERVAL,
+    },
+    "expire-upload-sessions": {
+        "task": "videos.uploads.expire_upload_sessions",
+        "schedule": VIDEO_UPLOAD_CLEANUP_INTERVAL,
+    },
+}
+
+# ===========================
+# CACHE
+# ===========================
+# Progreso en vivo del procesamiento (videos/progress.py). El mismo
+# Redis lleva los eventos del stream /api/videos/events/ (pub/sub)
+CACHE_URL = os.getenv("CACHE_URL", CELERY_BROKER_URL)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_URL,
+        "KEY_PREFIX": "verticalia",
+    }
+}
+
+# ===========================
+# PROCESAMIENTO DE VIDEO
+# ===========================
+# auto | sequential | parallel | single_pass
+SHORTS_RENDER_MODE = os.getenv("SHORTS_RENDER_MODE", "auto")
+# En modo auto se usa single_pass si los clips cubren al menos
+# esta fracción del rango del original que hay que decodificar
+SHORTS_SINGLE_PASS_MIN_COVERAGE = float(
+    os.getenv("SHORTS_SINGLE_PASS_MIN_COVERAGE", "0.5")
+)
+# Elegir los clips por cortes de escena y volumen (si no, cortes fijos)
+SHORTS_HIGHLIGHTS = os.getenv("SHORTS_HIGHLIGHTS", "True") == "True"
+# Tiempo máximo del análisis: RATIO segundos por segundo de clip a
+# renderizar (crece con lo que cuesta el encode), y nunca menos de
+# BUDGET segundos. Pasado eso se usan los cortes fijos
+SHORTS_HIGHLIGHT_BUDGET = float(os.getenv("SHORTS_HIGHLIGHT_BUDGET", "20"))
+SHORTS_HIGHLIGHT_BUDGET_RATIO = float(os.getenv("SHORTS_HIGHLIGHT_BUDGET_RATIO", "0.5"))
+# Máximo de ffmpeg simultáneos en modo parallel (0 = uno por core)
+SHORTS_RENDER_WORKERS = int(os.getenv("SHORTS_RENDER_WORKERS", "0"))
+# Repartir cada short en su propia task de Celery (chord).
+# Sin spool compartido las tasks del chord van a la cola del nodo
+VIDEO_PIPELINE_FANOUT = os.getenv("VIDEO_PIPELINE_FANOUT", "False") == "True"
+# Sin fan-out el original se sube mientras se renderiza; segundos que
+# finalize_video_task espera esa subida antes de dar el video por fallido
+VIDEO_PIPELINE_JOIN_TIMEOUT = int(os.getenv("VIDEO_PIPELINE_JOIN_TIMEOUT", "3600"))
+# Subidas simultáneas a Cloudinary por video
+CLOUDINARY_UPLOAD_WORKERS = int(os.getenv("CLOUDINARY_UPLOAD_WORKERS", "4"))
+# Archivos más grandes que esto se suben por partes, con checkpoint
+CLOUDINARY_LARGE_UPLOAD_THRESHOLD = int(
+    os.getenv("CLOUDINARY_LARGE_UPLOAD_THRESHOLD", str(100 * 1024 * 1024))
+)
+CLOUDINARY_UPLOAD_CHUNK_SIZE = int(
+    os.getenv("CLOUDINARY_UPLOAD_CHUNK_SIZE", str(20 * 1024 * 1024))
+)
+# Reintentos inmediatos por parte antes de cortar y reintentar la task
+CLOUDINARY_UPLOAD_PART_ATTEMPTS = int(os.getenv("CLOUDINARY_UPLOAD_PART_ATTEMPTS", "3"))
+# Reintentos automáticos de process_video_task y render_short_task ante
+# errores transitorios; cada reintento retoma desde la última etapa completa
+# (ProcessingJob.checkpoint)
+VIDEO_PROCESSING_MAX_RETRIES = int(os.getenv("VIDEO_PROCESSING_MAX_RETRIES", "3"))
+VIDEO_PROCESSING_RETRY_DELAY = int(os.getenv("VIDEO_PROCESSING_RETRY_DELAY", "30"))
+# Reintentos de publish_original_task y publish_short_task cuando falla una subida
+CLOUDINARY_UPLOAD_MAX_RETRIES = int(os.getenv("CLOUDINARY_UPLOAD_MAX_RETRIES", "3"))
+CLOUDINARY_UPLOAD_RETRY_DELAY = int(os.getenv("CLOUDINARY_UPLOAD_RETRY_DELAY", "30"))
+# Outbox de borrados (videos/outbox.py): reintentos con backoff si
+# falla el almacenamiento y cuántas operaciones se mandan por lote
+MEDIA_DELETE_MAX_RETRIES = int(os.getenv("MEDIA_DELETE_MAX_RETRIES", "5"))
+MEDIA_DELETE_RETRY_DELAY = int(os.getenv("MEDIA_DELETE_RETRY_DELAY", "30"))
+MEDIA_OUTBOX_BATCH_SIZE = int(os.getenv("MEDIA_OUTBOX_BATCH_SIZE", "100"))
+# Segundos que una subida reservada puede tardar en quedar registrada;
+# vencido ese plazo se da por huérfana y se borra
+MEDIA_OUTBOX_UPLOAD_LEASE = int(os.getenv("MEDIA_OUTBOX_UPLOAD_LEASE", str(6 * 3600)))
+
+# Subida por partes desde el cliente (/api/videos/uploads/)
+VIDEO_UPLOAD_CHUNK_SIZE = int(os.getenv("VIDEO_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+VIDEO_UPLOAD_MAX_CHUNK_SIZE = int(
+    os.getenv("VIDEO_UPLOAD_MAX_CHUNK_SIZE", str(32 * 1024 * 1024))
+)
+# Segundos sin partes nuevas tras los que una sesión se descarta (y se
+# borra su archivo del spool), y sesiones abiertas por usuario
+VIDEO_UPLOAD_SESSION_TTL = int(os.getenv("VIDEO_UPLOAD_SESSION_TTL", str(24 * 3600)))
+VIDEO_UPLOAD_MAX_OPEN_SESSIONS = int(os.getenv("VIDEO_UPLOAD_MAX_OPEN_SESSIONS", "3"))
+# Spool (temp/) entre nodos
+# True si web y workers comparten temp/ (docker-compose con volumen)
+SPOOL_SHARED = os.getenv("SPOOL_SHARED", "True") == "True"
+# Nombre de este nodo; sus workers consumen además la cola spool.<nombre>
+SPOOL_NODE_NAME = os.getenv("SPOOL_NODE_NAME", socket.gethostname())
+# Cómo llegan los otros nodos al web de un nodo ({node} = su nombre)
+SPOOL_NODE_URL = os.getenv("SPOOL_NODE_URL", "http://{node}:8000")
+# El web encola en spool.<nodo> porque hay un worker en el mismo host.
+# Si no, encola en la cola por defecto y el worker baja el archivo
+SPOOL_HOST_ROUTING = os.getenv("SPOOL_HOST_ROUTING", "False") == "True"
+
+# Segundos que dura en cache el estado publicado de un video
+VIDEO_PROGRESS_TTL = int(os.getenv("VIDEO_PROGRESS_TTL", "3600"))
+# Stream de eventos (SSE): segundos por conexión antes de pedir al
+# cliente que reconecte, y cada cuánto mandar un keepalive
+VIDEO_EVENTS_MAX_SECONDS = int(os.getenv("VIDEO_EVENTS_MAX_SECONDS", "300"))
+VIDEO_EVENTS_KEEPALIVE = int(os.getenv("VIDEO_EVENTS_KEEPALIVE", "15"))
+# El stream corre en un proceso ASGI aparte (core.asgi): su URL pública
+# y los segundos que vale el token firmado de ?token= para abrirlo
+VIDEO_EVENTS_URL = os.getenv(
+    "VIDEO_EVENTS_URL", "http://localhost:8001/api/videos/events/"
+)
+VIDEO_EVENTS_TOKEN_TTL = int(os.getenv("VIDEO_EVENTS_TOKEN_TTL", "600"))
+
+# Token que Prometheus manda como "Authorization: Bearer" a /metrics/
+# (vacío = sin autenticación)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Validez (segundos) de los tickets de subida directa a Cloudinary.
+# Cloudinary rechaza firmas de más de 1 hora
+VIDEO_DIRECT_UPLOAD_TTL = int(os.getenv("VIDEO_DIRECT_UPLOAD_TTL", "3600"))
+
+# ===========================
+# COLAS DE CELERY
+# ===========================
+# pipeline: metadata y plan de clips. Sin VIDEO_PIPELINE_FANOUT también
+#           el render de todos los shorts (process_video_task).
+# render:   ffmpeg de a un short (render_short_task, con fan-out).
+# publish:  subidas, borrados y outbox (I/O). Cola por defecto. Ninguna
+#           subida ocupa un worker de pipeline o de render.
+# Cada cola tiene su propio worker, dimensionado aparte (docker-compose).
+# Sin spool compartido las tasks de un video van a spool.<nodo>
+CELERY_TASK_DEFAULT_QUEUE = "publish"
+CELERY_TASK_ROUTES = {
+    "videos.services.process_video_task": {"queue": "pipeline"},
+    "videos.services.render_short_task": {"queue": "render"},
+    "videos.services.publish_original_task": {"queue": "publish"},
+    "videos.services.publish_short_task": {"queue": "publish"},
+    "videos.services.finalize_video_task": {"queue": "publish"},
+    "videos.services.fail_video_pipeline_task": {"queue": "publish"},
+    "videos.services.purge_video_task": {"queue": "publish"},
+    "shorts.services.purge_short_task": {"queue": "publish"},
+    "videos.outbox.dispatch_media_operations": {"queue": "publish"},
+}
+# El mensaje se confirma al terminar la task: si el worker muere (ej.
+# OOM en un render) vuelve a la cola y el pipeline retoma del checkpoint
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+# Cada proceso reserva una sola task: un render o una subida larga no
+# deja otras esperando detrás en el mismo worker
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Redis reentrega las tasks sin confirmar pasado este tiempo: tiene que
+# superar a la task más larga, incluida la espera de sus reintentos
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "visibility_timeout": int(os.getenv("CELERY_VISIBILITY_TIMEOUT", str(6 * 3600))),
+}
+
 # ===========================
 # REST FRAMEWORK
 # ===========================
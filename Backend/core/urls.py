@@ -3,7 +3,9 @@ from django.urls import path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from django.conf import settings
 from django.http import HttpResponse
+from videos.views import serve_media, upload_media, video_metrics
 
 # Swagger schema view
 schema_view = get_schema_view(
@@ -49,4 +51,14 @@ urlpatterns = [
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
     # 🔹 Health check para Render
     path("health/", health, name="health"),
+    # 📈 Métricas para Prometheus
+    path("metrics/", video_metrics, name="metrics"),
 ]
+
+if settings.MEDIA_STORE == "local":
+    # MEDIA_URL tiene que terminar en /media/ (o un proxy servir MEDIA_ROOT)
+    urlpatterns += [
+        # subida directa (PUT a la URL firmada del ticket)
+        path("media-upload/<str:token>", upload_media, name="media-upload"),
+        path("media/<path:path>", serve_media, name="media"),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shorts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='short',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -38,6 +38,8 @@ class Short(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Borrado pendiente: ver services.delete_short
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     # Si se borra el Video → se borran los Shorts
     video = models.ForeignKey(
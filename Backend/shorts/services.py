@@ -1,44 +1,52 @@
 import logging
-import cloudinary.uploader
+from celery import shared_task
 from django.db import transaction
+from django.utils import timezone
+
+from .models import Short
+from videos.outbox import enqueue_destroy
+from videos.services import is_shared_asset
 
 logger = logging.getLogger(__name__)
 
 
 def delete_short(short):
     """
-    Borra un Short y su cover en Cloudinary y luego la base de datos.
+    Marca el Short como borrado y encola purge_short_task, que borra la
+    fila y deja el video y el cover en el outbox del almacenamiento.
     NO toca el Video original.
     """
-    try:
-        with transaction.atomic():
-            # 🔹 Borrar video del Short
-            if short.cloudinary_public_id:
-                try:
-                    cloudinary.uploader.destroy(
-                        short.cloudinary_public_id, resource_type="video"
-                    )
-                    logger.info(
-                        f"Short video Cloudinary borrado: {short.cloudinary_public_id}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error borrando video short {short.id}: {str(e)}")
-
-            # 🔹 Borrar cover del Short
-            if short.cover_cloudinary_public_id:
-                try:
-                    cloudinary.uploader.destroy(
-                        short.cover_cloudinary_public_id, resource_type="image"
-                    )
-                    logger.info(
-                        f"Short cover Cloudinary borrado: {short.cover_cloudinary_public_id}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error borrando cover short {short.id}: {str(e)}")
-
-            # 🔹 Borrar registro en la DB
-            short.delete()
-            logger.info(f"Short {short.id} eliminado de la base de datos")
-    except Exception as e:
-        logger.error(f"Error eliminando short {short.id}: {str(e)}")
-        raise
+    with transaction.atomic():
+        Short.objects.filter(id=short.id).update(deleted_at=timezone.now())
+        transaction.on_commit(lambda: purge_short_task.delay(short.id))
+
+
+@shared_task
+def purge_short_task(short_id):
+    """
+    Encola los assets del Short (si ningún otro Short los usa, por un
+    video deduplicado) y borra la fila, en la misma transacción.
+    """
+    short = Short.objects.filter(id=short_id, deleted_at__isnull=False).first()
+    if short is None:
+        return
+
+    assets = {"video": [], "image": []}
+    if short.cloudinary_public_id and not is_shared_asset(
+        Short, "cloudinary_public_id", short.cloudinary_public_id, {"id": short.id}
+    ):
+        assets["video"].append(short.cloudinary_public_id)
+
+    if short.cover_cloudinary_public_id and not is_shared_asset(
+        Short,
+        "cover_cloudinary_public_id",
+        short.cover_cloudinary_public_id,
+        {"id": short.id},
+    ):
+        assets["image"].append(short.cover_cloudinary_public_id)
+
+    with transaction.atomic():
+        enqueue_destroy(assets)
+        short.delete()
+
+    logger.info(f"Short {short_id} eliminado de la base de datos")
@@ -1,5 +1,4 @@
 import logging
-from cloudinary.uploader import destroy
 
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
@@ -43,9 +42,9 @@ class ShortViewSet(viewsets.ModelViewSet):
         if getattr(self, "swagger_fake_view", False):
             return Short.objects.none()
 
-        return Short.objects.filter(video__user=self.request.user).select_related(
-            "video"
-        )
+        return Short.objects.filter(
+            video__user=self.request.user, deleted_at__isnull=True
+        ).select_related("video")
 
     # -----------------------------
     # LIST
@@ -74,19 +73,19 @@ class ShortViewSet(viewsets.ModelViewSet):
     # -----------------------------
     @swagger_auto_schema(
         operation_summary="Eliminar short",
-        operation_description="Elimina el short y sus recursos asociados en Cloudinary (video y cover).",
-        responses={204: openapi.Response(description="Short eliminado correctamente")},
+        operation_description=(
+            "Marca el short como eliminado y borra en segundo plano sus "
+            "recursos (video y cover) y el registro."
+        ),
+        responses={202: MessageSerializer},
     )
     def destroy(self, request, *args, **kwargs):
         short = self.get_object()
-        try:
-            delete_short(short)
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        except Exception as e:
-            return Response(
-                MessageSerializer({"detail": "Error eliminando short"}).data,
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        delete_short(short)
+        return Response(
+            MessageSerializer({"detail": "Short en proceso de eliminación"}).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
 
     # -----------------------------
     # LISTAR SHORTS POR VIDEO
@@ -114,7 +113,9 @@ class ShortViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        video = get_object_or_404(Video, id=video_id, user=request.user)
+        video = get_object_or_404(
+            Video, id=video_id, user=request.user, deleted_at__isnull=True
+        )
         shorts = self.get_queryset().filter(video=video)
 
         serializer = ShortSerializer(shorts, many=True)
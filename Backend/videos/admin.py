@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Video, ProcessingJob
+from .models import MediaOperation, Video, ProcessingJob
 
 
 # Permite ver los jobs asociados directamente dentro del Video
@@ -43,6 +43,7 @@ class VideoAdmin(admin.ModelAdmin):
     readonly_fields = (
         "created_at",
         "generated_shorts_count",
+        "content_hash",
     )
     # Valores automáticos para evitar cambios manuales.
 
@@ -85,3 +86,29 @@ class ProcessingJobAdmin(admin.ModelAdmin):
 
     list_select_related = ("video",)
     # Evita queries extra al traer el video relacionado.
+
+
+@admin.register(MediaOperation)
+class MediaOperationAdmin(admin.ModelAdmin):
+
+    list_display = (
+        "id",
+        "action",
+        "status",
+        "resource_type",
+        "public_id",
+        "attempts",
+        "available_at",
+    )
+
+    list_filter = (
+        "action",
+        "status",
+        "resource_type",
+    )
+
+    search_fields = ("public_id",)
+
+    readonly_fields = ("created_at",)
+
+    ordering = ("available_at",)
@@ -0,0 +1,328 @@
+import email.parser
+import email.policy
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cloudinary
+from django.db import connections
+from django.test.utils import override_settings
+
+# Benchmark del pipeline (manage.py benchmark_pipeline): videos
+# sintéticos generados con lavfi, cada caso medido en un proceso aparte
+# y Cloudinary reemplazado por un servidor HTTP local (o por el
+# almacenamiento en disco).
+
+
+# =========================================================
+# VIDEOS SINTÉTICOS
+# =========================================================
+def synthetic_video_name(width, height, duration, audio):
+    return f"testsrc2_{width}x{height}_{duration}s_{'audio' if audio else 'mute'}.mp4"
+
+
+def generate_synthetic_video(directory, width, height, duration, audio):
+    """
+    Genera (o reutiliza) un MP4 determinista: testsrc2 a 30 fps y, con
+    audio, un seno de 440 Hz con pitidos. Las flags bitexact hacen que
+    el mismo comando dé siempre el mismo archivo.
+    """
+    path = os.path.join(directory, synthetic_video_name(width, height, duration, audio))
+    if os.path.exists(path):
+        return path
+
+    command = [
+        "ffmpeg",
+        "-y",
+        "-v",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc2=size={width}x{height}:rate=30:duration={duration}",
+    ]
+    if audio:
+        command += [
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:beep_factor=4:sample_rate=48000:duration={duration}",
+        ]
+
+    command += ["-map", "0:v", "-c:v", "libx264", "-preset", "veryfast"]
+    command += ["-pix_fmt", "yuv420p", "-g", "60"]
+    if audio:
+        command += ["-map", "1:a", "-c:a", "aac", "-b:a", "128k"]
+    command += [
+        "-fflags",
+        "+bitexact",
+        "-flags:v",
+        "+bitexact",
+        "-flags:a",
+        "+bitexact",
+        "-map_metadata",
+        "-1",
+        # el nombre temporal no termina en .mp4: el formato va explícito
+        "-f",
+        "mp4",
+        path + ".part",
+    ]
+
+    subprocess.run(command, check=True)
+    os.replace(path + ".part", path)
+    return path
+
+
+# =========================================================
+# MEDICIÓN
+# =========================================================
+def _cpu_seconds(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+def _io_counters():
+    """
+    wchar (bytes pasados a write()) y write_bytes (bytes que llegaron al
+    disco) de este proceso y sus hijos ya terminados. Solo Linux.
+    """
+    try:
+        with open("/proc/self/io") as io_file:
+            counters = dict(line.split(": ") for line in io_file.read().splitlines())
+        return int(counters["wchar"]), int(counters["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _run_measured(func, connection):
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wchar_before, written_before = _io_counters()
+    started = time.perf_counter()
+
+    result = {"error": None, "extra": {}}
+    try:
+        result["extra"] = func() or {}
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    wall = time.perf_counter() - started
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wchar_after, written_after = _io_counters()
+
+    result.update(
+        {
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(
+                _cpu_seconds(self_after)
+                - _cpu_seconds(self_before)
+                + _cpu_seconds(children_after)
+                - _cpu_seconds(children_before),
+                3,
+            ),
+            # KiB en Linux; incluye a los ffmpeg que lanzó el caso
+            "peak_rss_kb": max(self_after.ru_maxrss, children_after.ru_maxrss),
+            "bytes_written": (
+                wchar_after - wchar_before if wchar_before is not None else None
+            ),
+            "disk_bytes_written": (
+                written_after - written_before if written_before is not None else None
+            ),
+        }
+    )
+    connections.close_all()
+    connection.send(result)
+    connection.close()
+
+
+def measure(func):
+    """
+    Corre func en un proceso hijo (fork) y devuelve wall time, CPU
+    (propio + ffmpeg), pico de RSS y bytes escritos solo de ese caso.
+    func puede devolver un dict con datos extra (ej. output_bytes).
+    """
+    # el hijo no puede compartir las conexiones a la base del padre
+    connections.close_all()
+
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_measured, args=(func, sender))
+    process.start()
+    sender.close()
+
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {"error": f"el proceso terminó con código {process.exitcode}"}
+    process.join()
+
+    extra = result.pop("extra", {})
+    return {**result, **extra}
+
+
+def files_size(*paths):
+    return sum(os.path.getsize(path) for path in paths if path and os.path.exists(path))
+
+
+def directory_size(directory):
+    return files_size(
+        *(
+            os.path.join(root, name)
+            for root, _, names in os.walk(directory)
+            for name in names
+        )
+    )
+
+
+# =========================================================
+# CLOUDINARY LOCAL
+# =========================================================
+class CloudinaryStandInHandler(BaseHTTPRequestHandler):
+    """
+    Imita lo que usa el pipeline de la API de Cloudinary: upload (entero
+    o por partes con Content-Range), destroy y el borrado en lote de la
+    Admin API. Guarda los archivos en server.store_dir.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _form(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+            + self.rfile.read(length)
+        )
+        form = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            form[name] = part.get_payload(decode=True)
+        return form
+
+    def _stored_path(self, public_id):
+        return os.path.join(self.server.store_dir, public_id.replace("/", "__"))
+
+    def do_POST(self):
+        match = re.search(r"/(image|video|raw)/(upload|destroy)$", self.path)
+        if not match:
+            return self._json(404, {"error": {"message": "Not found"}})
+
+        resource_type, action = match.groups()
+        form = self._form()
+        public_id = (form.get("public_id") or b"").decode()
+        folder = (form.get("folder") or b"").decode()
+        if folder:
+            public_id = f"{folder}/{public_id}"
+
+        if action == "destroy":
+            path = self._stored_path(public_id)
+            if os.path.exists(path):
+                os.unlink(path)
+            return self._json(200, {"result": "ok"})
+
+        data = form.get("file") or b""
+        path = self._stored_path(public_id)
+        content_range = self.headers.get("Content-Range")
+        offset = 0
+        if content_range:
+            offset = int(re.match(r"bytes (\d+)-", content_range).group(1))
+
+        with open(path, "r+b" if offset else "wb") as stored:
+            stored.seek(offset)
+            stored.write(data)
+
+        host, port = self.server.server_address[:2]
+        self._json(
+            200,
+            {
+                "public_id": public_id,
+                "resource_type": resource_type,
+                "bytes": os.path.getsize(path),
+                "secure_url": f"http://{host}:{port}/files/{public_id}",
+            },
+        )
+
+    def do_DELETE(self):
+        if not re.search(r"/resources/(image|video|raw)/upload$", self.path):
+            return self._json(404, {"error": {"message": "Not found"}})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        public_ids = json.loads(self.rfile.read(length) or b"{}").get("public_ids", [])
+        deleted = {}
+        for public_id in public_ids:
+            path = self._stored_path(public_id)
+            if os.path.exists(path):
+                os.unlink(path)
+                deleted[public_id] = "deleted"
+            else:
+                deleted[public_id] = "not_found"
+        self._json(200, {"deleted": deleted})
+
+
+@contextmanager
+def cloudinary_stand_in(store_dir):
+    """
+    Levanta el servidor en un puerto libre y apunta el SDK de Cloudinary
+    a él mientras dure el bloque.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CloudinaryStandInHandler)
+    server.store_dir = store_dir
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    config = cloudinary.config()
+    previous = {
+        key: getattr(config, key, None)
+        for key in ("cloud_name", "api_key", "api_secret", "upload_prefix")
+    }
+    cloudinary.config(
+        cloud_name="benchmark",
+        api_key="benchmark",
+        api_secret="benchmark",
+        upload_prefix=f"http://127.0.0.1:{server.server_address[1]}",
+    )
+
+    try:
+        yield server
+    finally:
+        cloudinary.config(**previous)
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+
+# =========================================================
+# ALMACENAMIENTO LOCAL
+# =========================================================
+@contextmanager
+def local_media_store(store_dir):
+    """
+    MEDIA_STORE=local con MEDIA_ROOT en store_dir mientras dure el bloque:
+    mide el pipeline sin ningún costo de red.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    try:
+        with override_settings(
+            MEDIA_STORE="local",
+            MEDIA_ROOT=store_dir,
+            MEDIA_URL="http://localhost:8000/media/",
+        ):
+            yield
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core import signing
+
+logger = logging.getLogger(__name__)
+
+# Eventos de progreso por usuario (Redis):
+# - version: contador que numera los eventos del usuario (id del SSE)
+# - latest: hash video_id -> último evento de cada video, para que un
+#   cliente que reconecta reciba lo que cambió mientras no estaba
+# - channel: pub/sub por el que salen los eventos en vivo
+EVENTS_VERSION_KEY = "videos:events:{}:version"
+EVENTS_LATEST_KEY = "videos:events:{}:latest"
+EVENTS_CHANNEL = "videos:events:{}"
+
+STREAM_TOKEN_SALT = "videos.events"
+
+# Numera, guarda y publica en un solo paso: dos tasks del mismo usuario
+# no pueden dejar como último estado (o publicar después) un evento con
+# versión menor. El payload llega sin cerrar la llave para sumarle la
+# versión sin decodificar el JSON en Redis.
+PUBLISH_EVENT_SCRIPT = """
+local version = redis.call("INCR", KEYS[1])
+local payload = ARGV[1] .. ',"version":' .. version .. '}'
+redis.call("HSET", KEYS[2], ARGV[2], payload)
+redis.call("EXPIRE", KEYS[2], ARGV[3])
+redis.call("PUBLISH", KEYS[3], payload)
+return payload
+"""
+
+_client = None
+_publish_script = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.CACHE_URL)
+    return _client
+
+
+def get_publish_script():
+    global _publish_script
+    if _publish_script is None:
+        _publish_script = get_redis().register_script(PUBLISH_EVENT_SCRIPT)
+    return _publish_script
+
+
+# =========================================================
+# PUBLICAR (TASKS)
+# =========================================================
+def publish_event(user_id, state):
+    """
+    Numera el evento con la siguiente versión del usuario, lo deja como
+    último estado del video y lo publica en el canal del usuario, todo
+    atómico (PUBLISH_EVENT_SCRIPT).
+    """
+    payload = get_publish_script()(
+        keys=[
+            EVENTS_VERSION_KEY.format(user_id),
+            EVENTS_LATEST_KEY.format(user_id),
+            EVENTS_CHANNEL.format(user_id),
+        ],
+        args=[json.dumps(state)[:-1], state["id"], settings.VIDEO_PROGRESS_TTL],
+    )
+    return json.loads(payload)
+
+
+def forget_event(user_id, video_id):
+    get_redis().hdel(EVENTS_LATEST_KEY.format(user_id), video_id)
+
+
+# =========================================================
+# STREAM (SSE)
+# =========================================================
+def create_stream_token(user_id, video_id):
+    """
+    Token firmado para abrir el stream de un video con ?token=
+    (EventSource no permite headers): vale VIDEO_EVENTS_TOKEN_TTL
+    segundos y no es la credencial de la API.
+    """
+    return signing.dumps({"user": user_id, "video": video_id}, salt=STREAM_TOKEN_SALT)
+
+
+def read_stream_token(token):
+    """
+    (user_id, video_id) de un token de create_stream_token, o None si
+    no es válido o expiró.
+    """
+    try:
+        data = signing.loads(
+            token, salt=STREAM_TOKEN_SALT, max_age=settings.VIDEO_EVENTS_TOKEN_TTL
+        )
+    except signing.BadSignature:
+        return None
+    return data["user"], data["video"]
+
+
+def format_event(event):
+    return f"id: {event['version']}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream_events(user_id, last_version=0, video_id=None):
+    """
+    Generador async de eventos SSE para los videos del usuario (o solo
+    video_id).
+
+    Se suscribe al canal antes de leer los últimos estados: así nada de
+    lo publicado entre medio se pierde. Solo manda eventos con versión
+    mayor a last_version (el Last-Event-ID del cliente). Corta después
+    de VIDEO_EVENTS_MAX_SECONDS; el cliente reconecta con el último id.
+    """
+    client = redis.asyncio.Redis.from_url(settings.CACHE_URL)
+    pubsub = client.pubsub()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.VIDEO_EVENTS_MAX_SECONDS
+
+    try:
+        await pubsub.subscribe(EVENTS_CHANNEL.format(user_id))
+        yield "retry: 3000\n\n"
+
+        latest = await client.hgetall(EVENTS_LATEST_KEY.format(user_id))
+        pending = sorted(
+            (json.loads(payload) for payload in latest.values()),
+            key=lambda event: event["version"],
+        )
+        for event in pending:
+            if video_id is not None and event["id"] != video_id:
+                continue
+            if event["version"] > last_version:
+                last_version = event["version"]
+                yield format_event(_public(event))
+
+        while loop.time() < deadline:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=min(settings.VIDEO_EVENTS_KEEPALIVE, deadline - loop.time()),
+            )
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+
+            event = json.loads(message["data"])
+            if video_id is not None and event["id"] != video_id:
+                continue
+            if event["version"] > last_version:
+                last_version = event["version"]
+                yield format_event(_public(event))
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
+
+
+def _public(event):
+    return {key: value for key, value in event.items() if key != "user_id"}
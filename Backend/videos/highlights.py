@@ -0,0 +1,332 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Una sola decodificación a baja resolución: cuadros grises chicos y
+# audio mono, alcanzan para medir cortes de escena y volumen.
+ANALYSIS_FPS = 2
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 36
+SAMPLE_RATE = 8000
+
+MIN_CLIP_SECONDS = 8
+MAX_CLIP_SECONDS = 60
+# Cuánto puede moverse el inicio/fin de un clip para caer en un corte
+# de escena o en una pausa del audio
+SNAP_SECONDS = 2
+# Un cambio entre cuadros mayor a media + N desvíos es un corte de escena
+SCENE_CUT_SIGMA = 3
+# Pasos (1 / ANALYSIS_FPS segundos) que se leen de cada pipe por vez
+READ_BLOCK_STEPS = 256
+# Segundo del original que se usa de cover
+COVER_SECOND = 1
+
+
+class HighlightTimeout(Exception):
+    """
+    El análisis superó su presupuesto de tiempo.
+    """
+
+
+# =========================================================
+# PUNTO DE ENTRADA
+# =========================================================
+def find_highlight_clips(video_path, duration, has_audio, clip_count, cover_path=None):
+    """
+    Elige los clip_count mejores fragmentos del video según movimiento
+    y volumen. Devuelve None si el análisis falla o se pasa del
+    presupuesto (highlight_budget), para usar el plan simple.
+
+    Con cover_path escribe ahí el cover del original (segundo 1) en la
+    misma pasada; si el análisis falla lo deja vacío.
+    """
+    clip_length = min(
+        MAX_CLIP_SECONDS, max(MIN_CLIP_SECONDS, duration / (clip_count + 1))
+    )
+    started = time.monotonic()
+
+    try:
+        motion, loudness = analyze_video(
+            video_path, has_audio, highlight_budget(clip_count * clip_length), cover_path
+        )
+        clips = pick_highlights(motion, loudness, duration, clip_count, clip_length)
+    except Exception as e:
+        logger.warning(f"⚠️ Análisis de highlights descartado: {e}")
+        if cover_path:
+            # puede haber quedado a medio escribir
+            open(cover_path, "wb").close()
+        return None
+
+    logger.info(
+        f"🔎 Highlights en {time.monotonic() - started:.1f}s: {clips}"
+    )
+    return clips or None
+
+
+def highlight_budget(clip_seconds):
+    """
+    Segundos que puede tardar el análisis: una fracción de lo que va a
+    costar renderizar clip_seconds de shorts, con un mínimo fijo.
+    """
+    return max(
+        settings.SHORTS_HIGHLIGHT_BUDGET,
+        settings.SHORTS_HIGHLIGHT_BUDGET_RATIO * clip_seconds,
+    )
+
+
+# =========================================================
+# ANÁLISIS (FFMPEG -> NUMPY)
+# =========================================================
+def analyze_video(video_path, has_audio, budget, cover_path=None):
+    """
+    Decodifica una vez el video y devuelve, por cada paso de
+    1 / ANALYSIS_FPS segundos:
+    - motion: diferencia media con el cuadro anterior (0-255)
+    - loudness: RMS del audio (0-1), o None si no hay audio
+
+    Con cover_path además guarda en JPEG, a resolución completa, el
+    cuadro del segundo COVER_SECOND. Corta ffmpeg si tarda más de
+    budget segundos.
+    """
+    command = [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-nostdin",
+        # los cuadros que ningún otro referencia (B-frames) no hacen falta
+        # para muestrear a ANALYSIS_FPS y son la mayor parte del decode
+        "-skip_frame",
+        "noref",
+        "-i",
+        video_path,
+        "-map",
+        "0:v:0",
+        "-vf",
+        f"fps={ANALYSIS_FPS},scale={FRAME_WIDTH}:{FRAME_HEIGHT},format=gray",
+        "-f",
+        "rawvideo",
+        "pipe:1",
+    ]
+
+    audio_read, audio_write = None, None
+    if has_audio:
+        # el audio sale por un segundo pipe del mismo proceso
+        audio_read, audio_write = os.pipe()
+        command += [
+            "-map",
+            "0:a:0",
+            "-ac",
+            "1",
+            "-ar",
+            str(SAMPLE_RATE),
+            "-f",
+            "s16le",
+            f"pipe:{audio_write}",
+        ]
+
+    if cover_path:
+        command += [
+            "-map",
+            "0:v:0",
+            "-ss",
+            str(COVER_SECOND),
+            "-frames:v",
+            "1",
+            "-q:v",
+            "2",
+            "-y",
+            cover_path,
+        ]
+
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        pass_fds=(audio_write,) if has_audio else (),
+    )
+    timer = threading.Timer(budget, process.kill)
+    timer.start()
+
+    audio_result = {}
+    audio_thread = None
+    if has_audio:
+        os.close(audio_write)
+        audio_thread = threading.Thread(
+            target=_read_loudness, args=(audio_read, audio_result), daemon=True
+        )
+        audio_thread.start()
+
+    try:
+        motion = _read_motion(process.stdout)
+        if audio_thread:
+            audio_thread.join()
+        process.wait()
+    finally:
+        timer.cancel()
+        process.stdout.close()
+
+    if process.returncode != 0:
+        if process.returncode < 0:
+            raise HighlightTimeout(f"más de {budget}s analizando {video_path}")
+        raise RuntimeError(f"ffmpeg terminó con código {process.returncode}")
+
+    return motion, audio_result.get("loudness")
+
+
+def _read_motion(stream):
+    """
+    Lee cuadros grises crudos y calcula la diferencia con el anterior.
+    """
+    frame_size = FRAME_WIDTH * FRAME_HEIGHT
+    previous = None
+    blocks = []
+
+    while True:
+        data = stream.read(frame_size * READ_BLOCK_STEPS)
+        usable = len(data) // frame_size * frame_size
+        if not usable:
+            break
+
+        frames = np.frombuffer(data[:usable], dtype=np.uint8).reshape(-1, frame_size)
+        frames = frames.astype(np.int16)
+
+        if previous is None:
+            blocks.append(np.zeros(1, dtype=np.float32))
+            diffs = np.abs(np.diff(frames, axis=0)).mean(axis=1)
+        else:
+            diffs = np.abs(np.diff(np.vstack([previous, frames]), axis=0)).mean(axis=1)
+
+        blocks.append(diffs.astype(np.float32))
+        previous = frames[-1:]
+
+    return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+
+
+def _read_loudness(fd, result):
+    """
+    Lee PCM mono s16le y calcula el RMS de cada paso.
+    """
+    step_bytes = SAMPLE_RATE // ANALYSIS_FPS * 2
+    pending = b""
+    blocks = []
+
+    with os.fdopen(fd, "rb") as stream:
+        while True:
+            data = stream.read(step_bytes * READ_BLOCK_STEPS)
+            if not data:
+                break
+
+            data = pending + data
+            usable = len(data) // step_bytes * step_bytes
+            pending = data[usable:]
+            if not usable:
+                continue
+
+            samples = np.frombuffer(data[:usable], dtype=np.int16)
+            samples = samples.astype(np.float32).reshape(-1, step_bytes // 2) / 32768
+            blocks.append(np.sqrt(np.mean(np.square(samples), axis=1)))
+
+    result["loudness"] = (
+        np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+    )
+
+
+# =========================================================
+# ELECCIÓN DE VENTANAS
+# =========================================================
+def _standardize(values):
+    std = values.std()
+    if std == 0:
+        return np.zeros_like(values)
+    return (values - values.mean()) / std
+
+
+def pick_highlights(motion, loudness, duration, clip_count, clip_length):
+    """
+    Elige hasta clip_count ventanas de clip_length segundos sin
+    superponerse, con más volumen y movimiento. Los bordes se corren
+    (hasta SNAP_SECONDS) a un corte de escena o a una pausa del audio
+    para no empezar a mitad de una frase.
+    """
+    steps = len(motion)
+    if loudness is not None and len(loudness):
+        steps = min(steps, len(loudness))
+        loudness = loudness[:steps]
+    else:
+        loudness = None
+    motion = motion[:steps]
+
+    window = int(clip_length * ANALYSIS_FPS)
+    if window < 1 or steps < window:
+        raise ValueError("video demasiado corto para el análisis")
+
+    cut_threshold = motion.mean() + SCENE_CUT_SIGMA * motion.std()
+    is_cut = motion > cut_threshold
+
+    # los cortes no cuentan como "movimiento": si no, gana cualquier
+    # ventana con muchos cambios de plano
+    score = 0.5 * _standardize(np.minimum(motion, cut_threshold))
+    if loudness is not None:
+        score += _standardize(loudness)
+
+    cumulative = np.concatenate([[0.0], np.cumsum(score)])
+    window_scores = cumulative[window:] - cumulative[:-window]
+
+    snap = int(SNAP_SECONDS * ANALYSIS_FPS)
+    clips = []
+
+    for _ in range(clip_count):
+        best = int(np.argmax(window_scores))
+        if not np.isfinite(window_scores[best]):
+            break
+        # ninguna otra ventana puede pisar a esta
+        window_scores[max(0, best - window + 1) : best + window] = -np.inf
+
+        start = _snap_boundary(best, snap, is_cut, loudness, steps)
+        end = _snap_boundary(best + window, snap, is_cut, loudness, steps)
+
+        start_seconds = start / ANALYSIS_FPS
+        end_seconds = min(duration, end / ANALYSIS_FPS)
+        end_seconds = min(end_seconds, start_seconds + MAX_CLIP_SECONDS)
+
+        clips.append((start_seconds, end_seconds))
+
+    # al correr los bordes dos clips vecinos pueden pisarse un poco
+    highlights = []
+    previous_end = 0
+    for start_seconds, end_seconds in sorted(clips):
+        start_seconds = max(start_seconds, previous_end)
+        if end_seconds - start_seconds >= MIN_CLIP_SECONDS:
+            highlights.append(
+                {"start": round(start_seconds, 3), "end": round(end_seconds, 3)}
+            )
+            previous_end = end_seconds
+
+    return highlights
+
+
+def _snap_boundary(index, snap, is_cut, loudness, steps):
+    """
+    Mueve un borde al corte de escena más cercano dentro de ±snap pasos;
+    si no hay, al paso más silencioso.
+    """
+    low = max(0, index - snap)
+    high = min(steps, index + snap + 1)
+    if low >= high:
+        return min(index, steps)
+
+    cuts = np.flatnonzero(is_cut[low:high])
+    if len(cuts):
+        return low + int(cuts[np.argmin(np.abs(cuts + low - index))])
+
+    if loudness is not None:
+        return low + int(np.argmin(loudness[low:high]))
+
+    return index
@@ -0,0 +1,327 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime
+
+from celery import current_app
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from videos.benchmark import (
+    cloudinary_stand_in,
+    directory_size,
+    files_size,
+    generate_synthetic_video,
+    local_media_store,
+    measure,
+)
+from videos.models import Video
+from videos.services import (
+    available_cpus,
+    cleanup_shorts_data,
+    delete_video,
+    generate_fallback_clips,
+    generate_shorts,
+    get_video_metadata,
+    process_video_task,
+)
+from videos.uploads import get_spool_dir
+
+CASES = ("metadata", "vertical", "horizontal", "pipeline")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark del pipeline con videos sintéticos (lavfi) y un Cloudinary "
+        "local. Crea y borra videos de un usuario 'benchmark' en la base "
+        "configurada: no correrlo contra producción."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--durations",
+            default="30,90",
+            help="Duraciones en segundos, separadas por coma",
+        )
+        parser.add_argument(
+            "--resolutions",
+            default="640x360,1280x720,1920x1080",
+            help="Resoluciones ANCHOxALTO (horizontales), separadas por coma",
+        )
+        parser.add_argument(
+            "--audio",
+            choices=("both", "yes", "no"),
+            default="both",
+            help="Videos con audio, sin audio o ambos",
+        )
+        parser.add_argument(
+            "--cases",
+            default=",".join(CASES),
+            help=f"Casos a medir: {', '.join(CASES)}",
+        )
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument(
+            "--media-dir",
+            default=os.path.join(tempfile.gettempdir(), "verticalia-bench"),
+            help="Dónde generar (y reutilizar) los videos sintéticos",
+        )
+        parser.add_argument(
+            "--output",
+            default=f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json",
+            help="Archivo JSON con los resultados",
+        )
+        parser.add_argument(
+            "--media-store",
+            choices=("stand-in", "local"),
+            default="stand-in",
+            help=(
+                "stand-in: Cloudinary imitado por HTTP local; local: "
+                "MEDIA_STORE=local, sin red"
+            ),
+        )
+        parser.add_argument(
+            "--compare",
+            help="JSON de una corrida anterior para comparar wall time",
+        )
+
+    def handle(self, *args, **options):
+        cases = [case.strip() for case in options["cases"].split(",") if case.strip()]
+        unknown = set(cases) - set(CASES)
+        if unknown:
+            raise CommandError(f"Casos desconocidos: {', '.join(sorted(unknown))}")
+
+        try:
+            durations = [int(value) for value in options["durations"].split(",")]
+            resolutions = [
+                tuple(int(side) for side in value.lower().split("x"))
+                for value in options["resolutions"].split(",")
+            ]
+        except ValueError:
+            raise CommandError("Duraciones o resoluciones inválidas")
+
+        audio_variants = {"both": (True, False), "yes": (True,), "no": (False,)}[
+            options["audio"]
+        ]
+
+        # -----------------------
+        # VIDEOS SINTÉTICOS
+        # -----------------------
+        os.makedirs(options["media_dir"], exist_ok=True)
+        inputs = []
+        for width, height in resolutions:
+            for duration in durations:
+                for audio in audio_variants:
+                    self.stdout.write(f"🎨 Video {width}x{height} {duration}s audio={audio}")
+                    path = generate_synthetic_video(
+                        options["media_dir"], width, height, duration, audio
+                    )
+                    inputs.append(
+                        {
+                            "name": os.path.basename(path),
+                            "path": path,
+                            "width": width,
+                            "height": height,
+                            "duration": duration,
+                            "audio": audio,
+                            "file_size": os.path.getsize(path),
+                        }
+                    )
+
+        # -----------------------
+        # CASOS
+        # -----------------------
+        results = []
+        store_dir = os.path.join(options["media_dir"], "cloudinary")
+
+        if options["media_store"] == "local":
+            media_store = local_media_store(store_dir)
+        else:
+            media_store = cloudinary_stand_in(store_dir)
+
+        with media_store:
+            for source in inputs:
+                metadata = get_video_metadata(source["path"])
+
+                for case in cases:
+                    for run in range(1, options["repeat"] + 1):
+                        result = self.run_case(case, source, metadata, store_dir)
+                        result.update(
+                            {
+                                "case": case,
+                                "input": {
+                                    key: value
+                                    for key, value in source.items()
+                                    if key != "path"
+                                },
+                                "run": run,
+                            }
+                        )
+                        results.append(result)
+                        self.print_result(result)
+
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "environment": {
+                **self.environment(),
+                "media_store": options["media_store"],
+            },
+            "results": results,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Resultados en {options['output']}"))
+
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    # =========================================================
+    # CASOS
+    # =========================================================
+    def run_case(self, case, source, metadata, store_dir):
+        if case == "metadata":
+            return measure(lambda: probe_metadata(source))
+
+        if case in ("vertical", "horizontal"):
+            return measure(lambda: render_shorts(source, metadata, case))
+
+        return self.run_pipeline(source, store_dir)
+
+    def run_pipeline(self, source, store_dir):
+        """
+        process_video_task completo (sincrónico), con el original copiado
+        al spool como lo deja la vista de subida. Las tasks del chord
+        (subidas y, con VIDEO_PIPELINE_FANOUT, renders) y el purge de
+        delete_video también corren acá (eager): no hace falta broker. Al
+        terminar se deja task_always_eager como estaba.
+        """
+        user, _ = get_user_model().objects.get_or_create(
+            username="benchmark", defaults={"email": "benchmark@localhost"}
+        )
+        video = Video.objects.create(
+            user=user,
+            file_name=source["name"],
+            type_short=Video.TypeShort.VERTICAL,
+        )
+        spool_path = os.path.join(get_spool_dir(), f"benchmark_{video.id}.mp4")
+        shutil.copyfile(source["path"], spool_path)
+
+        def run():
+            process_video_task.apply(
+                args=(video.id, spool_path, source["name"], "vertical")
+            )
+            video.refresh_from_db()
+            job = video.processing_jobs.first()
+            return {
+                "status": video.status,
+                "pipeline_error": job.error_message or None,
+                "stages": job.timings.get("stages", {}),
+                "output_bytes": directory_size(store_dir),
+            }
+
+        previous_eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        try:
+            return measure(run)
+        finally:
+            try:
+                delete_video(Video.objects.get(id=video.id))
+            finally:
+                current_app.conf.task_always_eager = previous_eager
+                if os.path.exists(spool_path):
+                    os.unlink(spool_path)
+
+    # =========================================================
+    # SALIDA
+    # =========================================================
+    def print_result(self, result):
+        if result.get("error"):
+            self.stdout.write(
+                self.style.ERROR(
+                    f"❌ {result['case']:<10} {result['input']['name']}: {result['error']}"
+                )
+            )
+            return
+
+        self.stdout.write(
+            f"⏱️ {result['case']:<10} {result['input']['name']:<40} "
+            f"wall {result['wall_seconds']:>7.2f}s  "
+            f"cpu {result['cpu_seconds']:>7.2f}s  "
+            f"rss {result['peak_rss_kb'] / 1024:>6.0f}MB  "
+            f"out {result.get('output_bytes', 0) / 1e6:>6.1f}MB"
+        )
+
+    def environment(self):
+        return {
+            "host": platform.node(),
+            "cpus": available_cpus(),
+            "python": platform.python_version(),
+            "ffmpeg": _first_line(["ffmpeg", "-version"]),
+            "commit": _first_line(["git", "rev-parse", "--short", "HEAD"]),
+            "settings": {
+                name: getattr(settings, name)
+                for name in (
+                    "SHORTS_RENDER_MODE",
+                    "SHORTS_RENDER_WORKERS",
+                    "SHORTS_HIGHLIGHTS",
+                    "SHORTS_HIGHLIGHT_BUDGET_RATIO",
+                    "SHORTS_SINGLE_PASS_MIN_COVERAGE",
+                    "CLOUDINARY_UPLOAD_WORKERS",
+                )
+            },
+        }
+
+    def compare(self, path, results):
+        with open(path) as previous_file:
+            previous = {
+                (result["case"], result["input"]["name"]): result
+                for result in json.load(previous_file)["results"]
+                if not result.get("error")
+            }
+
+        self.stdout.write(f"📊 Comparación con {path} (wall time)")
+        for result in results:
+            before = previous.get((result["case"], result["input"]["name"]))
+            if not before or result.get("error"):
+                continue
+            change = result["wall_seconds"] / before["wall_seconds"] - 1
+            self.stdout.write(
+                f"   {result['case']:<10} {result['input']['name']:<40} "
+                f"{before['wall_seconds']:>7.2f}s -> {result['wall_seconds']:>7.2f}s "
+                f"({change:+.0%})"
+            )
+
+
+def probe_metadata(source):
+    get_video_metadata(source["path"])
+    return {}
+
+
+def render_shorts(source, metadata, type_short):
+    shorts = generate_shorts(
+        source["path"],
+        generate_fallback_clips(source["duration"]),
+        type_short=type_short,
+        metadata=metadata,
+    )
+    try:
+        return {
+            "shorts": len(shorts),
+            "output_bytes": files_size(
+                *(short[key] for short in shorts for key in ("short_path", "cover_path"))
+            ),
+        }
+    finally:
+        cleanup_shorts_data(shorts)
+
+
+def _first_line(command):
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True)
+        return output.stdout.splitlines()[0]
+    except (OSError, subprocess.CalledProcessError, IndexError):
+        return None
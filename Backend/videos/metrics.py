@@ -0,0 +1,262 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from .events import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# =========================================================
+# TIEMPOS POR ETAPA
+# =========================================================
+class StageTimer:
+    """
+    Mide las etapas de un procesamiento. report() es lo que se guarda
+    en ProcessingJob.timings:
+
+    {
+        "input": {"duration": ..., "width": ..., "height": ..., ...},
+        "stages": {"metadata": 0.2, "plan": 1.8, "render": 21.4, ...},
+        "encodes": [6.9, 7.3, 7.1],   # un ffmpeg por short
+        "uploads": {"original": 3.1, "short_1": 1.2, "cover_1": 0.3, ...},
+    }
+
+    Todo en segundos. Las subidas corren en hilos: cada una escribe
+    su propia clave.
+    """
+
+    def __init__(self):
+        self.input = {}
+        self.stages = {}
+        self.encodes = []
+        self.uploads = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - started)
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.stages[name] = round(self.stages.get(name, 0) + seconds, 3)
+
+    @classmethod
+    def from_report(cls, timings):
+        """
+        Retoma la medición guardada por otra task (ProcessingJob.timings).
+        """
+        timer = cls()
+        timings = timings or {}
+        timer.input = dict(timings.get("input", {}))
+        timer.stages = dict(timings.get("stages", {}))
+        timer.encodes = list(timings.get("encodes", []))
+        timer.uploads = dict(timings.get("uploads", {}))
+        return timer
+
+    def add_part(self, result):
+        """
+        Suma los tiempos que devuelve una task del chord
+        ({"encodes": [...], "uploads": {...}}).
+        """
+        with self.lock:
+            self.encodes += result.get("encodes", [])
+            self.uploads.update(result.get("uploads", {}))
+
+    def report(self):
+        with self.lock:
+            return {
+                "input": dict(self.input),
+                "stages": dict(self.stages),
+                "encodes": list(self.encodes),
+                "uploads": dict(self.uploads),
+            }
+
+    def summary(self):
+        return ", ".join(
+            f"{name} {seconds:.1f}s" for name, seconds in self.stages.items()
+        )
+
+    @staticmethod
+    def publish(status, timings):
+        """
+        Suma un job terminado a los agregados de Prometheus (ver
+        record_job). Si Redis falla el job termina igual.
+        """
+        try:
+            record_job(status, timings)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudieron registrar las métricas del job: {e}")
+
+
+# =========================================================
+# PROMETHEUS
+# =========================================================
+METRICS_PREFIX = "verticalia"
+# Segundos: desde un ffprobe hasta el render de un original largo
+SECONDS_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+# Agregados en un hash de Redis: cada job terminado suma lo suyo
+# (record_job) y el scrape solo lee el hash, sin recorrer los jobs.
+METRICS_KEY = "videos:metrics"
+# Separa las partes de cada campo del hash: métrica|etiqueta|serie
+FIELD_SEPARATOR = "|"
+
+
+class Histogram:
+    """
+    Histograma acumulado que se imprime en el formato de texto de
+    Prometheus. label es el nombre de la etiqueta (o None).
+
+    observe() anota en un pipeline de Redis; load() lo rearma desde
+    los campos del hash METRICS_KEY.
+    """
+
+    def __init__(self, name, description, label=None, buckets=SECONDS_BUCKETS):
+        self.key = name
+        self.name = f"{METRICS_PREFIX}_{name}"
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, pipe, value, label_value=None):
+        prefix = self._field(label_value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                pipe.hincrby(METRICS_KEY, f"{prefix}bucket{FIELD_SEPARATOR}{i}", 1)
+        pipe.hincrbyfloat(METRICS_KEY, f"{prefix}sum", value)
+        pipe.hincrby(METRICS_KEY, f"{prefix}count", 1)
+
+    def load(self, fields):
+        for field, value in fields.items():
+            parts = field.split(FIELD_SEPARATOR)
+            if parts[0] != self.key:
+                continue
+            _, label_value, *series_key = parts
+
+            series = self.series.setdefault(
+                label_value or None,
+                {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0},
+            )
+            if series_key[0] == "bucket":
+                series["buckets"][int(series_key[1])] = int(value)
+            elif series_key[0] == "sum":
+                series["sum"] = float(value)
+            else:
+                series["count"] = int(value)
+
+    def _field(self, label_value):
+        return FIELD_SEPARATOR.join([self.key, label_value or "", ""])
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for label_value in sorted(self.series, key=str):
+            series = self.series[label_value]
+            labels = [f'{self.label}="{label_value}"'] if self.label else []
+
+            for bound, count in zip(self.buckets, series["buckets"]):
+                lines.append(self._line("_bucket", labels + [f'le="{bound}"'], count))
+            lines.append(self._line("_bucket", labels + ['le="+Inf"'], series["count"]))
+            lines.append(self._line("_sum", labels, round(series["sum"], 3)))
+            lines.append(self._line("_count", labels, series["count"]))
+        return lines
+
+    def _line(self, suffix, labels, value):
+        label_text = "{" + ",".join(labels) + "}" if labels else ""
+        return f"{self.name}{suffix}{label_text} {value}"
+
+
+def upload_asset_kind(key):
+    """
+    short_3 -> short, cover_3 -> cover; original y cover_original quedan igual.
+    """
+    kind, _, index = key.rpartition("_")
+    return kind if index.isdigit() else key
+
+
+def build_histograms():
+    return {
+        "stages": Histogram(
+            "stage_seconds", "Duración de cada etapa del procesamiento", "stage"
+        ),
+        "encodes": Histogram("short_encode_seconds", "Duración del render de cada short"),
+        "uploads": Histogram(
+            "upload_seconds", "Duración de cada subida a Cloudinary", "asset"
+        ),
+    }
+
+
+def record_job(status, timings):
+    """
+    Suma un job terminado (completado o fallido) y sus tiempos
+    (StageTimer.report) a los agregados, en un solo viaje a Redis.
+    """
+    histograms = build_histograms()
+    timings = timings or {}
+
+    with get_redis().pipeline(transaction=False) as pipe:
+        pipe.hincrby(METRICS_KEY, FIELD_SEPARATOR.join(["jobs", status]), 1)
+
+        for name, seconds in timings.get("stages", {}).items():
+            histograms["stages"].observe(pipe, seconds, name)
+        for seconds in timings.get("encodes", []):
+            histograms["encodes"].observe(pipe, seconds)
+        for key, seconds in timings.get("uploads", {}).items():
+            histograms["uploads"].observe(pipe, seconds, upload_asset_kind(key))
+
+        source = timings.get("input", {})
+        pipe.hincrbyfloat(METRICS_KEY, "input_video_seconds", source.get("duration") or 0)
+        pipe.hincrby(METRICS_KEY, "input_bytes", source.get("file_size") or 0)
+        pipe.execute()
+
+
+def render_prometheus():
+    """
+    Agregados de los jobs terminados (completados o fallidos) en el
+    formato de texto de Prometheus. Lee solo el hash de Redis.
+    """
+    fields = {
+        field.decode(): value.decode()
+        for field, value in get_redis().hgetall(METRICS_KEY).items()
+    }
+    histograms = build_histograms()
+    for histogram in histograms.values():
+        histogram.load(fields)
+
+    jobs = {
+        field.split(FIELD_SEPARATOR)[1]: int(value)
+        for field, value in fields.items()
+        if field.startswith(f"jobs{FIELD_SEPARATOR}")
+    }
+
+    lines = [
+        f"# HELP {METRICS_PREFIX}_jobs_total Jobs de procesamiento terminados, por estado",
+        f"# TYPE {METRICS_PREFIX}_jobs_total counter",
+    ]
+    lines += [
+        f'{METRICS_PREFIX}_jobs_total{{status="{status}"}} {count}'
+        for status, count in sorted(jobs.items())
+    ]
+    lines += [
+        f"# HELP {METRICS_PREFIX}_input_video_seconds_total Segundos de video original procesados",
+        f"# TYPE {METRICS_PREFIX}_input_video_seconds_total counter",
+        f"{METRICS_PREFIX}_input_video_seconds_total "
+        f"{round(float(fields.get('input_video_seconds', 0)), 3)}",
+        f"# HELP {METRICS_PREFIX}_input_bytes_total Bytes de video original procesados",
+        f"# TYPE {METRICS_PREFIX}_input_bytes_total counter",
+        f"{METRICS_PREFIX}_input_bytes_total {int(fields.get('input_bytes', 0))}",
+    ]
+    for histogram in histograms.values():
+        lines += histogram.render()
+
+    return "\n".join(lines) + "\n"
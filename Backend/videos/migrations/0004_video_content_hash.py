@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_video_type_short_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['user', 'content_hash'], name='videos_vide_user_id_d7f8fb_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0005_videoupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='source_public_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
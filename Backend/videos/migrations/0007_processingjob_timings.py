@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0006_video_source_public_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
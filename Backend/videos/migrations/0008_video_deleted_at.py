@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0007_processingjob_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
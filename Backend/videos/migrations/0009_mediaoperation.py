@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_video_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('upload', 'Upload'), ('destroy', 'Destroy')], max_length=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('resource_type', models.CharField(max_length=10)),
+                ('public_id', models.CharField(max_length=255)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['available_at'],
+                'indexes': [models.Index(fields=['action', 'status', 'available_at'], name='videos_medi_action_30a2ee_idx')],
+                'constraints': [models.UniqueConstraint(fields=('action', 'resource_type', 'public_id'), name='unique_media_operation')],
+            },
+        ),
+    ]
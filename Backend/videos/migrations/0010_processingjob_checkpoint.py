@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0009_mediaoperation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
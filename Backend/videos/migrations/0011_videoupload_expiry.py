@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+import videos.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0010_processingjob_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=videos.models.upload_session_expiry),
+        ),
+        migrations.AddField(
+            model_name='videoupload',
+            name='spool_node',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
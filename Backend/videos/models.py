@@ -1,5 +1,9 @@
+import uuid
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 # ==========================================
@@ -51,6 +55,12 @@ class Video(models.Model):
     aspect_ratio = models.CharField(max_length=10, null=True, blank=True)
     has_audio = models.BooleanField(null=True, blank=True)
     file_size = models.PositiveIntegerField(null=True, blank=True)
+    # SHA-256 del archivo subido, para detectar re-subidas del mismo video
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    # Asset que el cliente subió directo a Cloudinary (se borra al procesar)
+    source_public_id = models.CharField(
+        max_length=255, null=True, blank=True, unique=True
+    )
     type_short = models.CharField(
         max_length=20,
         choices=TypeShort.choices,
@@ -59,6 +69,9 @@ class Video(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Borrado pendiente: la API ya no lo muestra y purge_video_task
+    # encola sus assets en el outbox y borra la fila (ver services.delete_video)
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -72,6 +85,7 @@ class Video(models.Model):
         indexes = [
             models.Index(fields=["user", "status"]),
             models.Index(fields=["user", "type_short"]),
+            models.Index(fields=["user", "content_hash"]),
         ]
 
     def __str__(self):
@@ -114,6 +128,12 @@ class ProcessingJob(models.Model):
 
     error_message = models.TextField(blank=True, default="")
 
+    # Tiempos por etapa y características del original (ver videos.metrics)
+    timings = models.JSONField(default=dict, blank=True)
+    # Resultado de cada etapa ya hecha (metadata, clips, shorts renderizados,
+    # subidas): un reintento de process_video_task las saltea
+    checkpoint = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     video = models.ForeignKey(
@@ -127,3 +147,137 @@ class ProcessingJob(models.Model):
 
     def __str__(self):
         return f"{self.job_type} - {self.status}"
+
+
+# ==========================================
+# Video Upload (subida por partes)
+# ==========================================
+
+
+def upload_session_expiry():
+    return timezone.now() + timedelta(seconds=settings.VIDEO_UPLOAD_SESSION_TTL)
+
+
+class VideoUpload(models.Model):
+    """
+    Sesión de subida por partes de un video.
+    Las partes se escriben directo en spool_path (dentro de temp/) y
+    received_ranges guarda qué rangos [inicio, fin) ya llegaron.
+    Sin partes nuevas hasta expires_at, se descarta con su archivo
+    (videos.uploads.expire_upload_sessions).
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        COMPLETED = "completed", "Completed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    file_name = models.CharField(max_length=255)
+    type_short = models.CharField(
+        max_length=20,
+        choices=Video.TypeShort.choices,
+        default=Video.TypeShort.VERTICAL,
+    )
+
+    total_size = models.PositiveBigIntegerField()
+    # SHA-256 del archivo completo, declarado por el cliente
+    checksum = models.CharField(max_length=64)
+
+    spool_path = models.CharField(max_length=500)
+    # Nodo cuyo spool tiene el archivo (SPOOL_NODE_NAME del web)
+    spool_node = models.CharField(max_length=255, blank=True)
+    received_ranges = models.JSONField(default=list, blank=True)
+    expires_at = models.DateTimeField(default=upload_session_expiry, db_index=True)
+
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True,
+    )
+
+    video = models.OneToOneField(
+        "videos.Video",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="upload",
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="video_uploads",
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    @property
+    def received_bytes(self):
+        return sum(end - start for start, end in self.received_ranges)
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.status})"
+
+
+# ==========================================
+# Media Operation (outbox del almacenamiento)
+# ==========================================
+
+
+class MediaOperation(models.Model):
+    """
+    Efecto sobre el almacenamiento (Cloudinary / disco) anotado en la
+    misma transacción que el cambio en la base que lo origina. Lo
+    ejecuta videos.outbox.dispatch_media_operations.
+
+    - upload: reserva de una subida en curso. La borra la transacción
+      que guarda el registro que usa el asset; si available_at vence
+      antes (el worker murió en el medio) el asset se da por huérfano.
+    - destroy: asset a borrar. available_at es cuándo toca el próximo
+      intento; las que agotan los reintentos quedan en FAILED.
+    """
+
+    class Action(models.TextChoices):
+        UPLOAD = "upload", "Upload"
+        DESTROY = "destroy", "Destroy"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        FAILED = "failed", "Failed"
+
+    action = models.CharField(max_length=10, choices=Action.choices)
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+
+    resource_type = models.CharField(max_length=10)
+    public_id = models.CharField(max_length=255)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    available_at = models.DateTimeField(default=timezone.now)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["available_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["action", "resource_type", "public_id"],
+                name="unique_media_operation",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["action", "status", "available_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.resource_type}/{self.public_id} ({self.status})"
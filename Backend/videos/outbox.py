@@ -0,0 +1,255 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import MediaOperation, Video
+from .storage import get_media_store
+from shorts.models import Short
+
+logger = logging.getLogger(__name__)
+
+# Outbox de efectos sobre el almacenamiento. Cada cambio en la base que
+# sube o deja sin uso un asset anota la operación en MediaOperation dentro
+# de su misma transacción; dispatch_media_operations las ejecuta en lote,
+# fuera del camino del request y de las tasks del pipeline.
+#
+# Las subidas siguen pasando dentro de las tasks (los archivos son
+# temporales locales del worker): lo que se anota es la reserva, para que
+# un worker que muere entre la subida y el commit no deje huérfanos.
+
+# Una operación tomada por un dispatcher no la toma otro por este tiempo
+CLAIM_SECONDS = 300
+
+
+# =========================================================
+# ANOTAR OPERACIONES
+# =========================================================
+def full_public_id(options):
+    """
+    public_id con carpeta, como lo devuelve el almacenamiento.
+    """
+    if options.get("folder"):
+        return f"{options['folder']}/{options['public_id']}"
+    return options["public_id"]
+
+
+def reserve_upload(public_id, resource_type, expires_at):
+    """
+    Reserva una subida antes de hacerla. Un reintento renueva la reserva
+    y cancela el borrado pendiente del mismo asset (se va a pisar).
+    """
+    MediaOperation.objects.filter(
+        action=MediaOperation.Action.DESTROY,
+        status=MediaOperation.Status.PENDING,
+        resource_type=resource_type,
+        public_id=public_id,
+    ).delete()
+    MediaOperation.objects.update_or_create(
+        action=MediaOperation.Action.UPLOAD,
+        resource_type=resource_type,
+        public_id=public_id,
+        defaults={
+            "status": MediaOperation.Status.PENDING,
+            "available_at": expires_at,
+            "attempts": 0,
+            "last_error": "",
+        },
+    )
+
+
+def reserve_uploads(specs):
+    """
+    Reserva las subidas de specs ({clave: (ruta, opciones)}, ver
+    services.upload_assets) por MEDIA_OUTBOX_UPLOAD_LEASE segundos.
+    """
+    expires_at = timezone.now() + timedelta(seconds=settings.MEDIA_OUTBOX_UPLOAD_LEASE)
+    with transaction.atomic():
+        for _, options in specs.values():
+            reserve_upload(full_public_id(options), options["resource_type"], expires_at)
+
+
+def confirm_uploads(public_ids):
+    """
+    Cierra las reservas de assets que ya quedaron registrados. Va dentro
+    de la transacción que guarda el registro: si se revierte, la reserva
+    sigue y al vencer el asset se borra.
+    """
+    MediaOperation.objects.filter(
+        action=MediaOperation.Action.UPLOAD, public_id__in=list(public_ids)
+    ).delete()
+
+
+def enqueue_destroy(public_ids_by_type, notify=True):
+    """
+    Anota assets a borrar ({resource_type: [public_id]}). Llamar dentro
+    de la transacción del cambio que los deja sin uso: si se revierte,
+    tampoco se borran. Al hacer commit avisa al dispatcher.
+    """
+    operations = [
+        MediaOperation(
+            action=MediaOperation.Action.DESTROY,
+            resource_type=resource_type,
+            public_id=public_id,
+        )
+        for resource_type, public_ids in public_ids_by_type.items()
+        for public_id in public_ids
+    ]
+    if not operations:
+        return
+
+    with transaction.atomic():
+        confirm_uploads(operation.public_id for operation in operations)
+        # ignore_conflicts: el mismo asset ya encolado cuenta una sola vez
+        MediaOperation.objects.bulk_create(operations, ignore_conflicts=True)
+        if notify:
+            transaction.on_commit(notify_dispatcher)
+
+
+def notify_dispatcher():
+    """
+    Encola una pasada del dispatcher. Si el broker no responde no es un
+    error: la próxima pasada de celery beat drena lo pendiente.
+    """
+    try:
+        dispatch_media_operations.delay()
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo encolar el dispatcher del outbox: {e}")
+
+
+# =========================================================
+# DISPATCHER
+# =========================================================
+def media_delete_countdown(attempts):
+    return settings.MEDIA_DELETE_RETRY_DELAY * (2 ** max(attempts - 1, 0))
+
+
+def asset_in_use(public_id):
+    """
+    True si algún Video o Short guarda el asset, aunque esté marcado
+    como borrado: su purga decide qué hacer con él.
+    """
+    return (
+        Video.objects.filter(
+            Q(cloudinary_public_id=public_id)
+            | Q(cover_original_cloudinary_public_id=public_id)
+            | Q(source_public_id=public_id)
+        ).exists()
+        or Short.objects.filter(
+            Q(cloudinary_public_id=public_id) | Q(cover_cloudinary_public_id=public_id)
+        ).exists()
+    )
+
+
+def expire_upload_reservations(limit):
+    """
+    Reservas vencidas: si el asset quedó registrado la reserva sobraba;
+    si no, el worker murió después de subirlo y se encola su borrado.
+    """
+    expired = MediaOperation.objects.filter(
+        action=MediaOperation.Action.UPLOAD,
+        status=MediaOperation.Status.PENDING,
+        available_at__lte=timezone.now(),
+    )[:limit]
+
+    for operation in expired:
+        with transaction.atomic():
+            operation.delete()
+            if asset_in_use(operation.public_id):
+                continue
+            enqueue_destroy(
+                {operation.resource_type: [operation.public_id]}, notify=False
+            )
+        logger.warning(f"🧹 Subida huérfana, se borra: {operation.public_id}")
+
+
+def claim_destroy_batch(limit):
+    """
+    Toma hasta limit borrados vencidos. Los corre CLAIM_SECONDS hacia
+    adelante para que otro dispatcher no los repita mientras tanto.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        operations = list(
+            MediaOperation.objects.select_for_update(skip_locked=True).filter(
+                action=MediaOperation.Action.DESTROY,
+                status=MediaOperation.Status.PENDING,
+                available_at__lte=now,
+            )[:limit]
+        )
+        MediaOperation.objects.filter(
+            id__in=[operation.id for operation in operations]
+        ).update(
+            attempts=F("attempts") + 1,
+            available_at=now + timedelta(seconds=CLAIM_SECONDS),
+        )
+
+    for operation in operations:
+        operation.attempts += 1
+    return operations
+
+
+def fail_destroy_operations(operations, error):
+    """
+    Reprograma con backoff; las que agotaron los reintentos quedan en
+    FAILED para revisarlas a mano (admin).
+    """
+    now = timezone.now()
+    for operation in operations:
+        operation.last_error = str(error)
+        if operation.attempts > settings.MEDIA_DELETE_MAX_RETRIES:
+            operation.status = MediaOperation.Status.FAILED
+            logger.error(f"❌ No se pudo borrar {operation.public_id}: {error}")
+        else:
+            operation.available_at = now + timedelta(
+                seconds=media_delete_countdown(operation.attempts)
+            )
+        operation.save(update_fields=["status", "last_error", "available_at"])
+
+
+def run_destroy_batch(limit):
+    """
+    Borra un lote: una llamada al almacenamiento por resource_type (en
+    Cloudinary, de a 100 public_ids). Borrar un asset que ya no existe
+    no es un error, así que repetir una operación es seguro.
+    Devuelve cuántas operaciones tomó.
+    """
+    operations = claim_destroy_batch(limit)
+
+    by_type = defaultdict(list)
+    for operation in operations:
+        by_type[operation.resource_type].append(operation)
+
+    store = get_media_store()
+    for resource_type, group in by_type.items():
+        public_ids = [operation.public_id for operation in group]
+        try:
+            store.destroy_many(public_ids, resource_type=resource_type)
+        except Exception as e:
+            logger.warning(f"⏯️ Falló el borrado de {len(group)} assets ({resource_type}): {e}")
+            fail_destroy_operations(group, e)
+            continue
+
+        MediaOperation.objects.filter(id__in=[operation.id for operation in group]).delete()
+        logger.info(f"Assets borrados ({resource_type}): {', '.join(public_ids)}")
+
+    return len(operations)
+
+
+@shared_task
+def dispatch_media_operations():
+    """
+    Drena el outbox: vence las reservas de subida y borra de a lotes de
+    MEDIA_OUTBOX_BATCH_SIZE hasta que no quede nada pendiente. Corre al
+    hacer commit un borrado y cada MEDIA_OUTBOX_INTERVAL (celery beat).
+    """
+    batch_size = settings.MEDIA_OUTBOX_BATCH_SIZE
+
+    expire_upload_reservations(batch_size)
+    while run_destroy_batch(batch_size) == batch_size:
+        pass
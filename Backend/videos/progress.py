@@ -0,0 +1,117 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from .events import forget_event, publish_event
+from .models import ProcessingJob, Video
+
+logger = logging.getLogger(__name__)
+
+# Estado en vivo del procesamiento. La task lo escribe en la cache
+# (Redis) a cada paso y el endpoint de status lo lee de ahí sin ir a la
+# base; la base solo se actualiza al cambiar de etapa y al terminar.
+PROGRESS_KEY = "videos:progress:{}"
+
+
+def progress_key(video_id):
+    return PROGRESS_KEY.format(video_id)
+
+
+def publish_progress(video, progress, error=None):
+    """
+    Guarda status y progreso del video en la cache por
+    VIDEO_PROGRESS_TTL segundos y lo emite al stream de eventos del
+    usuario. Si Redis falla el procesamiento sigue: el status se lee
+    de la base.
+    """
+    state = {
+        "id": video.id,
+        "user_id": video.user_id,
+        "status": video.status,
+        "progress": progress,
+        "error": error,
+    }
+    try:
+        cache.set(progress_key(video.id), state, timeout=settings.VIDEO_PROGRESS_TTL)
+        publish_event(video.user_id, state)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo publicar el progreso del video {video.id}: {e}")
+
+
+def read_progress(video_id):
+    """
+    Estado publicado del video, o None si no está (o la cache falla).
+    """
+    try:
+        return cache.get(progress_key(video_id))
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo leer el progreso del video {video_id}: {e}")
+        return None
+
+
+def read_progress_many(video_ids):
+    """
+    Estados publicados de varios videos en {id: estado}, en un solo
+    viaje a la cache.
+    """
+    try:
+        found = cache.get_many([progress_key(video_id) for video_id in video_ids])
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo leer el progreso de {len(video_ids)} videos: {e}")
+        return {}
+    return {state["id"]: state for state in found.values()}
+
+
+def collect_video_status(user, video_ids):
+    """
+    Estado de varios videos del usuario en {id: {status, progress, error}}.
+    Lo publicado en la cache se usa tal cual; el resto sale de una sola
+    consulta que trae el último job de cada video con Subquery. Los ids
+    que no existen o no son del usuario no aparecen.
+    """
+    statuses = {}
+
+    for video_id, state in read_progress_many(video_ids).items():
+        if state["user_id"] == user.id:
+            statuses[video_id] = {
+                "status": state["status"],
+                "progress": state["progress"],
+                "error": state["error"],
+            }
+
+    missing = [video_id for video_id in video_ids if video_id not in statuses]
+    if not missing:
+        return statuses
+
+    latest_job = ProcessingJob.objects.filter(video=OuterRef("pk")).order_by(
+        "-created_at"
+    )
+    videos = (
+        Video.objects.filter(user=user, id__in=missing, deleted_at__isnull=True)
+        .annotate(
+            job_progress=Subquery(latest_job.values("progress")[:1]),
+            job_status=Subquery(latest_job.values("status")[:1]),
+            job_error=Subquery(latest_job.values("error_message")[:1]),
+        )
+        .values("id", "status", "job_progress", "job_status", "job_error")
+    )
+
+    for video in videos:
+        failed = video["job_status"] == ProcessingJob.Status.FAILED
+        statuses[video["id"]] = {
+            "status": video["status"],
+            "progress": video["job_progress"] or 0,
+            "error": video["job_error"] if failed else None,
+        }
+
+    return statuses
+
+
+def forget_progress(video_id, user_id):
+    try:
+        cache.delete(progress_key(video_id))
+        forget_event(user_id, video_id)
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo borrar el progreso del video {video_id}: {e}")
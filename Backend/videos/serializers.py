@@ -1,5 +1,6 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Video
+from .models import Video, VideoUpload
 
 
 # ==============================
@@ -136,3 +137,87 @@ class VideoUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Video
         fields = ["file_name"]
+
+
+# ==============================
+# Serializers para subida por partes
+# ==============================
+
+
+class VideoDirectUploadSerializer(serializers.Serializer):
+    """
+    Datos para pedir un ticket de subida directa al almacenamiento.
+    """
+
+    file_name = serializers.CharField(max_length=255)
+    type_short = serializers.ChoiceField(
+        choices=Video.TypeShort.choices,
+        required=False,
+        default=Video.TypeShort.VERTICAL,
+    )
+
+    def validate_file_name(self, value):
+        allowed = VideoUploadSerializer.ALLOWED_EXTENSIONS
+        extension = value.split(".")[-1].lower()
+        if extension not in allowed:
+            raise serializers.ValidationError(
+                f"Formato no soportado. Permitidos: {', '.join(allowed)}"
+            )
+        return value
+
+
+class VideoDirectUploadConfirmSerializer(serializers.Serializer):
+    """
+    Ticket devuelto al pedir la subida directa.
+    """
+
+    ticket = serializers.CharField()
+
+
+class VideoUploadInitSerializer(VideoDirectUploadSerializer):
+    """
+    Datos para iniciar una subida por partes.
+    checksum es el SHA-256 (hex) del archivo completo.
+    """
+
+    total_size = serializers.IntegerField(min_value=1)
+    checksum = serializers.RegexField(r"^[0-9a-fA-F]{64}$")
+
+    def validate_total_size(self, value):
+        max_size = VideoUploadSerializer.MAX_FILE_SIZE
+        if value > max_size:
+            raise serializers.ValidationError(
+                f"El archivo no puede exceder {max_size // (1024*1024)} MB"
+            )
+        return value
+
+
+class VideoUploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Estado de una subida por partes: qué rangos ya llegaron,
+    para que el cliente pueda retomar.
+    """
+
+    received_bytes = serializers.IntegerField(read_only=True)
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VideoUpload
+        fields = [
+            "id",
+            "file_name",
+            "type_short",
+            "total_size",
+            "checksum",
+            "received_ranges",
+            "received_bytes",
+            "chunk_size",
+            "status",
+            "video",
+            "created_at",
+            "expires_at",
+        ]
+        read_only_fields = fields
+
+    def get_chunk_size(self, obj):
+        return settings.VIDEO_UPLOAD_CHUNK_SIZE
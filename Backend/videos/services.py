@@ -1,15 +1,42 @@
+import hashlib
 import os
 import tempfile
 import logging
 import subprocess
 import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from math import gcd
+from django.conf import settings
 from django.utils import timezone
-from celery import shared_task
+from django.utils.text import get_valid_filename
+from celery import chord, shared_task
+import cloudinary.api
 import cloudinary.uploader
-from django.db import transaction
+import cloudinary.utils
+from django.db import connections, transaction
 
+from .highlights import MAX_CLIP_SECONDS, find_highlight_clips
+from .metrics import StageTimer
 from .models import Video, ProcessingJob
+from .outbox import (
+    confirm_uploads,
+    enqueue_destroy,
+    media_delete_countdown,
+    reserve_uploads,
+)
+from .progress import forget_progress, publish_progress
+from .storage import get_media_store
+from .uploads import (
+    download_to_spool,
+    get_spool_dir,
+    local_spool_queue,
+    localize_spool_file,
+    spool_queue,
+)
 from shorts.models import Short
 
 
@@ -64,19 +91,65 @@ def generate_fallback_clips(video_duration):
 # =========================================================
 # FFMPEG WRAPPER
 # =========================================================
-def run_ffmpeg(command):
+# Líneas finales de stderr que se guardan para el log de error
+FFMPEG_STDERR_TAIL_LINES = 40
+
+
+def run_ffmpeg(command, on_progress=None):
+    """
+    Corre ffmpeg sin juntar toda su salida en memoria: de stderr solo
+    se guardan las últimas FFMPEG_STDERR_TAIL_LINES líneas.
+
+    Con on_progress, ffmpeg reporta por stdout (-progress) y se llama
+    on_progress(segundos) con el out_time de cada reporte.
+    """
+    if on_progress:
+        command = [command[0], "-progress", "pipe:1", "-nostats"] + command[1:]
+
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE if on_progress else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    )
+    stderr_tail = deque(maxlen=FFMPEG_STDERR_TAIL_LINES)
+    stderr_reader = threading.Thread(
+        target=stderr_tail.extend, args=(process.stderr,), daemon=True
+    )
+    stderr_reader.start()
+
     try:
-        subprocess.run(command, check=True, capture_output=True, text=True)
-    except subprocess.CalledProcessError as e:
-        logger.error("FFmpeg failed:\n%s", e.stderr)
-        raise
+        if on_progress:
+            for line in process.stdout:
+                key, _, value = line.strip().partition("=")
+                # out_time_us puede venir como N/A antes del primer cuadro
+                if key == "out_time_us" and value.isdigit():
+                    on_progress(int(value) / 1_000_000)
+        process.wait()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_reader.join()
+        if on_progress:
+            process.stdout.close()
+        process.stderr.close()
+
+    if process.returncode != 0:
+        stderr = "".join(stderr_tail)
+        logger.error("FFmpeg failed:\n%s", stderr)
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
 
 
 # =========================================================
 # GENERATE COVER (REUTILIZABLE)
 # =========================================================
 def generate_cover_from_video(video_path, second=1):
-    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as temp_cover:
+    with tempfile.NamedTemporaryFile(
+        suffix=".jpg", dir=get_spool_dir(), delete=False
+    ) as temp_cover:
         try:
             run_ffmpeg(
                 [
@@ -128,21 +201,16 @@ def build_video_filter(type_short: str) -> str:
 # =========================================================
 # GENERATE SHORTS
 # =========================================================
-def generate_shorts(video_path, clips_data, type_short="vertical"):
+SHORTS_RENDER_MODES = ("auto", "sequential", "parallel", "single_pass")
+
+
+def normalize_segments(clips_data):
     """
-    🔥 1 SOLO FFMPEG POR SHORT
-    🔥 720x1280
-    🔥 libx264 + preset veryfast
-    🔥 cover generado desde el short ya procesado
+    Convierte clips_data en una lista de tuplas (start, end) válidas.
+    Descarta clips con valores inválidos o con end <= start.
     """
-    shorts_data = []
     segments = []
 
-    video_filter = build_video_filter(type_short)
-
-    # -----------------------------
-    # Normalizar segmentos
-    # -----------------------------
     for clip in clips_data:
         try:
             start = float(clip.get("start", 0))
@@ -151,78 +219,606 @@ def generate_shorts(video_path, clips_data, type_short="vertical"):
             continue
 
         if end > start:  # solo aseguramos start < end
-            segments.append((start, end))
+            segments.append((round(start, 3), round(end, 3)))
+
+    return segments
+
+
+SHORT_WIDTH = 720
+SHORT_HEIGHT = 1280
+# Códecs de audio que entran en MP4 tal cual
+COPYABLE_AUDIO_CODECS = {"aac"}
+
+
+def plan_encode(metadata, type_short):
+    """
+    Arma el plan de ffmpeg de un video a partir de get_video_metadata:
+
+    - video_filter: filtros justos para llegar a 720x1280 (None si el
+      original ya tiene ese tamaño)
+    - audio: "copy" si el códec ya sirve para MP4, "aac" si hay que
+      recodificar, None si no hay audio
+    - audio_confirmed: si se sabe que hay audio; si no se sabe (sin
+      metadata) el audio se mapea como opcional
+    - optimizations: qué se evitó, para el log
+
+    Sin metadata se usa el plan completo de siempre.
+    """
+    metadata = metadata or {}
+    optimizations = []
 
     # -----------------------------
-    # Generar shorts
+    # Audio
     # -----------------------------
-    for start, end in segments:
-        start = round(start, 3)
-        end = round(end, 3)
+    has_audio = metadata.get("has_audio")
+    if has_audio is False:
+        audio = None
+        optimizations.append("sin pista de audio")
+    elif metadata.get("audio_codec") in COPYABLE_AUDIO_CODECS:
+        audio = "copy"
+        optimizations.append(f"audio {metadata['audio_codec']} copiado")
+    else:
+        audio = "aac"
 
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_short:
-            try:
-                # Generar short
-                command = [
-                    "ffmpeg",
-                    "-ss",
-                    str(start),
-                    "-i",
-                    video_path,
-                    "-t",
-                    str(end - start),
-                ]
-                # aplicar el filtros según el tipo de short
-                command += ["-vf", video_filter]
-
-                # Codecs finales
-                command += [
-                    "-c:v",
-                    "libx264",
-                    "-preset",
-                    "veryfast",
-                    "-crf",
-                    "23",
-                    "-c:a",
-                    "aac",
-                    "-b:a",
-                    "128k",
-                    "-movflags",
-                    "+faststart",
-                    "-y",
-                    temp_short.name,
-                ]
+    # -----------------------------
+    # Video
+    # -----------------------------
+    width, height = metadata.get("width"), metadata.get("height")
+    if not width or not height:
+        video_filter = build_video_filter(type_short)
+    elif type_short == "vertical":
+        video_filter = _vertical_filter(width, height, optimizations)
+    elif type_short == "horizontal":
+        video_filter = _horizontal_filter(width, height, optimizations)
+    else:
+        raise ValueError("Tipo de short inválido")
 
-                run_ffmpeg(command)
+    logger.info(
+        f"🧭 Plan de encode ({type_short}): "
+        f"{', '.join(optimizations) or 'sin atajos'}"
+    )
+    return {
+        "video_filter": video_filter,
+        "audio": audio,
+        "audio_confirmed": has_audio is True,
+        "optimizations": optimizations,
+    }
 
-                # -----------------------------
-                # Generar cover
-                # -----------------------------
-                clip_duration = end - start
-                second_for_cover = min(1, clip_duration / 2)
 
-                cover_path = generate_cover_from_video(
-                    temp_short.name, second_for_cover
-                )
+def _vertical_filter(width, height, optimizations):
+    """
+    Recorte central 9:16 (ya con números, sin expresiones) y escalado,
+    salteando lo que no haga falta. Se recorta antes de escalar: en 4K
+    eso ya deja al escalador solo la franja que se usa.
+    """
+    filters = []
+    crop_width = min(width, height * 9 // 16 // 2 * 2)
 
-                shorts_data.append(
-                    {
-                        "short_path": temp_short.name,
-                        "cover_path": cover_path,
-                        "start": start,
-                        "end": end,
-                    }
-                )
+    if crop_width != width:
+        filters.append(f"crop={crop_width}:{height}:{(width - crop_width) // 2}:0")
+    else:
+        optimizations.append("sin crop (ya es 9:16)")
+
+    if (crop_width, height) != (SHORT_WIDTH, SHORT_HEIGHT):
+        filters.append(f"scale={SHORT_WIDTH}:{SHORT_HEIGHT}")
+    else:
+        optimizations.append("sin scale (ya es 720x1280)")
+
+    return ",".join(filters) or None
+
+
+def _horizontal_filter(width, height, optimizations):
+    """
+    Letterbox: ancho 720 y barras negras hasta 1280 de alto.
+    """
+    filters = []
+    scaled_height = height
+
+    if width != SHORT_WIDTH:
+        filters.append(f"scale={SHORT_WIDTH}:-1")
+        scaled_height = round(height * SHORT_WIDTH / width)
+    else:
+        optimizations.append("sin scale (ya tiene 720 de ancho)")
+
+    if scaled_height != SHORT_HEIGHT:
+        filters.append(
+            f"pad={SHORT_WIDTH}:{SHORT_HEIGHT}:(ow-iw)/2:(oh-ih)/2:black"
+        )
+
+    return ",".join(filters) or None
+
+
+def encoder_args(plan=None):
+    """
+    Codecs finales de los shorts según el plan (sin plan: libx264 + aac).
+    """
+    audio = plan["audio"] if plan else "aac"
+
+    args = [
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-crf",
+        "23",
+    ]
+
+    if audio == "copy":
+        args += ["-c:a", "copy"]
+    elif audio == "aac":
+        args += ["-c:a", "aac", "-b:a", "128k"]
+    else:
+        args += ["-an"]
+
+    return args + ["-movflags", "+faststart"]
+
+
+def resolve_render_mode(segments, mode=None):
+    """
+    Decide cómo renderizar los shorts.
+
+    - sequential: 1 ffmpeg por short (seek rápido, decodifica solo cada clip)
+    - parallel: 1 ffmpeg por short, varios a la vez en un pool acotado
+    - single_pass: 1 solo ffmpeg que decodifica el original una vez
+      y genera todos los shorts con split + trim
+    - auto: single_pass cuando los clips cubren buena parte del rango
+      a decodificar; si están muy separados, decodificar los huecos
+      cuesta más que volver a abrir el archivo por clip, y se usa
+      parallel (o sequential si hay un solo core).
+    """
+    mode = mode or settings.SHORTS_RENDER_MODE
+
+    if mode not in SHORTS_RENDER_MODES:
+        raise ValueError(f"Modo de render inválido: {mode}")
+
+    if mode != "auto":
+        return mode
+
+    if len(segments) < 2:
+        return "sequential"
+
+    span = max(end for _, end in segments) - min(start for start, _ in segments)
+    covered = sum(end - start for start, end in segments)
+
+    if span > 0 and covered / span >= settings.SHORTS_SINGLE_PASS_MIN_COVERAGE:
+        return "single_pass"
+    if available_cpus() > 1:
+        return "parallel"
+    return "sequential"
+
+
+def available_cpus():
+    """
+    Cores que puede usar este proceso (respeta la afinidad del contenedor).
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def render_worker_budget(clip_count):
+    """
+    Devuelve (workers, threads_por_ffmpeg) para renderizar en paralelo
+    sin pedir más hilos que cores disponibles.
+    """
+    cpus = available_cpus()
+    workers = settings.SHORTS_RENDER_WORKERS or cpus
+    workers = max(1, min(workers, clip_count))
+    threads = max(1, cpus // workers)
+    return workers, threads
+
+
+class RenderProgress:
+    """
+    Junta el out_time que reporta ffmpeg por cada short y lo convierte
+    en la fracción (0-1) de segundos de clip ya renderizados.
+    Se puede llamar desde varios hilos (modo parallel).
+    """
+
+    def __init__(self, segments, on_progress):
+        self.starts = [start for start, _ in segments]
+        self.lengths = [end - start for start, end in segments]
+        self.total = sum(self.lengths)
+        self.done = [0.0] * len(segments)
+        self.on_progress = on_progress
+        self.lock = threading.Lock()
+
+    def update(self, index, seconds):
+        with self.lock:
+            self._advance(index, seconds)
+        self._notify()
+
+    def finish(self, *indexes):
+        """
+        Marca shorts como completos: el último out_time queda un cuadro
+        antes del final.
+        """
+        with self.lock:
+            for index in indexes or range(len(self.lengths)):
+                self._advance(index, self.lengths[index])
+        self._notify()
+
+    def for_clip(self, index):
+        """
+        Callback para run_ffmpeg de un ffmpeg que renderiza solo un short.
+        """
+        return lambda seconds: self.update(index, seconds)
+
+    def for_single_pass(self):
+        """
+        Callback para run_ffmpeg en single_pass. out_time cuenta desde el
+        inicio del grafo (el short que empieza primero): de ahí sale la
+        posición en el original, y _advance recorta lo que le toca a cada
+        short (nada antes de su inicio, todo después de su final).
+        """
+        first_start = min(self.starts)
+
+        def report(seconds):
+            position = first_start + seconds
+            with self.lock:
+                for index, start in enumerate(self.starts):
+                    self._advance(index, position - start)
+            self._notify()
+
+        return report
+
+    def _advance(self, index, seconds):
+        self.done[index] = min(max(seconds, self.done[index]), self.lengths[index])
+
+    def _notify(self):
+        with self.lock:
+            fraction = sum(self.done) / self.total if self.total else 1.0
+        self.on_progress(fraction)
+
+
+def generate_shorts(
+    video_path,
+    clips_data,
+    type_short="vertical",
+    metadata=None,
+    mode=None,
+    on_progress=None,
+):
+    """
+    🔥 720x1280
+    🔥 libx264 + preset veryfast
+    🔥 cover generado desde el short ya procesado
+
+    metadata (de get_video_metadata) permite saltear trabajo innecesario,
+    ver plan_encode.
+
+    on_progress(fracción) recibe el avance del render (0-1) a medida
+    que ffmpeg lo reporta.
+
+    Devuelve una lista de dicts con short_path, cover_path, start y end,
+    en el mismo orden que los clips válidos de clips_data.
+    """
+    segments = normalize_segments(clips_data)
+
+    if not segments:
+        return []
+
+    if not metadata or "has_audio" not in metadata:
+        metadata = {**(metadata or {}), "has_audio": probe_has_audio(video_path)}
+
+    plan = plan_encode(metadata, type_short)
+    render_mode = resolve_render_mode(segments, mode)
+    if render_mode == "single_pass" and plan["audio"] and not plan["audio_confirmed"]:
+        # asplit necesita una pista que exista: sin saberlo se renderiza
+        # por clip, donde el audio se mapea como opcional
+        render_mode = "parallel" if available_cpus() > 1 else "sequential"
+    logger.info(f"🎞️ Render de {len(segments)} shorts en modo {render_mode}")
+
+    progress = RenderProgress(segments, on_progress) if on_progress else None
+
+    if render_mode == "single_pass":
+        return _generate_shorts_single_pass(video_path, segments, plan, progress)
+    if render_mode == "parallel":
+        return _generate_shorts_parallel(video_path, segments, plan, progress)
+    return _generate_shorts_sequential(video_path, segments, plan, progress)
+
+
+def cover_second(start, end):
+    """
+    Segundo del short (relativo a su inicio) que se usa de cover.
+    """
+    return round(min(1, (end - start) / 2), 3)
+
+
+def cover_output_args(label, second, cover_path):
+    """
+    Salida extra de ffmpeg: un JPEG del stream label en el segundo dado.
+    Sale del mismo decode que el short, sin volver a abrir el MP4.
+    """
+    return [
+        "-map",
+        label,
+        "-ss",
+        str(second),
+        "-frames:v",
+        "1",
+        "-q:v",
+        "2",
+        cover_path,
+    ]
+
+
+def render_short(video_path, start, end, plan, threads=None, on_progress=None):
+    """
+    Renderiza un short y su cover en un solo ffmpeg.
+    Si falla, borra lo que haya llegado a escribir.
+
+    on_progress(segundos) recibe cuánto del short lleva renderizado.
+    """
+    # en el spool: las tasks de la cola publish los suben desde otro worker
+    spool_dir = get_spool_dir()
+    with tempfile.NamedTemporaryFile(
+        suffix=".mp4", dir=spool_dir, delete=False
+    ) as temp_short, tempfile.NamedTemporaryFile(
+        suffix=".jpg", dir=spool_dir, delete=False
+    ) as temp_cover:
+        try:
+            started = time.monotonic()
+            command = ["ffmpeg", "-y"]
+            if threads:
+                command += ["-threads", str(threads)]
+            command += [
+                "-ss",
+                str(start),
+                "-t",
+                str(end - start),
+                "-i",
+                video_path,
+            ]
+            # aplicar el filtros según el tipo de short y separar el cover
+            chain = [plan["video_filter"]] if plan["video_filter"] else []
+            command += [
+                "-filter_complex",
+                "[0:v]" + ",".join(chain + ["split=2[v][c]"]),
+                "-map",
+                "[v]",
+            ]
+            if plan["audio"]:
+                # sin metadata no se sabe si hay audio: "?" lo hace opcional
+                command += ["-map", "0:a:0" if plan["audio_confirmed"] else "0:a:0?"]
+
+            # Codecs finales
+            command += encoder_args(plan)
+            if threads:
+                command += ["-threads", str(threads)]
+            command += [temp_short.name]
+
+            # Cover
+            command += cover_output_args(
+                "[c]", cover_second(start, end), temp_cover.name
+            )
+
+            run_ffmpeg(command, on_progress)
+
+            return {
+                "short_path": temp_short.name,
+                "cover_path": temp_cover.name,
+                "start": start,
+                "end": end,
+                "encode_seconds": round(time.monotonic() - started, 3),
+            }
 
-            except Exception:
-                # limpiar si falla
-                if os.path.exists(temp_short.name):
-                    os.unlink(temp_short.name)
-                raise
+        except Exception:
+            # limpiar si falla
+            cleanup_local_files(temp_short.name, temp_cover.name)
+            raise
+
+
+def cleanup_shorts_data(shorts_data):
+    """
+    Borra los archivos locales (short + cover) de una lista de shorts_data,
+    incluidos checkpoints de subidas por partes que hayan quedado.
+    """
+    for short in shorts_data:
+        for key in ("short_path", "cover_path"):
+            path = short.get(key)
+            if path:
+                cleanup_local_files(path, upload_checkpoint_path(path))
+
+
+def _generate_shorts_sequential(video_path, segments, plan, progress=None):
+    """
+    🔥 1 SOLO FFMPEG POR SHORT
+    """
+    shorts_data = []
+
+    try:
+        for i, (start, end) in enumerate(segments):
+            on_progress = progress.for_clip(i) if progress else None
+            shorts_data.append(
+                render_short(video_path, start, end, plan, on_progress=on_progress)
+            )
+            if progress:
+                progress.finish(i)
+    except Exception:
+        # si falla un short no deben quedar los anteriores en disco
+        cleanup_shorts_data(shorts_data)
+        raise
 
     return shorts_data
 
 
+def _generate_shorts_parallel(video_path, segments, plan, progress=None):
+    """
+    🔥 1 FFMPEG POR SHORT, VARIOS A LA VEZ
+    Los hilos de cada ffmpeg se reparten entre los workers para no
+    sobresuscribir la máquina.
+    """
+    workers, threads = render_worker_budget(len(segments))
+    logger.info(f"⚙️ Render paralelo: {workers} workers x {threads} hilos")
+
+    results = [None] * len(segments)
+    error = None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                _render_short_in_pool,
+                video_path,
+                start,
+                end,
+                plan,
+                threads,
+                progress.for_clip(i) if progress else None,
+            ): i
+            for i, (start, end) in enumerate(segments)
+        }
+
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+                if progress:
+                    progress.finish(futures[future])
+            except Exception as e:
+                if error is None:
+                    error = e
+                    # no arrancar los shorts que siguen en cola
+                    for pending in futures:
+                        pending.cancel()
+
+    if error is not None:
+        cleanup_shorts_data([r for r in results if r])
+        raise error
+
+    return results
+
+
+def _render_short_in_pool(*args):
+    """
+    render_short desde un hilo del pool. El progreso puede escribir en la
+    base desde este hilo: su conexión se cierra al terminar.
+    """
+    try:
+        return render_short(*args)
+    finally:
+        connections.close_all()
+
+
+def build_single_pass_filter(segments, video_filter, has_audio):
+    """
+    Arma el filter_complex que decodifica una sola vez y reparte
+    los frames a cada short:
+
+    [0:v]split=N[s0][s1]...;[s0]trim=...,setpts=PTS-STARTPTS,<filtro>,split=2[v0][c0];...
+    [0:a]asplit=N[t0][t1]...;[t0]atrim=...,asetpts=PTS-STARTPTS[a0];...
+
+    [cN] es la rama de la que sale el cover de cada short.
+
+    Los tiempos de segments deben ser relativos al inicio del input.
+    """
+    count = len(segments)
+    graph = [
+        "[0:v]split=" + str(count) + "".join(f"[s{i}]" for i in range(count))
+    ]
+
+    for i, (start, end) in enumerate(segments):
+        chain = [f"trim=start={start}:end={end}", "setpts=PTS-STARTPTS"]
+        if video_filter:
+            chain.append(video_filter)
+        chain.append(f"split=2[v{i}][c{i}]")
+        graph.append(f"[s{i}]" + ",".join(chain))
+
+    if has_audio:
+        graph.append(
+            "[0:a]asplit=" + str(count) + "".join(f"[t{i}]" for i in range(count))
+        )
+        for i, (start, end) in enumerate(segments):
+            graph.append(
+                f"[t{i}]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[a{i}]"
+            )
+
+    return ";".join(graph)
+
+
+def _generate_shorts_single_pass(video_path, segments, plan, progress=None):
+    """
+    🔥 1 SOLO FFMPEG PARA TODOS LOS SHORTS
+    El original se abre, demuxea y decodifica una única vez.
+    """
+    has_audio = plan["audio"] is not None and plan["audio_confirmed"]
+    if not has_audio:
+        plan = {**plan, "audio": None}
+    elif plan["audio"] == "copy":
+        # el audio pasa por atrim: no se puede copiar
+        plan = {**plan, "audio": "aac"}
+
+    # Solo se decodifica el rango que cubren los clips
+    offset = min(start for start, _ in segments)
+    span = max(end for _, end in segments) - offset
+    relative_segments = [
+        (round(start - offset, 3), round(end - offset, 3)) for start, end in segments
+    ]
+
+    short_paths = []
+    cover_paths = []
+    spool_dir = get_spool_dir()
+
+    try:
+        for _ in segments:
+            with tempfile.NamedTemporaryFile(
+                suffix=".mp4", dir=spool_dir, delete=False
+            ) as temp_short:
+                short_paths.append(temp_short.name)
+            with tempfile.NamedTemporaryFile(
+                suffix=".jpg", dir=spool_dir, delete=False
+            ) as temp_cover:
+                cover_paths.append(temp_cover.name)
+
+        command = [
+            "ffmpeg",
+            "-y",
+            "-ss",
+            str(offset),
+            "-t",
+            str(round(span, 3)),
+            "-i",
+            video_path,
+            "-filter_complex",
+            build_single_pass_filter(
+                relative_segments, plan["video_filter"], has_audio
+            ),
+        ]
+
+        for i, short_path in enumerate(short_paths):
+            command += ["-map", f"[v{i}]"]
+            if has_audio:
+                command += ["-map", f"[a{i}]"]
+            command += encoder_args(plan) + [short_path]
+
+        # covers en el mismo ffmpeg
+        for i, (cover_path, (start, end)) in enumerate(zip(cover_paths, segments)):
+            command += cover_output_args(f"[c{i}]", cover_second(start, end), cover_path)
+
+        run_ffmpeg(command, progress.for_single_pass() if progress else None)
+        if progress:
+            progress.finish()
+
+    except Exception:
+        # limpiar todo si falla cualquier short
+        for path in short_paths + cover_paths:
+            if os.path.exists(path):
+                os.unlink(path)
+        raise
+
+    return [
+        {
+            "short_path": short_path,
+            "cover_path": cover_path,
+            "start": start,
+            "end": end,
+        }
+        for short_path, cover_path, (start, end) in zip(
+            short_paths, cover_paths, segments
+        )
+    ]
+
+
 # =========================================================
 # METADATA
 # =========================================================
@@ -268,234 +864,1606 @@ def get_video_metadata(video_path):
         "aspect_ratio": f"{width // divisor}:{height // divisor}",
         "duration": float(data["format"].get("duration", 0)),
         "has_audio": audio_stream is not None,
+        "video_codec": video_stream.get("codec_name"),
+        "audio_codec": audio_stream.get("codec_name") if audio_stream else None,
     }
 
 
-# =========================================================
-# CELERY TASK
-# =========================================================
-@shared_task
-def process_video_task(video_id, temp_video_path, file_name, type_short):
-    video = None
-    job = None
-    cover_original_path = None
-    shorts_local_data = []
+def probe_has_audio(video_path):
+    """
+    True/False según el original tenga pista de audio; None si no se
+    pudo averiguar (sin ffprobe, archivo ilegible).
+    """
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "a",
+        "-show_entries",
+        "stream=index",
+        "-of",
+        "csv=p=0",
+        video_path,
+    ]
 
     try:
-        # -----------------------
-        # INIT
-        # -----------------------
-        with transaction.atomic():
-            video = Video.objects.select_for_update().get(id=video_id)
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"⚠️ No se pudo detectar el audio de {video_path}: {e}")
+        return None
 
-            if video.status == Video.Status.PROCESSING:
-                logger.warning(
-                    f"Video {video.id} ya está en processing. Abortando task duplicada."
-                )
-                return
+    return bool(result.stdout.strip())
 
-            video.status = Video.Status.PROCESSING
-            video.save()
 
-        job = ProcessingJob.objects.create(
-            video=video,
-            job_type=ProcessingJob.JobType.SHORTS_GENERATION,
-            status=ProcessingJob.Status.RUNNING,
-            started_at=timezone.now(),
-            progress=10,
-        )
+# =========================================================
+# SUBIDAS AL ALMACENAMIENTO
+# =========================================================
+def build_original_public_ids(video, job):
+    """
+    Devuelve (public_id, public_id con carpeta) del original.
+    Los shorts y covers se nombran a partir del segundo, así que se
+    puede calcular antes de subir nada. Usa el inicio del job para que
+    un reintento de la task genere los mismos nombres.
+    """
+    original_public_id = f"video_{video.id}_{int(job.started_at.timestamp())}"
+    return original_public_id, f"videos/original/{original_public_id}"
 
-        # -----------------------
-        # METADATA
-        # -----------------------
-        metadata = get_video_metadata(temp_video_path)
-        video.width = metadata["width"]
-        video.height = metadata["height"]
-        video.aspect_ratio = metadata["aspect_ratio"]
-        video.duration_seconds = metadata["duration"]
-        video.has_audio = metadata["has_audio"]
-        video.file_size = os.path.getsize(temp_video_path)
 
-        # SOLO ORIGINAL: validar horizontal
-        if video.height > video.width:
-            raise ValueError("Solo se permiten videos horizontales (landscape)")
+def original_upload_specs(
+    temp_video_path, cover_original_path, original_public_id, base_public_id
+):
+    return {
+        "original": (
+            temp_video_path,
+            {
+                "resource_type": "video",
+                "folder": "videos/original",
+                "public_id": original_public_id,
+            },
+        ),
+        "cover_original": (
+            cover_original_path,
+            {
+                "resource_type": "image",
+                "folder": "videos/covers/original",
+                "public_id": f"{base_public_id}_cover_original",
+            },
+        ),
+    }
 
-        video.save()
 
-        job.progress = 25
-        job.save()
+def short_upload_specs(index, short_info, base_public_id):
+    return {
+        f"short_{index}": (
+            short_info["short_path"],
+            {
+                "resource_type": "video",
+                "folder": "videos/shorts",
+                "public_id": f"{base_public_id}_short_{index}",
+            },
+        ),
+        f"cover_{index}": (
+            short_info["cover_path"],
+            {
+                "resource_type": "image",
+                "folder": "videos/covers",
+                "public_id": f"{base_public_id}_cover_{index}",
+            },
+        ),
+    }
 
-        # -----------------------
-        # GENERACIÓN SIMPLE (SIN IA)
-        # -----------------------
 
-        duration = metadata["duration"]
+def upload_assets(specs, timings=None, checkpoint=None):
+    """
+    Sube varios archivos al almacenamiento en paralelo con un pool acotado.
 
-        if duration <= 0:
-            raise ValueError("Video duration inválida o 0")
+    specs: {clave: (ruta, opciones de MediaStore.upload)}
+    Devuelve {clave: respuesta del almacenamiento}. Con timings (dict)
+    deja ahí los segundos de cada subida, por clave.
 
-        clips_data = generate_fallback_clips(duration)
+    Antes de subir reserva cada asset en el outbox: quien registra las
+    subidas las confirma (confirm_uploads) en su misma transacción.
+    Si falla cualquier subida, encola el borrado de las que sí
+    terminaron y relanza el error: o se suben todas o no queda ninguna.
 
-        if not clips_data:
-            raise ValueError("No se pudieron generar clips automáticamente")
+    Con checkpoint (dict {clave: asset subido}) se saltean las claves
+    que ya están ahí, cada subida terminada se agrega y un error no
+    borra nada: el reintento de la task reutiliza lo que llegó a subir.
+    """
+    if checkpoint is not None:
+        done = {key: checkpoint[key] for key in specs if key in checkpoint}
+        specs = {key: spec for key, spec in specs.items() if key not in done}
+    reserve_uploads(specs)
+
+    uploads = {}
+    error = None
+    workers = max(1, min(settings.CLOUDINARY_UPLOAD_WORKERS, len(specs)))
+
+    def timed_upload(key, path, options):
+        started = time.monotonic()
+        result = upload_file(path, **options)
+        if timings is not None:
+            timings[key] = round(time.monotonic() - started, 3)
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(timed_upload, key, path, options): key
+            for key, (path, options) in specs.items()
+        }
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                uploads[key] = future.result()
+            except Exception as e:
+                if error is None:
+                    error = e
+                    for pending in futures:
+                        pending.cancel()
+                continue
 
-        # -----------------------
-        # VALIDAR CLIPS CONTRA DURACIÓN REAL
-        # -----------------------
+            if checkpoint is not None:
+                checkpoint[key] = uploaded_asset(uploads[key])
 
-        validated_clips = []
-        for clip in clips_data:
-            start = max(0, float(clip.get("start", 0)))
-            end = min(duration, float(clip.get("end", 0)))
-            if end > start:
-                validated_clips.append({"start": round(start, 3), "end": round(end, 3)})
-        clips_data = validated_clips
+    if checkpoint is not None:
+        if error is not None:
+            raise error
+        return {**done, **uploads}
 
-        # Si no quedaron clips válidos, usar fallback
-        if len(clips_data) == 0:
-            logger.warning("⚠️ No quedaron clips válidos. Usando fallback.")
-            clips_data = generate_fallback_clips(duration)
+    if error is not None:
+        destroy_uploaded_assets(uploads, specs)
+        raise error
 
-        logger.info(f"📊 Clips encontrados: {clips_data}")
+    return uploads
 
-        job.progress = 30
-        job.save()
 
-        # -----------------------
-        # NORMALIZAR Y DETECTAR SUPERPOSICIÓN
-        # -----------------------
+def uploaded_asset(upload):
+    """
+    Lo que el pipeline usa de la respuesta de una subida (para el checkpoint).
+    """
+    return {
+        "public_id": upload["public_id"],
+        "secure_url": upload["secure_url"],
+        "resource_type": upload["resource_type"],
+    }
 
-        # Ordenar por start
-        clips_data = sorted(clips_data, key=lambda x: x["start"])
 
-        # Detectar superposición
-        for i in range(1, len(clips_data)):
-            if clips_data[i]["start"] < clips_data[i - 1]["end"]:
-                logger.warning(
-                    f"Clips superpuestos detectados entre "
-                    f"{clips_data[i - 1]} y {clips_data[i]}"
-                )
+class ResumableUploadError(Exception):
+    """
+    Una subida por partes se cortó. El checkpoint quedó en disco y la
+    subida se puede retomar reintentando la task.
+    """
 
-        # -----------------------
-        # GENERAR COVER ORIGINAL
-        # -----------------------
-        cover_original_path = generate_cover_from_video(temp_video_path, 1)
 
-        job.progress = 35
-        job.save()
+def upload_file(path, **options):
+    """
+    Sube un archivo al almacenamiento. En Cloudinary los archivos
+    grandes van por partes.
+    """
+    store = get_media_store()
+    if (
+        store.resumable
+        and os.path.getsize(path) > settings.CLOUDINARY_LARGE_UPLOAD_THRESHOLD
+    ):
+        return upload_large_resumable(path, **options)
+    return store.upload(path, **options)
 
-        # -----------------------
-        # GENERAR SHORTS LOCAL
-        # -----------------------
-        shorts_local_data = generate_shorts(
-            temp_video_path, clips_data, type_short=type_short
-        )
 
-        job.progress = 70
-        job.save()
+def upload_checkpoint_path(path):
+    return f"{path}.upload.json"
 
-        # ============================
-        # 🔥 SUBIDA A CLOUDINARY (SOLO SI TODO OK)
-        # ============================
 
-        # Subir original
-        original_upload = cloudinary.uploader.upload(
-            temp_video_path,
-            resource_type="video",
-            folder="videos/original",
-            public_id=f"video_{video.id}_{int(timezone.now().timestamp())}",
-        )
+def upload_large_resumable(path, **options):
+    """
+    Subida por partes a Cloudinary (Content-Range + X-Unique-Upload-Id)
+    con checkpoint.
 
-        video.file_url = original_upload["secure_url"]
-        video.cloudinary_public_id = original_upload["public_id"]
+    Después de cada parte aceptada se guarda el offset en
+    <path>.upload.json. Si la task se reintenta, la subida sigue desde
+    ese offset con el mismo upload_id en vez de empezar de cero.
+    """
+    checkpoint_path = upload_checkpoint_path(path)
+    file_size = os.path.getsize(path)
+    chunk_size = settings.CLOUDINARY_UPLOAD_CHUNK_SIZE
+
+    checkpoint = _read_upload_checkpoint(checkpoint_path)
+    if (
+        not checkpoint
+        or checkpoint["size"] != file_size
+        or checkpoint["public_id"] != options.get("public_id")
+    ):
+        checkpoint = {
+            "upload_id": cloudinary.utils.random_public_id(),
+            "public_id": options.get("public_id"),
+            "size": file_size,
+            "offset": 0,
+        }
+    else:
+        logger.info(f"⏯️ Retomando subida de {path} desde byte {checkpoint['offset']}")
+
+    offset = checkpoint["offset"]
+    result = None
+
+    with open(path, "rb") as file_io:
+        file_io.seek(offset)
+
+        while offset < file_size:
+            chunk = file_io.read(chunk_size)
+            http_headers = {
+                "Content-Range": f"bytes {offset}-{offset + len(chunk) - 1}/{file_size}",
+                "X-Unique-Upload-Id": checkpoint["upload_id"],
+            }
+            result = _upload_part(
+                (os.path.basename(path), chunk), http_headers, options
+            )
 
-        # Subir cover original
-        cover_original_upload = cloudinary.uploader.upload(
-            cover_original_path,
-            resource_type="image",
-            folder="videos/covers/original",
-            public_id=f"{video.cloudinary_public_id}_cover_original",
+            offset += len(chunk)
+            checkpoint["offset"] = offset
+            _write_upload_checkpoint(checkpoint_path, checkpoint)
+
+    if result is None:
+        # Todas las partes ya se habían subido en un intento anterior
+        folder = options.get("folder")
+        public_id = options.get("public_id")
+        result = cloudinary.api.resource(
+            f"{folder}/{public_id}" if folder else public_id,
+            resource_type=options.get("resource_type", "image"),
         )
 
-        video.cover_original_url = cover_original_upload["secure_url"]
-        video.cover_original_cloudinary_public_id = cover_original_upload["public_id"]
-        video.save()
-        video.shorts.all().delete()  # limpiar shorts anteriores por si acaso
+    cleanup_local_files(checkpoint_path)
+    return result
 
-        # -----------------------
-        # Subir shorts (IDEMPOTENTE)
-        # ----------------------
 
-        for i, short_info in enumerate(shorts_local_data, 1):
+def _upload_part(part, http_headers, options):
+    """
+    Sube una parte, con unos pocos reintentos inmediatos para cortes breves.
+    """
+    attempts = settings.CLOUDINARY_UPLOAD_PART_ATTEMPTS
 
-            short_upload = cloudinary.uploader.upload(
-                short_info["short_path"],
-                resource_type="video",
-                folder="videos/shorts",
-                public_id=f"{video.cloudinary_public_id}_short_{i}",
+    for attempt in range(1, attempts + 1):
+        try:
+            return cloudinary.uploader.upload_large_part(
+                part, http_headers=http_headers, **options
             )
+        except Exception as e:
+            logger.warning(
+                f"Parte {http_headers['Content-Range']} falló "
+                f"(intento {attempt}/{attempts}): {str(e)}"
+            )
+            if attempt == attempts:
+                raise ResumableUploadError(str(e)) from e
+            time.sleep(attempt)
+
+
+def _read_upload_checkpoint(checkpoint_path):
+    try:
+        with open(checkpoint_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_upload_checkpoint(checkpoint_path, checkpoint):
+    # escribir y renombrar: un corte a mitad nunca deja un JSON roto
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
 
-            cover_upload = cloudinary.uploader.upload(
-                short_info["cover_path"],
-                resource_type="image",
-                folder="videos/covers",
-                public_id=f"{video.cloudinary_public_id}_cover_{i}",
+def upload_retry_countdown(retries):
+    return settings.CLOUDINARY_UPLOAD_RETRY_DELAY * (2**retries)
+
+
+def destroy_uploaded_assets(uploads, specs):
+    """
+    Encola en el outbox el borrado de subidas que no se van a registrar.
+    """
+    assets = {}
+    for key, upload in uploads.items():
+        assets.setdefault(specs[key][1]["resource_type"], []).append(upload["public_id"])
+    enqueue_destroy(assets)
+    if assets:
+        logger.info(f"Assets huérfanos encolados para borrar: {assets}")
+
+
+# =========================================================
+# PLAN DE CLIPS
+# =========================================================
+def plan_clips(duration, video_path=None, has_audio=True, cover_path=None):
+    """
+    Calcula los clips a generar, validados contra la duración real
+    y ordenados por start.
+
+    Con video_path (y SHORTS_HIGHLIGHTS) busca los mejores fragmentos
+    por cortes de escena y volumen; si el análisis falla o tarda
+    demasiado se queda con los cortes fijos. Si el análisis corre y
+    termina bien, de paso escribe el cover del original en cover_path.
+    """
+    if duration <= 0:
+        raise ValueError("Video duration inválida o 0")
+
+    # -----------------------
+    # GENERACIÓN SIMPLE (SIN IA)
+    # -----------------------
+    clips_data = generate_fallback_clips(duration)
+
+    if not clips_data:
+        raise ValueError("No se pudieron generar clips automáticamente")
+
+    # -----------------------
+    # HIGHLIGHTS (misma cantidad de clips)
+    # -----------------------
+    if video_path and settings.SHORTS_HIGHLIGHTS and duration > MAX_CLIP_SECONDS:
+        clips_data = (
+            find_highlight_clips(
+                video_path, duration, has_audio, len(clips_data), cover_path
             )
+            or clips_data
+        )
+
+    # -----------------------
+    # VALIDAR CLIPS CONTRA DURACIÓN REAL
+    # -----------------------
+    validated_clips = []
+    for clip in clips_data:
+        start = max(0, float(clip.get("start", 0)))
+        end = min(duration, float(clip.get("end", 0)))
+        if end > start:
+            validated_clips.append({"start": round(start, 3), "end": round(end, 3)})
+    clips_data = validated_clips
+
+    # Si no quedaron clips válidos, usar fallback
+    if len(clips_data) == 0:
+        logger.warning("⚠️ No quedaron clips válidos. Usando fallback.")
+        clips_data = generate_fallback_clips(duration)
+
+    logger.info(f"📊 Clips encontrados: {clips_data}")
 
-            Short.objects.create(
-                video=video,
-                file_url=short_upload["secure_url"],
-                cloudinary_public_id=short_upload["public_id"],
-                cover_url=cover_upload["secure_url"],
-                cover_cloudinary_public_id=cover_upload["public_id"],
-                start_second=short_info["start"],
-                end_second=short_info["end"],
-                status=Short.Status.READY,
+    # -----------------------
+    # NORMALIZAR Y DETECTAR SUPERPOSICIÓN
+    # -----------------------
+
+    # Ordenar por start
+    clips_data = sorted(clips_data, key=lambda x: x["start"])
+
+    # Detectar superposición
+    for i in range(1, len(clips_data)):
+        if clips_data[i]["start"] < clips_data[i - 1]["end"]:
+            logger.warning(
+                f"Clips superpuestos detectados entre "
+                f"{clips_data[i - 1]} y {clips_data[i]}"
             )
 
-        logger.info(f"TOTAL SHORTS EN DB: {video.shorts.count()}")
-        # -----------------------
-        # FINALIZAR
-        # -----------------------
-        video.status = Video.Status.READY
+    return clips_data
+
+
+# =========================================================
+# ETAPAS COMPARTIDAS DEL PIPELINE
+# =========================================================
+def start_processing(video_id, resume=False):
+    """
+    Marca el video como PROCESSING y crea su ProcessingJob.
+    Devuelve (video, job), o (None, None) si ya se estaba procesando
+    o si el video se borró mientras esperaba en la cola.
+
+    resume=True (reintento de la misma task, o mensaje reentregado
+    porque el worker murió) acepta el video en PROCESSING y reutiliza
+    su job RUNNING.
+    """
+    with transaction.atomic():
+        video = Video.objects.select_for_update().get(id=video_id)
+
+        if video.deleted_at:
+            logger.warning(f"Video {video.id} borrado. Abortando procesamiento.")
+            return None, None
+
+        if video.status == Video.Status.PROCESSING and not resume:
+            logger.warning(
+                f"Video {video.id} ya está en processing. Abortando task duplicada."
+            )
+            return None, None
+
+        # Reentrega de una task que terminó pero no llegó a confirmarse
+        if video.status == Video.Status.READY and resume:
+            logger.warning(f"Video {video.id} ya procesado. Abortando reentrega.")
+            return None, None
+
+        video.status = Video.Status.PROCESSING
+        video.save(update_fields=["status"])
+
+    job = None
+    if resume:
+        job = video.processing_jobs.filter(
+            status=ProcessingJob.Status.RUNNING
+        ).first()
+
+    if job is None:
+        job = ProcessingJob.objects.create(
+            video=video,
+            job_type=ProcessingJob.JobType.SHORTS_GENERATION,
+            status=ProcessingJob.Status.RUNNING,
+            started_at=timezone.now(),
+            progress=10,
+        )
+
+    publish_progress(video, job.progress)
+    return video, job
+
+
+def advance_job(video, job, progress):
+    """
+    Fin de una etapa: guarda el progreso en la base (solo esa columna)
+    y en la cache. Nunca baja (un reintento vuelve a pasar por etapas
+    ya hechas).
+    """
+    job.progress = max(job.progress, progress)
+    job.save(update_fields=["progress"])
+    publish_progress(video, job.progress)
+
+
+# Como mucho una publicación de progreso por segundo
+PROGRESS_WRITE_INTERVAL = 1.0
+
+
+def job_progress_writer(video, job, start, end):
+    """
+    Devuelve on_progress(fracción) que publica el progreso del job,
+    de start a end, en la cache (la base se actualiza en advance_job).
+    Solo publica si el valor sube y pasó PROGRESS_WRITE_INTERVAL desde
+    la última vez.
+    """
+    lock = threading.Lock()
+    state = {"written_at": 0.0, "progress": job.progress}
+
+    def on_progress(fraction):
+        progress = start + int((end - start) * min(max(fraction, 0), 1))
+
+        with lock:
+            now = time.monotonic()
+            if (
+                progress <= state["progress"]
+                or now - state["written_at"] < PROGRESS_WRITE_INTERVAL
+            ):
+                return
+            state["written_at"] = now
+            state["progress"] = progress
+            publish_progress(video, progress)
+
+    return on_progress
+
+
+def probe_video(video, temp_video_path):
+    """
+    Lee la metadata del original y la guarda en el Video.
+    """
+    metadata = get_video_metadata(temp_video_path)
+    video.width = metadata["width"]
+    video.height = metadata["height"]
+    video.aspect_ratio = metadata["aspect_ratio"]
+    video.duration_seconds = metadata["duration"]
+    video.has_audio = metadata["has_audio"]
+    video.file_size = os.path.getsize(temp_video_path)
+
+    # SOLO ORIGINAL: validar horizontal
+    if video.height > video.width:
+        raise ValueError("Solo se permiten videos horizontales (landscape)")
+
+    video.save(
+        update_fields=[
+            "width",
+            "height",
+            "aspect_ratio",
+            "duration_seconds",
+            "has_audio",
+            "file_size",
+        ]
+    )
+    return metadata
+
+
+def create_short(video, short_info, short_upload, cover_upload):
+    return Short.objects.create(
+        video=video,
+        file_url=short_upload["secure_url"],
+        cloudinary_public_id=short_upload["public_id"],
+        cover_url=cover_upload["secure_url"],
+        cover_cloudinary_public_id=cover_upload["public_id"],
+        start_second=short_info["start"],
+        end_second=short_info["end"],
+        status=Short.Status.READY,
+    )
+
+
+def fetch_source(video, source_url, temp_video_path):
+    """
+    Trae al spool el original que el cliente subió directo al
+    almacenamiento (con MEDIA_STORE=local, desde serve_media).
+    """
+    if os.path.exists(temp_video_path):
+        return  # reintento: ya se descargó
+
+    video.content_hash = download_to_spool(source_url, temp_video_path)
+    video.save(update_fields=["content_hash"])
+
+
+def finish_processing(video, job, timer=None):
+    """
+    Deja el Video en READY y el job en COMPLETED, con los tiempos de
+    timer (StageTimer) si se midieron.
+    """
+    video.status = Video.Status.READY
+    with timer.stage("finalize") if timer else nullcontext():
         video.generated_shorts_count = video.shorts.count()
-        video.save()
+        with transaction.atomic():
+            video.save(update_fields=["status", "generated_shorts_count"])
+            discard_source_asset(video)
 
-        job.status = ProcessingJob.Status.COMPLETED
-        job.progress = 100
+    job.status = ProcessingJob.Status.COMPLETED
+    job.progress = 100
+    job.finished_at = timezone.now()
+    job.checkpoint = {}
+    if timer:
+        job.timings = timer.report()
+        logger.info(f"⏱️ Video {video.id}: {timer.summary()}")
+    job.save()
+    StageTimer.publish(job.status, job.timings)
+    publish_progress(video, job.progress)
+    purge_if_deleted(video)
+
+    logger.info(f"✅ Video {video.id} procesado correctamente")
+
+
+def discard_source_asset(video):
+    """
+    Encola el borrado del archivo de la subida directa: una vez
+    procesado el original vive en videos/original.
+    """
+    if video.source_public_id:
+        enqueue_destroy({"video": [video.source_public_id]})
+
+
+def fail_processing(video, job, error, timer=None):
+    """
+    Deja el Video en FAILED y el job en FAILED con el mensaje de error
+    (y los tiempos de las etapas que llegaron a correr).
+    """
+    logger.error(f"❌ Error procesando video {video.id if video else '?'}: {error}")
+
+    if video:
+        video.status = Video.Status.FAILED
+        video.save(update_fields=["status"])
+
+    if job:
+        job.status = ProcessingJob.Status.FAILED
+        job.error_message = str(error)[:300]
         job.finished_at = timezone.now()
+        if timer:
+            job.timings = timer.report()
         job.save()
+        StageTimer.publish(job.status, job.timings)
+
+    if video:
+        publish_progress(
+            video, job.progress if job else 0, job.error_message if job else None
+        )
+        purge_if_deleted(video)
+
+
+def cleanup_local_files(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+
+# =========================================================
+# CHECKPOINTS
+# =========================================================
+def save_checkpoint(job, **stages):
+    """
+    Guarda en el job el resultado de etapas ya hechas: un reintento de
+    process_video_task las saltea. Se relee con lock: mientras se
+    renderiza, publish_original_task escribe en el mismo checkpoint.
+    """
+    with transaction.atomic():
+        checkpoint = (
+            ProcessingJob.objects.select_for_update()
+            .values_list("checkpoint", flat=True)
+            .get(id=job.id)
+        )
+        checkpoint.update(stages)
+        ProcessingJob.objects.filter(id=job.id).update(checkpoint=checkpoint)
+    job.checkpoint = checkpoint
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as local_file:
+        for chunk in iter(lambda: local_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checkpoint_file(path):
+    return {"path": path, "sha256": file_sha256(path)}
+
+
+def restore_file(entry):
+    """
+    Ruta de un archivo del checkpoint si sigue en disco y sin cambios
+    (el reintento puede caer en otro worker); si no, None.
+    """
+    if not entry or not os.path.isfile(entry["path"]):
+        return None
+    if file_sha256(entry["path"]) != entry["sha256"]:
+        return None
+    return entry["path"]
+
+
+def checkpoint_short(short_info):
+    return {
+        "start": short_info["start"],
+        "end": short_info["end"],
+        "short": checkpoint_file(short_info["short_path"]),
+        "cover": checkpoint_file(short_info["cover_path"]),
+    }
+
+
+def restore_shorts(entries, video_path, type_short, metadata):
+    """
+    Shorts renderizados por un intento anterior. Los que ya no están en
+    disco (o cambiaron) se vuelven a renderizar, de a uno.
+    """
+    shorts = []
+    for entry in entries:
+        short_path = restore_file(entry["short"])
+        cover_path = restore_file(entry["cover"])
+        if short_path and cover_path:
+            shorts.append(
+                {
+                    "short_path": short_path,
+                    "cover_path": cover_path,
+                    "start": entry["start"],
+                    "end": entry["end"],
+                }
+            )
+            continue
+
+        cleanup_local_files(entry["short"]["path"], entry["cover"]["path"])
+        shorts.extend(
+            generate_shorts(
+                video_path,
+                [entry],
+                type_short=type_short,
+                metadata=metadata,
+                mode="sequential",
+            )
+        )
+    return shorts
+
+
+def discard_checkpoint(job):
+    """
+    Sin más reintentos: encola el borrado de lo que se llegó a subir y
+    borra los archivos locales de las etapas guardadas.
+    """
+    if job is None:
+        return
+
+    assets = {}
+    for upload in job.checkpoint.get("uploads", {}).values():
+        assets.setdefault(upload["resource_type"], []).append(upload["public_id"])
+    enqueue_destroy(assets)
+
+    cover_original = job.checkpoint.get("cover_original")
+    if cover_original:
+        cleanup_local_files(cover_original["path"])
+    cleanup_shorts_data(
+        {"short_path": entry["short"]["path"], "cover_path": entry["cover"]["path"]}
+        for entry in job.checkpoint.get("shorts", [])
+    )
+
+    job.checkpoint = {}
+
+
+def processing_retry_countdown(retries):
+    return settings.VIDEO_PROCESSING_RETRY_DELAY * (2**retries)
+
+
+# =========================================================
+# CELERY TASK
+# =========================================================
+@shared_task(bind=True, max_retries=settings.VIDEO_PROCESSING_MAX_RETRIES)
+def process_video_task(
+    self,
+    video_id,
+    temp_video_path,
+    file_name,
+    type_short,
+    source_url=None,
+    spool_node=None,
+):
+    """
+    Pipeline de un video hasta tener los shorts renderizados; las
+    subidas las hace el chord de dispatch_video_pipeline en la cola
+    publish (la del original arranca antes del render, para que suba
+    mientras se codifican los shorts). Cada etapa terminada queda en job.checkpoint: si algo
+    falla se reintenta con backoff y el reintento retoma desde la
+    última etapa completa. Los errores de validación (ValueError) no se
+    reintentan. Con acks_late, si el worker muere el mensaje vuelve a
+    la cola y también retoma.
+    """
+    video = None
+    job = None
+    cover_original_path = None
+    shorts_local_data = []
+    # True cuando el resto del trabajo quedó en manos del chord
+    handed_off = False
+    # True cuando la task se reintenta: el original y el checkpoint se conservan
+    retrying = False
+    timer = StageTimer()
+    attempt = 0
+
+    try:
+        # -----------------------
+        # INIT
+        # -----------------------
+        redelivered = (self.request.delivery_info or {}).get("redelivered")
+        video, job = start_processing(
+            video_id, resume=self.request.retries > 0 or bool(redelivered)
+        )
+        if video is None:
+            return
+        checkpoint = job.checkpoint
+
+        # Intentos, contando los que cortó la muerte del worker: un
+        # video que tumba al worker no vuelve a la cola para siempre
+        attempt = checkpoint.get("attempt", 0) + 1
+        save_checkpoint(job, attempt=attempt)
+        if attempt > self.max_retries + 1:
+            raise RuntimeError("El procesamiento se interrumpió demasiadas veces")
+
+        stages = [stage for stage in checkpoint if stage != "attempt"]
+        if stages:
+            logger.info(f"⏯️ Video {video.id}: retomando desde {', '.join(stages)}")
+
+        # -----------------------
+        # DESCARGA (SUBIDA DIRECTA)
+        # -----------------------
+        with timer.stage("download"):
+            if source_url:
+                fetch_source(video, source_url, temp_video_path)
+            elif spool_node:
+                temp_video_path = localize_spool_file(temp_video_path, spool_node)
+
+        # -----------------------
+        # METADATA
+        # -----------------------
+        metadata = checkpoint.get("metadata")
+        if metadata is None:
+            with timer.stage("metadata"):
+                metadata = probe_video(video, temp_video_path)
+            save_checkpoint(job, metadata=metadata)
+
+        timer.input = {
+            "duration": metadata["duration"],
+            "width": metadata["width"],
+            "height": metadata["height"],
+            "file_size": video.file_size,
+            "video_codec": metadata.get("video_codec"),
+            "has_audio": metadata["has_audio"],
+            "type_short": type_short,
+        }
+        advance_job(video, job, 25)
+
+        # -----------------------
+        # PLAN DE CLIPS + COVER ORIGINAL
+        # -----------------------
+        clips_data = checkpoint.get("clips")
+        cover_original_path = restore_file(checkpoint.get("cover_original"))
+
+        if clips_data is None:
+            # el análisis de highlights ya decodifica el original: el cover
+            # sale de esa misma pasada y solo se genera aparte si no corrió
+            with tempfile.NamedTemporaryFile(
+                suffix=".jpg", dir=get_spool_dir(), delete=False
+            ) as temp_cover:
+                cover_original_path = temp_cover.name
+
+            with timer.stage("plan"):
+                clips_data = plan_clips(
+                    metadata["duration"],
+                    temp_video_path,
+                    metadata["has_audio"],
+                    cover_path=cover_original_path,
+                )
+
+            if not os.path.getsize(cover_original_path):
+                cleanup_local_files(cover_original_path)
+                cover_original_path = None
+
+        if cover_original_path is None:
+            with timer.stage("cover"):
+                cover_original_path = generate_cover_from_video(temp_video_path, 1)
+
+        save_checkpoint(
+            job, clips=clips_data, cover_original=checkpoint_file(cover_original_path)
+        )
+        timer.input["shorts"] = len(clips_data)
+        advance_job(video, job, 35)
+
+        # -----------------------
+        # SUBIR ORIGINAL (EN PARALELO AL RENDER)
+        # -----------------------
+        if not settings.VIDEO_PIPELINE_FANOUT and not checkpoint.get("original_dispatched"):
+            dispatch_original_upload(video, job, temp_video_path, cover_original_path)
+
+        # -----------------------
+        # FAN-OUT: 1 TASK POR SHORT
+        # -----------------------
+        if settings.VIDEO_PIPELINE_FANOUT:
+            # las tasks del chord no suman sus tiempos: quedan los de acá
+            job.timings = timer.report()
+            job.save(update_fields=["timings"])
+            dispatch_video_pipeline(
+                video,
+                job,
+                temp_video_path,
+                cover_original_path,
+                clips_data,
+                type_short,
+                metadata,
+            )
+            handed_off = True
+            return
+
+        # -----------------------
+        # GENERAR SHORTS LOCAL
+        # -----------------------
+        with timer.stage("render"):
+            if "shorts" in checkpoint:
+                shorts_local_data = restore_shorts(
+                    checkpoint["shorts"], temp_video_path, type_short, metadata
+                )
+            else:
+                shorts_local_data = generate_shorts(
+                    temp_video_path,
+                    clips_data,
+                    type_short=type_short,
+                    metadata=metadata,
+                    on_progress=job_progress_writer(video, job, 35, 70),
+                )
+        # los tiempos por short (encode_seconds; en single_pass no hay)
+        # los devuelve publish_short_task y los suma finalize_video_task
+        save_checkpoint(
+            job, shorts=[checkpoint_short(short) for short in shorts_local_data]
+        )
+
+        advance_job(video, job, 70)
+
+        # ============================
+        # 🔥 PUBLICAR (SOLO SI TODO OK)
+        # ============================
+        # Las subidas no ocupan este worker: van a la cola publish, y el
+        # chord deja el video READY cuando están todas (y el original,
+        # que se empezó a subir antes del render)
+        job.timings = timer.report()
+        job.save(update_fields=["timings"])
+        dispatch_video_pipeline(
+            video,
+            job,
+            temp_video_path,
+            cover_original_path,
+            clips_data,
+            type_short,
+            metadata,
+            shorts_data=shorts_local_data,
+            join_original=True,
+        )
+        handed_off = True
+
+    except Exception as e:
+        if (
+            job is not None
+            and not isinstance(e, ValueError)
+            and attempt <= self.max_retries
+        ):
+            save_checkpoint(job)
+            logger.warning(
+                f"⏯️ Falló el video {video_id} ({type(e).__name__}: {e}), "
+                f"intento {attempt}, reintentando"
+            )
+            retrying = True
+            raise self.retry(
+                exc=e, countdown=processing_retry_countdown(self.request.retries)
+            )
+
+        if job is not None:
+            # lo que subió publish_original_task mientras se renderizaba
+            job.refresh_from_db(fields=["checkpoint"])
+        original_dispatched = job is not None and job.checkpoint.get("original_dispatched")
+        discard_checkpoint(job)
+        if original_dispatched:
+            rollback_video_pipeline(video, job, e, timer)
+        else:
+            fail_processing(video, job, e, timer)
+
+    finally:
+        if not handed_off and not retrying:
+            cleanup_local_files(cover_original_path)
+            cleanup_shorts_data(shorts_local_data)
 
-        logger.info(f"✅ Video {video_id} procesado correctamente")
+            logger.info(f"||||||||||||||||||Borrando-Video|||||||||||")
+            cleanup_local_files(
+                temp_video_path, upload_checkpoint_path(temp_video_path)
+            )
+
+
+# =========================================================
+# CELERY CHORD (RENDER + PUBLICACIÓN POR SHORT)
+# =========================================================
+def spool_routed(signature):
+    """
+    Sin spool compartido las tasks del video van a la cola de este
+    nodo, que es el que tiene el original.
+    """
+    queue = local_spool_queue()
+    return signature.set(queue=queue) if queue else signature
+
+
+def dispatch_original_upload(video, job, temp_video_path, cover_original_path):
+    """
+    Sin fan-out: la subida del original arranca en la cola publish
+    antes del render, así sube mientras se codifican los shorts.
+    finalize_video_task espera su resultado (join_original).
+    """
+    original_public_id, _ = build_original_public_ids(video, job)
+    spool_routed(
+        publish_original_task.si(
+            video.id, job.id, temp_video_path, cover_original_path, original_public_id
+        )
+    ).apply_async()
+    save_checkpoint(job, original_dispatched=True)
+    logger.info(f"🚀 Video {video.id}: subiendo el original mientras se renderiza")
+
+
+def dispatch_video_pipeline(
+    video,
+    job,
+    temp_video_path,
+    cover_original_path,
+    clips_data,
+    type_short,
+    metadata,
+    shorts_data=None,
+    join_original=False,
+):
+    """
+    Reparte la publicación del video en tasks; las subidas van a la
+    cola publish y no ocupan un worker de render.
+
+    chord(
+        publish_original_task,
+        render_short_task | publish_short_task  x N,
+    ) -> finalize_video_task
+
+    Con shorts_data (ya renderizados por process_video_task) cada short
+    va directo a publish_short_task. Con join_original el original ya
+    se está subiendo (dispatch_original_upload): no va en el chord y
+    finalize_video_task espera su resultado en el checkpoint.
+
+    Las tasks del chord no fallan: sin más reintentos devuelven su error
+    (ver retry_pipeline_part) y finalize_video_task, que corre recién
+    cuando terminaron todas, decide si el video queda READY o se deshace.
+
+    Sin spool compartido todas van a la cola de este nodo, que es el que
+    tiene temp_video_path. El public_id del original se fija acá para que los shorts puedan
+    nombrarse sin esperar a que termine la subida del original.
+    """
+    original_public_id, base_public_id = build_original_public_ids(video, job)
+    total_shorts = len(shorts_data) if shorts_data is not None else len(clips_data)
+    routed = spool_routed
+
+    video.shorts.all().delete()  # limpiar shorts anteriores por si acaso
+
+    header = []
+    if not join_original:
+        header.append(
+            routed(
+                publish_original_task.si(
+                    video.id, job.id, temp_video_path, cover_original_path, original_public_id
+                )
+            )
+        )
+
+    if shorts_data is not None:
+        header += [
+            routed(
+                publish_short_task.si(
+                    short_info, video.id, job.id, index, base_public_id, total_shorts
+                )
+            )
+            for index, short_info in enumerate(shorts_data, 1)
+        ]
+    else:
+        header += [
+            routed(
+                render_short_task.si(
+                    video.id,
+                    job.id,
+                    temp_video_path,
+                    index,
+                    clip,
+                    type_short,
+                    metadata,
+                    base_public_id,
+                )
+            )
+            | routed(
+                publish_short_task.s(
+                    video.id, job.id, index, base_public_id, total_shorts
+                )
+            )
+            for index, clip in enumerate(clips_data, 1)
+        ]
+
+    callback = routed(
+        finalize_video_task.s(
+            video.id, job.id, temp_video_path, join_original=join_original
+        ).on_error(
+            routed(fail_video_pipeline_task.s(video.id, job.id, temp_video_path))
+        )
+    )
+
+    chord(header)(callback)
+    logger.info(f"🚀 Video {video.id}: {total_shorts} shorts repartidos en workers")
+
+
+def start_pipeline_part(job_id, part):
+    """
+    Cuenta un intento más de una task del chord, también los que cortó
+    la muerte del worker (acks_late). Devuelve (job, intento); job es
+    None si el pipeline ya terminó (reentrega tardía).
+    """
+    with transaction.atomic():
+        job = (
+            ProcessingJob.objects.select_for_update()
+            .filter(id=job_id, status=ProcessingJob.Status.RUNNING)
+            .first()
+        )
+        if job is None:
+            return None, 0
+
+        attempts = job.checkpoint.setdefault("attempts", {})
+        attempts[part] = attempts.get(part, 0) + 1
+        job.save(update_fields=["checkpoint"])
+
+    return job, attempts[part]
+
+
+def save_part_checkpoint(job_id, stage, entries):
+    """
+    save_checkpoint para las tasks del chord: varias escriben el mismo
+    job a la vez, así que se relee con lock antes de agregar lo suyo
+    ({clave: valor} dentro de la etapa).
+    """
+    with transaction.atomic():
+        job = ProcessingJob.objects.select_for_update().get(id=job_id)
+        job.checkpoint.setdefault(stage, {}).update(entries)
+        job.save(update_fields=["checkpoint"])
+
+
+def can_retry_part(task, attempt, error):
+    """
+    Misma política que process_video_task: se reintenta con backoff
+    salvo errores de validación (ValueError) o intentos agotados.
+    """
+    return not isinstance(error, ValueError) and attempt <= task.max_retries
+
+
+def retry_pipeline_part(task, part, attempt, error, countdown):
+    """
+    Reintenta la task si can_retry_part. Sin más reintentos no relanza,
+    devuelve el error: así el chord espera a las demás tasks (que siguen
+    leyendo el original) antes de correr finalize_video_task.
+    """
+    if can_retry_part(task, attempt, error):
+        logger.warning(
+            f"⏯️ Falló {part} ({type(error).__name__}: {error}), "
+            f"intento {attempt}, reintentando"
+        )
+        raise task.retry(exc=error, countdown=countdown(task.request.retries))
+
+    logger.error(f"❌ Falló {part}: {error}")
+    return {"part": part, "error": f"{part}: {error}"}
+
+
+def upload_part_assets(job, specs, timings):
+    """
+    upload_assets con el checkpoint del job: un reintento no vuelve a
+    subir lo que ya llegó, y lo subido queda anotado aunque falle otra
+    subida (si el video no termina, rollback_video_pipeline lo borra).
+    Deja en timings los segundos de cada subida hecha.
+    """
+    uploaded = dict(job.checkpoint.get("uploads", {}))
+    try:
+        return upload_assets(specs, timings=timings, checkpoint=uploaded)
+    finally:
+        save_part_checkpoint(
+            job.id, "uploads", {key: uploaded[key] for key in specs if key in uploaded}
+        )
+
+
+@shared_task(bind=True, max_retries=settings.CLOUDINARY_UPLOAD_MAX_RETRIES)
+def publish_original_task(
+    self, video_id, job_id, temp_video_path, cover_original_path, original_public_id
+):
+    """
+    Sube el original y su cover. No borra temp_video_path:
+    lo siguen leyendo los render_short_task (o process_video_task).
+
+    El resultado queda además en checkpoint["parts"]: sin fan-out corre
+    fuera del chord y finalize_video_task lo lee de ahí.
+    """
+    part = "original"
+    job, attempt = start_pipeline_part(job_id, part)
+    if job is None:
+        return {"part": part}
+
+    retrying = False
+    upload_timings = {}
+    try:
+        if attempt > self.max_retries + 1:
+            raise RuntimeError("La subida se interrumpió demasiadas veces")
+
+        base_public_id = f"videos/original/{original_public_id}"
+        uploads = upload_part_assets(
+            job,
+            original_upload_specs(
+                temp_video_path,
+                cover_original_path,
+                original_public_id,
+                base_public_id,
+            ),
+            upload_timings,
+        )
+
+        # update() para no pisar campos que escriben otras tasks del chord
+        with transaction.atomic():
+            running = ProcessingJob.objects.select_for_update().filter(
+                id=job_id, status=ProcessingJob.Status.RUNNING
+            )
+            if not running.exists():
+                # el video falló mientras se subía: nadie va a registrar esto
+                enqueue_destroy(
+                    {
+                        upload["resource_type"]: [upload["public_id"]]
+                        for upload in uploads.values()
+                    }
+                )
+                return {"part": part}
+
+            Video.objects.filter(id=video_id).update(
+                file_url=uploads["original"]["secure_url"],
+                cloudinary_public_id=uploads["original"]["public_id"],
+                cover_original_url=uploads["cover_original"]["secure_url"],
+                cover_original_cloudinary_public_id=uploads["cover_original"]["public_id"],
+            )
+            confirm_uploads(upload["public_id"] for upload in uploads.values())
+        result = {"part": part, "uploads": upload_timings}
+
+    except Exception as e:
+        retrying = can_retry_part(self, attempt, e)
+        result = retry_pipeline_part(self, part, attempt, e, upload_retry_countdown)
+
+    finally:
+        if not retrying:
+            cleanup_local_files(cover_original_path)
+
+    save_part_checkpoint(job_id, "parts", {part: result})
+    return result
+
+
+def short_published(video_id, index, base_public_id):
+    """
+    Reentrega (acks_late) de un short que ya quedó registrado.
+    """
+    short_public_id = f"videos/shorts/{base_public_id}_short_{index}"
+    return Short.objects.filter(
+        video_id=video_id, cloudinary_public_id=short_public_id
+    ).exists()
+
+
+@shared_task(bind=True, max_retries=settings.VIDEO_PROCESSING_MAX_RETRIES)
+def render_short_task(
+    self,
+    video_id,
+    job_id,
+    temp_video_path,
+    index,
+    clip,
+    type_short,
+    metadata,
+    base_public_id,
+):
+    """
+    Renderiza un único short en el spool y se lo pasa a
+    publish_short_task (con encode_seconds, que ese devuelve para
+    las métricas). El short renderizado queda en el checkpoint del
+    job: un reintento no lo vuelve a renderizar si sigue en disco.
+    """
+    part = f"short_{index}"
+    if short_published(video_id, index, base_public_id):
+        return {"part": part}
+
+    job, attempt = start_pipeline_part(job_id, part)
+    if job is None:
+        return {"part": part}
+
+    short_info = {}
+    retrying = False
+    try:
+        if attempt > self.max_retries + 1:
+            raise RuntimeError("El render se interrumpió demasiadas veces")
+
+        rendered = job.checkpoint.get("rendered", {}).get(str(index))
+        if rendered:
+            shorts_data = restore_shorts([rendered], temp_video_path, type_short, metadata)
+        else:
+            shorts_data = generate_shorts(
+                temp_video_path,
+                [clip],
+                type_short=type_short,
+                metadata=metadata,
+                mode="sequential",
+            )
+        if not shorts_data:
+            raise ValueError(f"Clip inválido: {clip}")
+
+        short_info = shorts_data[0]
+        save_part_checkpoint(job_id, "rendered", {str(index): checkpoint_short(short_info)})
+        return {"part": part, **short_info}
+
+    except Exception as e:
+        retrying = can_retry_part(self, attempt, e)
+        cleanup_shorts_data([] if retrying else [short_info])
+        return retry_pipeline_part(self, part, attempt, e, processing_retry_countdown)
+
+
+@shared_task(bind=True, max_retries=settings.CLOUDINARY_UPLOAD_MAX_RETRIES)
+def publish_short_task(self, short_info, video_id, job_id, index, base_public_id, total_shorts):
+    """
+    Sube un short ya renderizado y su cover, y crea el Short en DB.
+    Recibe el resultado de render_short_task: si el render falló, lo
+    devuelve tal cual. Devuelve los segundos del render y de cada
+    subida, que finalize_video_task suma a job.timings.
+    """
+    if "error" in short_info or "short_path" not in short_info:
+        return short_info
+
+    part = f"short_{index}"
+    if short_published(video_id, index, base_public_id):
+        cleanup_shorts_data([short_info])
+        return {"part": part}
+
+    job, attempt = start_pipeline_part(job_id, f"publish_{part}")
+    if job is None:
+        cleanup_shorts_data([short_info])
+        return {"part": part}
+
+    retrying = False
+    upload_timings = {}
+    try:
+        if attempt > self.max_retries + 1:
+            raise RuntimeError("La subida se interrumpió demasiadas veces")
+
+        uploads = upload_part_assets(
+            job, short_upload_specs(index, short_info, base_public_id), upload_timings
+        )
+        video = Video.objects.get(id=video_id)
+        with transaction.atomic():
+            confirm_uploads(upload["public_id"] for upload in uploads.values())
+            create_short(
+                video, short_info, uploads[f"short_{index}"], uploads[f"cover_{index}"]
+            )
+
+        # Progreso agregado: 35 -> 95 según shorts ya publicados
+        done = Short.objects.filter(video_id=video_id).count()
+        progress = max(job.progress, 35 + int(60 * done / total_shorts))
+        ProcessingJob.objects.filter(id=job_id, progress__lt=progress).update(
+            progress=progress
+        )
+        publish_progress(video, progress)
+        return {
+            "part": part,
+            "encodes": [short_info["encode_seconds"]] if "encode_seconds" in short_info else [],
+            "uploads": upload_timings,
+        }
 
     except Exception as e:
-        logger.error(f"❌ Error procesando video {video_id}: {str(e)}")
+        retrying = can_retry_part(self, attempt, e)
+        return retry_pipeline_part(self, part, attempt, e, upload_retry_countdown)
+
+    finally:
+        if not retrying:
+            cleanup_shorts_data([short_info])
+
+
+def pipeline_errors(results):
+    return [result["error"] for result in results or [] if result and "error" in result]
+
+
+# Cada cuánto finalize_video_task vuelve a mirar si terminó el original
+ORIGINAL_JOIN_INTERVAL = 10
+
+
+@shared_task(bind=True, max_retries=None)
+def finalize_video_task(self, results, video_id, job_id, temp_video_path, join_original=False):
+    """
+    Cuerpo del chord: corre cuando terminaron todas las tasks. Si alguna
+    devolvió error, deshace lo que las otras llegaron a publicar.
+
+    Con join_original espera también a publish_original_task, que se
+    despachó antes del render: se reintenta cada ORIGINAL_JOIN_INTERVAL
+    segundos hasta ver su resultado en el checkpoint, como mucho
+    VIDEO_PIPELINE_JOIN_TIMEOUT.
+    """
+    if join_original:
+        job = ProcessingJob.objects.get(id=job_id)
+        original = job.checkpoint.get("parts", {}).get("original")
+        if original is None:
+            waited = self.request.retries * ORIGINAL_JOIN_INTERVAL
+            if waited < settings.VIDEO_PIPELINE_JOIN_TIMEOUT:
+                raise self.retry(countdown=ORIGINAL_JOIN_INTERVAL)
+            original = {"part": "original", "error": "original: la subida no terminó"}
+        results = [original, *(results or [])]
+
+    try:
+        video = Video.objects.get(id=video_id)
+        job = ProcessingJob.objects.get(id=job_id)
 
-        if video:
-            video.status = Video.Status.FAILED
-            video.save()
+        # process_video_task dejó los tiempos hasta el dispatch
+        timer = StageTimer.from_report(job.timings)
+        for result in results or []:
+            if result:
+                timer.add_part(result)
 
-        if job:
-            job.status = ProcessingJob.Status.FAILED
-            job.error_message = str(e)[:300]
-            job.finished_at = timezone.now()
-            job.save()
+        errors = pipeline_errors(results)
+        if errors:
+            rollback_video_pipeline(video, job, "; ".join(errors), timer)
+            return
 
+        logger.info(f"TOTAL SHORTS EN DB: {video.shorts.count()}")
+        finish_processing(video, job, timer)
     finally:
+        logger.info(f"||||||||||||||||||Borrando-Video|||||||||||")
+        cleanup_local_files(temp_video_path, upload_checkpoint_path(temp_video_path))
+
 
+@shared_task
+def fail_video_pipeline_task(request, exc, traceback, video_id, job_id, temp_video_path):
+    """
+    Errback del chord: falló finalize_video_task (las tasks del header
+    no fallan, así que ya terminaron todas y nadie lee el original).
+    """
+    try:
+        video = Video.objects.filter(id=video_id).first()
+        job = ProcessingJob.objects.filter(id=job_id).first()
+        rollback_video_pipeline(video, job, exc)
+    finally:
         logger.info(f"||||||||||||||||||Borrando-Video|||||||||||")
+        cleanup_local_files(temp_video_path, upload_checkpoint_path(temp_video_path))
 
-        if os.path.exists(temp_video_path):
-            os.unlink(temp_video_path)
 
-        if cover_original_path and os.path.exists(cover_original_path):
-            os.unlink(cover_original_path)
+def rollback_video_pipeline(video, job, error, timer=None):
+    """
+    Deja el video en FAILED sin nada a medio publicar: borra los Short
+    que llegaron a crearse y encola en el outbox el borrado de sus
+    assets, del original y de lo que quedó en el checkpoint.
+    """
+    if video is not None:
+        with transaction.atomic():
+            video = Video.objects.select_for_update().get(id=video.id)
+            assets = video_assets(video)
+            for upload in (job.checkpoint.get("uploads", {}) if job else {}).values():
+                assets.setdefault(upload["resource_type"], []).append(upload["public_id"])
+            enqueue_destroy(assets)
+
+            video.shorts.all().delete()
+            video.file_url = None
+            video.cloudinary_public_id = None
+            video.cover_original_url = None
+            video.cover_original_cloudinary_public_id = None
+            video.save(
+                update_fields=[
+                    "file_url",
+                    "cloudinary_public_id",
+                    "cover_original_url",
+                    "cover_original_cloudinary_public_id",
+                ]
+            )
+
+    if job is not None:
+        job.checkpoint = {}
 
-        for short in shorts_local_data:
-            if os.path.exists(short.get("short_path", "")):
-                os.unlink(short["short_path"])
-            if os.path.exists(short.get("cover_path", "")):
-                os.unlink(short["cover_path"])
+    fail_processing(video, job, error, timer)
+
+
+# =========================================================
+# DEDUPLICACIÓN POR HASH
+# =========================================================
+def find_processed_duplicate(user, content_hash, type_short):
+    """
+    Busca un video READY del mismo usuario con el mismo contenido
+    y el mismo tipo de short.
+    """
+    if not content_hash:
+        return None
+
+    return (
+        Video.objects.filter(
+            user=user,
+            content_hash=content_hash,
+            type_short=type_short,
+            status=Video.Status.READY,
+            deleted_at__isnull=True,
+        )
+        .order_by("-created_at")
+        .first()
+    )
+
+
+def clone_processed_video(source, file_name):
+    """
+    Crea un Video nuevo que referencia los assets de Cloudinary y los
+    shorts de un video ya procesado, sin volver a procesar nada.
+    Los assets quedan compartidos: delete_video/delete_short no los
+    borran de Cloudinary mientras otro registro los siga usando.
+    """
+    with transaction.atomic():
+        video = Video.objects.create(
+            user=source.user,
+            file_name=file_name,
+            file_url=source.file_url,
+            cloudinary_public_id=source.cloudinary_public_id,
+            cover_original_url=source.cover_original_url,
+            cover_original_cloudinary_public_id=source.cover_original_cloudinary_public_id,
+            duration_seconds=source.duration_seconds,
+            width=source.width,
+            height=source.height,
+            aspect_ratio=source.aspect_ratio,
+            has_audio=source.has_audio,
+            file_size=source.file_size,
+            content_hash=source.content_hash,
+            type_short=source.type_short,
+            status=Video.Status.READY,
+        )
+
+        shorts = Short.objects.bulk_create(
+            [
+                Short(
+                    video=video,
+                    file_url=short.file_url,
+                    cloudinary_public_id=short.cloudinary_public_id,
+                    cover_url=short.cover_url,
+                    cover_cloudinary_public_id=short.cover_cloudinary_public_id,
+                    start_second=short.start_second,
+                    end_second=short.end_second,
+                    status=Short.Status.READY,
+                )
+                for short in source.shorts.filter(
+                    status=Short.Status.READY, deleted_at__isnull=True
+                )
+            ]
+        )
+
+        video.generated_shorts_count = len(shorts)
+        video.save(update_fields=["generated_shorts_count"])
+
+        now = timezone.now()
+        ProcessingJob.objects.create(
+            video=video,
+            job_type=ProcessingJob.JobType.SHORTS_GENERATION,
+            status=ProcessingJob.Status.COMPLETED,
+            progress=100,
+            started_at=now,
+            finished_at=now,
+        )
+
+    logger.info(f"♻️ Video {video.id} reutiliza los assets del video {source.id}")
+    return video
+
+
+def start_video_processing(user, temp_path, content_hash, file_name, type_short):
+    """
+    Punto de entrada para un archivo ya guardado en temp/: reutiliza un
+    video idéntico ya procesado o crea el Video y encola su procesamiento.
+    Devuelve (video, reused).
+    """
+    duplicate = find_processed_duplicate(user, content_hash, type_short)
+    if duplicate:
+        cleanup_local_files(temp_path)
+        return clone_processed_video(duplicate, file_name), True
+
+    video = Video.objects.create(
+        user=user,
+        file_name=file_name,
+        status=Video.Status.UPLOADED,
+        type_short=type_short,
+        content_hash=content_hash,
+    )
+
+    # Si se llama dentro de una transacción, el worker no debe ver
+    # el video antes del commit
+    transaction.on_commit(
+        lambda: enqueue_video_processing(video, temp_path, type_short)
+    )
+    return video, False
+
+
+def enqueue_video_processing(video, temp_path, type_short):
+    """
+    Encola el procesamiento de un archivo del spool de este nodo.
+
+    Sin spool compartido la task lleva el nodo dueño y, con
+    SPOOL_HOST_ROUTING, va a su cola para que la tome un worker del
+    mismo host. Si cae en otro, el worker baja el archivo.
+    """
+    args = [video.id, temp_path, video.file_name, type_short]
+
+    if settings.SPOOL_SHARED:
+        process_video_task.delay(*args)
+        return
+
+    node = settings.SPOOL_NODE_NAME
+    options = {"queue": spool_queue(node)} if settings.SPOOL_HOST_ROUTING else {}
+    process_video_task.apply_async(args, {"spool_node": node}, **options)
+
+
+def start_direct_video_processing(user, source_public_id, source_url, file_name, type_short):
+    """
+    Crea el Video de una subida directa al almacenamiento y encola su
+    procesamiento; el worker descarga el original desde source_url.
+    Confirmar dos veces el mismo archivo devuelve el mismo Video.
+    """
+    with transaction.atomic():
+        video, created = Video.objects.get_or_create(
+            source_public_id=source_public_id,
+            defaults={
+                "user": user,
+                "file_name": file_name,
+                "status": Video.Status.UPLOADED,
+                "type_short": type_short,
+            },
+        )
+
+        if created:
+            # el archivo ya tiene dueño: cierra la reserva del ticket
+            confirm_uploads([source_public_id])
+            temp_path = os.path.join(
+                get_spool_dir(), f"direct_{video.id}_{get_valid_filename(file_name)}"
+            )
+            transaction.on_commit(
+                lambda: process_video_task.delay(
+                    video.id, temp_path, video.file_name, type_short, source_url
+                )
+            )
+
+    return video
+
+
+def is_shared_asset(model, field, public_id, exclude):
+    """
+    True si otro registro vivo (fuera de exclude) sigue usando el asset.
+    Los marcados como borrados no cuentan: su propia purga lo borra.
+    """
+    return (
+        model.objects.filter(**{field: public_id}, deleted_at__isnull=True)
+        .exclude(**exclude)
+        .exists()
+    )
 
 
 # =========================================================
@@ -503,71 +2471,112 @@ def process_video_task(video_id, temp_video_path, file_name, type_short):
 # =========================================================
 def delete_video(video):
     """
-    Borra un Video y todos sus Shorts asociados,
-    tanto de la base de datos como de Cloudinary.
+    Marca el Video y sus Shorts como borrados (la API deja de
+    mostrarlos) y encola purge_video_task, que borra los registros y
+    deja los assets en el outbox. No llama al almacenamiento: responde
+    enseguida.
     """
-    try:
-        with transaction.atomic():
+    now = timezone.now()
+    with transaction.atomic():
+        Video.objects.filter(id=video.id).update(deleted_at=now)
+        Short.objects.filter(video=video, deleted_at__isnull=True).update(
+            deleted_at=now
+        )
+        transaction.on_commit(lambda: purge_video_task.delay(video.id))
+
+    forget_progress(video.id, video.user_id)
 
-            # 1️⃣ Borrar shorts + covers
-            old_shorts = list(video.shorts.all())
-
-            for short in old_shorts:
-
-                # Borrar video del short en Cloudinary
-                if short.cloudinary_public_id:
-                    try:
-                        cloudinary.uploader.destroy(
-                            short.cloudinary_public_id, resource_type="video"
-                        )
-                        logger.info(
-                            f"Short video Cloudinary borrado: {short.cloudinary_public_id}"
-                        )
-                    except Exception as e:
-                        logger.error(f"Error borrando short video {short.id}: {str(e)}")
-
-                # Borrar cover del short en Cloudinary
-                if short.cover_cloudinary_public_id:
-                    try:
-                        cloudinary.uploader.destroy(
-                            short.cover_cloudinary_public_id, resource_type="image"
-                        )
-                        logger.info(
-                            f"Short cover Cloudinary borrado: {short.cover_cloudinary_public_id}"
-                        )
-                    except Exception as e:
-                        logger.error(f"Error borrando short cover {short.id}: {str(e)}")
-
-                # Borrar short en DB
-                short.delete()
-
-            # 2️⃣ Borrar cover original del video
-            if video.cover_original_cloudinary_public_id:
-                try:
-                    cloudinary.uploader.destroy(
-                        video.cover_original_cloudinary_public_id,
-                        resource_type="image",
-                    )
-                    logger.info(
-                        f"Cover original borrado: {video.cover_original_cloudinary_public_id}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error borrando cover original {video.id}: {str(e)}")
-
-            # 3️⃣ Borrar video original en Cloudinary
-            if video.cloudinary_public_id:
-                try:
-                    cloudinary.uploader.destroy(
-                        video.cloudinary_public_id,
-                        resource_type="video",
-                    )
-                    logger.info(f"Video original borrado: {video.cloudinary_public_id}")
-                except Exception as e:
-                    logger.error(f"Error borrando video original {video.id}: {str(e)}")
-
-            # 4️⃣ Borrar instancia Video en DB
+
+def video_assets(video):
+    """
+    public_ids del original, su cover y los shorts + covers, por
+    resource_type. Quedan afuera los que otro video deduplicado
+    todavía usa.
+    """
+    assets = {"video": [], "image": []}
+
+    for short in video.shorts.all():
+        if short.cloudinary_public_id and not is_shared_asset(
+            Short,
+            "cloudinary_public_id",
+            short.cloudinary_public_id,
+            {"video": video},
+        ):
+            assets["video"].append(short.cloudinary_public_id)
+
+        if short.cover_cloudinary_public_id and not is_shared_asset(
+            Short,
+            "cover_cloudinary_public_id",
+            short.cover_cloudinary_public_id,
+            {"video": video},
+        ):
+            assets["image"].append(short.cover_cloudinary_public_id)
+
+    if video.cover_original_cloudinary_public_id and not is_shared_asset(
+        Video,
+        "cover_original_cloudinary_public_id",
+        video.cover_original_cloudinary_public_id,
+        {"id": video.id},
+    ):
+        assets["image"].append(video.cover_original_cloudinary_public_id)
+
+    if video.cloudinary_public_id and not is_shared_asset(
+        Video,
+        "cloudinary_public_id",
+        video.cloudinary_public_id,
+        {"id": video.id},
+    ):
+        assets["video"].append(video.cloudinary_public_id)
+
+    return assets
+
+
+@shared_task(bind=True, max_retries=settings.MEDIA_DELETE_MAX_RETRIES)
+def purge_video_task(self, video_id):
+    """
+    Segunda mitad de delete_video: en una sola transacción encola los
+    assets en el outbox y borra las filas. El borrado en el
+    almacenamiento (con sus reintentos) queda a cargo del dispatcher.
+
+    Mientras el video se procesa no se toca: sus assets se siguen
+    subiendo. Se reintenta y, agotados los reintentos, se deja marcado
+    como borrado; al terminar el pipeline purge_if_deleted lo encola
+    de nuevo.
+    """
+    with transaction.atomic():
+        video = (
+            Video.objects.select_for_update()
+            .filter(id=video_id, deleted_at__isnull=False)
+            .first()
+        )
+        if video is None:
+            return
+
+        if video.status == Video.Status.PROCESSING:
+            processing = True
+        else:
+            processing = False
+            enqueue_destroy(video_assets(video))
+            # Subida directa que no llegó a procesarse
+            discard_source_asset(video)
             video.delete()
 
-    except Exception as e:
-        logger.error(f"Error eliminando video {video.id}: {str(e)}")
-        raise
+    if not processing:
+        logger.info(f"🗑️ Video {video_id} eliminado")
+        return
+
+    if self.request.retries < self.max_retries:
+        raise self.retry(countdown=media_delete_countdown(self.request.retries + 1))
+
+    logger.warning(
+        f"⏳ Video {video_id} borrado pero todavía en proceso: se purga al terminar"
+    )
+
+
+def purge_if_deleted(video):
+    """
+    Fin del pipeline: si el video se borró mientras se procesaba,
+    encola su purga (purge_video_task lo salteó mientras tanto).
+    """
+    if Video.objects.filter(id=video.id, deleted_at__isnull=False).exists():
+        transaction.on_commit(lambda: purge_video_task.delay(video.id))
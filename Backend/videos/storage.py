@@ -0,0 +1,418 @@
+import asyncio
+import glob
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import time
+from urllib.parse import urljoin
+
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import cloudinary.utils
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.static import was_modified_since
+
+# Cloudinary borra de a 100 public_ids por llamada
+DESTROY_BATCH_SIZE = 100
+
+
+class MediaNotFound(Exception):
+    """
+    El asset no existe en el almacenamiento.
+    """
+
+
+class MediaTooLarge(Exception):
+    """
+    El archivo que manda el cliente supera el tamaño permitido.
+    """
+
+
+# =========================================================
+# INTERFAZ
+# =========================================================
+class MediaStore:
+    """
+    Dónde viven los videos, shorts y covers ya procesados.
+
+    Las respuestas de upload() y resource() tienen la forma de las de
+    Cloudinary (public_id con carpeta, secure_url, bytes, resource_type)
+    para que el resto del pipeline no distinga un backend del otro.
+    """
+
+    # Subida por partes con checkpoint (services.upload_large_resumable)
+    resumable = False
+    # Subida del cliente directo al almacenamiento (uploads.create_direct_upload_ticket)
+    direct_upload = False
+
+    def upload(self, path, resource_type="image", folder=None, public_id=None):
+        raise NotImplementedError
+
+    def resource(self, public_id, resource_type="image"):
+        raise NotImplementedError
+
+    def destroy(self, public_id, resource_type="image"):
+        raise NotImplementedError
+
+    def destroy_many(self, public_ids, resource_type="image"):
+        for public_id in public_ids:
+            self.destroy(public_id, resource_type=resource_type)
+
+    def url(self, public_id, resource_type="image"):
+        raise NotImplementedError
+
+    def sign_direct_upload(self, public_id, resource_type, file_name):
+        """
+        Adónde sube el cliente el archivo public_id:
+        {"upload_url", "method", "params"}.
+        """
+        raise NotImplementedError
+
+
+def get_media_store():
+    return MEDIA_STORES[settings.MEDIA_STORE]()
+
+
+# =========================================================
+# CLOUDINARY
+# =========================================================
+class CloudinaryMediaStore(MediaStore):
+    resumable = True
+    direct_upload = True
+
+    def upload(self, path, resource_type="image", folder=None, public_id=None):
+        return cloudinary.uploader.upload(
+            path, resource_type=resource_type, folder=folder, public_id=public_id
+        )
+
+    def resource(self, public_id, resource_type="image"):
+        try:
+            return cloudinary.api.resource(public_id, resource_type=resource_type)
+        except cloudinary.exceptions.NotFound:
+            raise MediaNotFound(public_id)
+
+    def destroy(self, public_id, resource_type="image"):
+        cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+
+    def destroy_many(self, public_ids, resource_type="image"):
+        public_ids = list(public_ids)
+        for i in range(0, len(public_ids), DESTROY_BATCH_SIZE):
+            cloudinary.api.delete_resources(
+                public_ids[i : i + DESTROY_BATCH_SIZE], resource_type=resource_type
+            )
+
+    def url(self, public_id, resource_type="image"):
+        return cloudinary.utils.cloudinary_url(
+            public_id, resource_type=resource_type, secure=True
+        )[0]
+
+    def sign_direct_upload(self, public_id, resource_type, file_name):
+        # POST multipart con estos params tal cual y el archivo en "file"
+        config = cloudinary.config()
+        folder, _, name = public_id.rpartition("/")
+
+        params = {"folder": folder, "public_id": name, "timestamp": int(time.time())}
+        params["signature"] = cloudinary.utils.api_sign_request(params, config.api_secret)
+        params["api_key"] = config.api_key
+
+        return {
+            "upload_url": cloudinary.utils.cloudinary_api_url(
+                "upload", resource_type=resource_type
+            ),
+            "method": "POST",
+            "params": params,
+        }
+
+
+# =========================================================
+# DISCO LOCAL
+# =========================================================
+MEDIA_UPLOAD_SALT = "videos.media_upload"
+
+
+class LocalMediaStore(MediaStore):
+    """
+    Guarda los assets en MEDIA_ROOT/<resource_type>/<public_id>.<ext>
+    y se sirven en MEDIA_URL (views.serve_media, con Range). Para pruebas
+    de carga e instalaciones sin acceso a Cloudinary.
+
+    La subida directa es un PUT del archivo a una URL firmada
+    (views.upload_media), que hace de credencial.
+    """
+
+    direct_upload = True
+
+    def __init__(self):
+        self.root = str(settings.MEDIA_ROOT)
+        self.base_url = settings.MEDIA_URL
+
+    def _find(self, public_id, resource_type):
+        stem = safe_join(self.root, resource_type, public_id)
+        matches = [
+            path for path in glob.glob(f"{glob.escape(stem)}.*") if os.path.isfile(path)
+        ]
+        if not matches:
+            raise MediaNotFound(public_id)
+        return matches[0]
+
+    def _describe(self, path, public_id, resource_type):
+        return {
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "bytes": os.path.getsize(path),
+            "secure_url": self._path_url(path),
+        }
+
+    def _path_url(self, path):
+        relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+        return urljoin(self.base_url, relative)
+
+    def upload(self, path, resource_type="image", folder=None, public_id=None):
+        public_id = public_id or os.path.splitext(os.path.basename(path))[0]
+        if folder:
+            public_id = f"{folder}/{public_id}"
+
+        extension = os.path.splitext(path)[1].lower()
+        destination = safe_join(self.root, resource_type, f"{public_id}{extension}")
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        # Mismo disco: hard link (sin copiar bytes). Se arma con otro
+        # nombre y se renombra, así nunca se sirve un archivo a medias
+        fd, partial_path = tempfile.mkstemp(
+            dir=os.path.dirname(destination), prefix=".", suffix=".part"
+        )
+        os.close(fd)
+        try:
+            os.unlink(partial_path)
+            try:
+                os.link(path, partial_path)
+            except OSError:
+                shutil.copyfile(path, partial_path)
+            os.replace(partial_path, destination)
+        finally:
+            if os.path.exists(partial_path):
+                os.unlink(partial_path)
+
+        return self._describe(destination, public_id, resource_type)
+
+    def resource(self, public_id, resource_type="image"):
+        path = self._find(public_id, resource_type)
+        return self._describe(path, public_id, resource_type)
+
+    def destroy(self, public_id, resource_type="image"):
+        try:
+            os.unlink(self._find(public_id, resource_type))
+        except MediaNotFound:
+            pass
+
+    def url(self, public_id, resource_type="image"):
+        return self._path_url(self._find(public_id, resource_type))
+
+    def sign_direct_upload(self, public_id, resource_type, file_name):
+        extension = os.path.splitext(file_name)[1].lower() or ".mp4"
+        token = signing.dumps(
+            {"public_id": public_id, "resource_type": resource_type, "extension": extension},
+            salt=MEDIA_UPLOAD_SALT,
+        )
+        # MEDIA_URL es absoluta: misma URL base que serve_media
+        return {
+            "upload_url": urljoin(self.base_url, reverse("media-upload", args=[token])),
+            "method": "PUT",
+            "params": {},
+        }
+
+    def receive_direct_upload(self, token, stream, max_size):
+        """
+        Guarda el cuerpo de un PUT a una URL de sign_direct_upload.
+        Lanza MediaNotFound si la URL no es válida o expiró y
+        FileExistsError si ya se subió.
+        """
+        try:
+            data = signing.loads(
+                token, salt=MEDIA_UPLOAD_SALT, max_age=settings.VIDEO_DIRECT_UPLOAD_TTL
+            )
+        except signing.BadSignature:
+            raise MediaNotFound(token)
+
+        public_id, resource_type = data["public_id"], data["resource_type"]
+        try:
+            self._find(public_id, resource_type)
+        except MediaNotFound:
+            pass
+        else:
+            raise FileExistsError(public_id)
+
+        destination = safe_join(
+            self.root, resource_type, f"{public_id}{data['extension']}"
+        )
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        # Igual que upload(): se escribe en un .part oculto y se renombra
+        fd, partial_path = tempfile.mkstemp(
+            dir=os.path.dirname(destination), prefix=".", suffix=".part"
+        )
+        try:
+            received = 0
+            with os.fdopen(fd, "wb") as partial_file:
+                while block := stream.read(MEDIA_CHUNK_SIZE):
+                    received += len(block)
+                    if received > max_size:
+                        raise MediaTooLarge(public_id)
+                    partial_file.write(block)
+            os.replace(partial_path, destination)
+        finally:
+            if os.path.exists(partial_path):
+                os.unlink(partial_path)
+
+        return self._describe(destination, public_id, resource_type)
+
+
+MEDIA_STORES = {
+    "cloudinary": CloudinaryMediaStore,
+    "local": LocalMediaStore,
+}
+
+
+# =========================================================
+# SERVIR ARCHIVOS LOCALES
+# =========================================================
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+MEDIA_CHUNK_SIZE = 512 * 1024
+
+
+class RangeFile:
+    """
+    Archivo abierto que solo deja leer length bytes desde su posición.
+    No expone fileno(): así el servidor no manda el resto del archivo
+    con sendfile.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (inicio, fin) inclusivos de un "Range: bytes=..." de un solo rango.
+    None si no hay que aplicarlo (sin header o varios rangos). Lanza
+    ValueError si el rango no se puede satisfacer.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # bytes=-N: los últimos N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def media_file_response(request, path):
+    """
+    Respuesta para un archivo de MEDIA_ROOT, con Range (un solo rango),
+    If-Range e If-Modified-Since. Con MEDIA_ACCEL_REDIRECT la entrega
+    queda a cargo de nginx (X-Accel-Redirect), que resuelve los rangos.
+    """
+    try:
+        full_path = safe_join(str(settings.MEDIA_ROOT), path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if os.path.basename(full_path).startswith(".") or not os.path.isfile(full_path):
+        raise Http404
+
+    stat = os.stat(full_path)
+    last_modified = http_date(stat.st_mtime)
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = urljoin(settings.MEDIA_ACCEL_REDIRECT, path)
+        return response
+
+    if not was_modified_since(request.headers.get("If-Modified-Since"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if not if_range or parse_http_date_safe(if_range) == int(stat.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+
+    start, end = byte_range or (0, stat.st_size - 1)
+    length = end - start + 1
+    file = open(full_path, "rb")
+    file.seek(start)
+
+    if isinstance(request, ASGIRequest):
+        # Con un iterador sync Django ASGI junta todo el archivo en memoria
+        response = StreamingHttpResponse(
+            _read_chunks(file, length), content_type=content_type
+        )
+    elif byte_range:
+        response = FileResponse(RangeFile(file, length), content_type=content_type)
+    else:
+        # Archivo entero por WSGI: el servidor puede usar sendfile
+        response = FileResponse(file, content_type=content_type)
+
+    if byte_range:
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = last_modified
+    return response
+
+
+async def _read_chunks(file, length):
+    try:
+        while length > 0:
+            data = await asyncio.to_thread(file.read, min(MEDIA_CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
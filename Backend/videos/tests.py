@@ -1,3 +1,1949 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock, skipIf
+from urllib.parse import urlsplit
 
-# Create your tests here.
+import numpy as np
+import requests
+from asgiref.sync import async_to_sync
+from celery import current_app
+
+try:
+    import fakeredis
+    import fakeredis.aioredis
+except ImportError:  # solo para los tests de métricas y eventos
+    fakeredis = None
+try:
+    import lupa
+except ImportError:  # fakeredis corre Lua (publish_event) con lupa
+    lupa = None
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.urls import urlpatterns as core_urlpatterns
+from shorts.models import Short
+from shorts.services import delete_short
+
+from .models import MediaOperation, ProcessingJob, Video, VideoUpload
+from .storage import CloudinaryMediaStore, LocalMediaStore, get_media_store, parse_range
+from .uploads import (
+    SpoolUploadHandler,
+    expire_upload_sessions,
+    get_spool_dir,
+    merge_range,
+)
+from . import events, highlights, metrics, outbox, services, uploads
+from .views import serve_media, upload_media
+from .benchmark import (
+    cloudinary_stand_in,
+    directory_size,
+    files_size,
+    generate_synthetic_video,
+    local_media_store,
+    measure,
+)
+from .management.commands import benchmark_pipeline
+from .services import (
+    RenderProgress,
+    checkpoint_file,
+    checkpoint_short,
+    cleanup_shorts_data,
+    dispatch_video_pipeline,
+    generate_shorts,
+    process_video_task,
+)
+
+FFMPEG = shutil.which("ffmpeg")
+
+
+def make_test_video(path, seconds=4, audio=False):
+    """
+    Video sintético 320x180 (horizontal), con o sin pista de audio.
+    """
+    command = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc=size=320x180:rate=10:duration={seconds}",
+    ]
+    if audio:
+        command += ["-f", "lavfi", "-i", f"sine=duration={seconds}", "-shortest"]
+    command += ["-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", path]
+    subprocess.run(command, check=True)
+
+
+def create_user(email="owner@example.com"):
+    return get_user_model().objects.create_user(
+        username=email.split("@")[0], email=email, password="secret"
+    )
+
+
+def create_processing_video(email="owner@example.com"):
+    """
+    Video en PROCESSING con su job RUNNING, como lo deja start_processing.
+    """
+    user = create_user(email)
+    video = Video.objects.create(
+        user=user, file_name="clip.mp4", status=Video.Status.PROCESSING
+    )
+    job = ProcessingJob.objects.create(
+        video=video,
+        status=ProcessingJob.Status.RUNNING,
+        started_at=timezone.now(),
+        progress=35,
+    )
+    return video, job
+
+
+class LocalMediaMixin:
+    """
+    Directorio temporal por test y assets en LocalMediaStore dentro de él.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        media = override_settings(
+            MEDIA_STORE="local", MEDIA_ROOT=os.path.join(self.tempdir, "media")
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class EagerCeleryMixin:
+    """
+    Corre las tasks (y los chords) en el mismo proceso, sin broker.
+    """
+
+    def setUp(self):
+        super().setUp()
+        previous = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, "task_always_eager", previous)
+
+
+# =========================================================
+# RENDER
+# =========================================================
+@skipIf(FFMPEG is None, "ffmpeg no está instalado")
+@override_settings(SHORTS_RENDER_WORKERS=2)
+class SilentSourceRenderTests(SimpleTestCase):
+    """
+    Sin metadata no se sabe si hay audio: un original mudo no debe
+    romper ningún modo de render.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tempdir = tempfile.mkdtemp()
+        cls.video_path = os.path.join(cls.tempdir, "silent.mp4")
+        make_test_video(cls.video_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempdir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_renders_silent_source_without_metadata(self):
+        clips = [{"start": 0, "end": 1.5}, {"start": 1.5, "end": 3}]
+
+        for mode in ("single_pass", "sequential", "parallel"):
+            for type_short in ("vertical", "horizontal"):
+                with self.subTest(mode=mode, type_short=type_short):
+                    shorts = generate_shorts(
+                        self.video_path, clips, type_short, metadata=None, mode=mode
+                    )
+                    try:
+                        self.assertEqual(len(shorts), 2)
+                        for short in shorts:
+                            self.assertGreater(os.path.getsize(short["short_path"]), 0)
+                            self.assertGreater(os.path.getsize(short["cover_path"]), 0)
+                    finally:
+                        cleanup_shorts_data(shorts)
+
+    def test_keeps_audio_when_source_has_it(self):
+        video_path = os.path.join(self.tempdir, "sound.mp4")
+        make_test_video(video_path, audio=True)
+
+        shorts = generate_shorts(
+            video_path, [{"start": 0, "end": 2}], "vertical", metadata=None, mode="sequential"
+        )
+        try:
+            streams = subprocess.run(
+                ["ffmpeg", "-hide_banner", "-i", shorts[0]["short_path"]],
+                capture_output=True,
+                text=True,
+            ).stderr
+            self.assertIn("Audio:", streams)
+        finally:
+            cleanup_shorts_data(shorts)
+
+
+@skipIf(FFMPEG is None, "ffmpeg no está instalado")
+@override_settings(SHORTS_RENDER_WORKERS=2)
+class ParallelRenderFailureTests(SimpleTestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        self.video_path = os.path.join(self.tempdir, "source.mp4")
+        make_test_video(self.video_path)
+        spool = override_settings(BASE_DIR=self.tempdir)
+        spool.enable()
+        self.addCleanup(spool.disable)
+
+    def test_failed_clip_cancels_the_pool_and_removes_rendered_files(self):
+        clips = [{"start": start, "end": start + 1} for start in range(4)]
+        cancelled = threading.Event()
+        started = []
+        run_ffmpeg = services.run_ffmpeg
+        cancel = Future.cancel
+
+        def record_cancel(future):
+            cancelled.set()
+            return cancel(future)
+
+        def render(command, on_progress=None):
+            start = float(command[command.index("-ss") + 1])
+            started.append(start)
+            if start == 0:
+                raise RuntimeError("ffmpeg falló")
+            # los dos workers siguen ocupados hasta que se cancela la cola
+            cancelled.wait(timeout=10)
+            return run_ffmpeg(command, on_progress)
+
+        with mock.patch.object(services, "run_ffmpeg", side_effect=render):
+            with mock.patch.object(
+                Future, "cancel", autospec=True, side_effect=record_cancel
+            ):
+                with self.assertRaisesMessage(RuntimeError, "ffmpeg falló"):
+                    generate_shorts(
+                        self.video_path, clips, "vertical", metadata=None, mode="parallel"
+                    )
+
+        self.assertTrue(cancelled.is_set())
+        self.assertIn(1.0, started)
+        self.assertNotIn(3.0, started)
+        self.assertEqual(os.listdir(get_spool_dir()), [])
+
+
+# =========================================================
+# HIGHLIGHTS
+# =========================================================
+class PickHighlightsTests(SimpleTestCase):
+    """
+    Señales sintéticas a ANALYSIS_FPS pasos por segundo: sin cortes de
+    escena, los bordes se corren a la parte más silenciosa.
+    """
+
+    def signals(self, seconds, loud_ranges):
+        steps = seconds * highlights.ANALYSIS_FPS
+        motion = np.zeros(steps, dtype=np.float32)
+        loudness = np.full(steps, 0.1, dtype=np.float32)
+        for start, end in loud_ranges:
+            loudness[start * highlights.ANALYSIS_FPS : end * highlights.ANALYSIS_FPS] = 0.9
+        return motion, loudness
+
+    def test_picks_the_loudest_windows_in_order(self):
+        motion, loudness = self.signals(300, [(50, 70), (150, 170), (250, 270)])
+
+        clips = highlights.pick_highlights(motion, loudness, 300, 3, 20)
+
+        # cada borde se corrió hasta SNAP_SECONDS a la parte más silenciosa
+        self.assertEqual(
+            clips,
+            [
+                {"start": 48.0, "end": 70.0},
+                {"start": 148.0, "end": 170.0},
+                {"start": 248.0, "end": 270.0},
+            ],
+        )
+
+    def test_clips_never_overlap_and_respect_the_minimum_length(self):
+        motion, loudness = self.signals(60, [(10, 40)])
+
+        clips = highlights.pick_highlights(motion, loudness, 60, 5, 20)
+
+        # en 60s entran como mucho 3 ventanas de 20s
+        self.assertLessEqual(len(clips), 3)
+        self.assertGreaterEqual(len(clips), 1)
+        previous_end = 0
+        for clip in clips:
+            self.assertGreaterEqual(clip["start"], previous_end)
+            self.assertGreaterEqual(clip["end"] - clip["start"], highlights.MIN_CLIP_SECONDS)
+            self.assertLessEqual(clip["end"], 60)
+            previous_end = clip["end"]
+
+    def test_silent_source_uses_motion_only(self):
+        motion, _ = self.signals(120, [])
+        motion[100:140] = 20
+
+        clips = highlights.pick_highlights(motion, None, 120, 1, 20)
+
+        self.assertEqual(clips, [{"start": 50.0, "end": 70.0}])
+
+    def test_too_short_for_the_window(self):
+        motion, loudness = self.signals(10, [])
+        with self.assertRaisesMessage(ValueError, "demasiado corto"):
+            highlights.pick_highlights(motion, loudness, 10, 1, 20)
+
+    @override_settings(SHORTS_HIGHLIGHT_BUDGET=20, SHORTS_HIGHLIGHT_BUDGET_RATIO=0.5)
+    def test_budget_scales_with_the_clip_seconds_to_render(self):
+        motion, loudness = self.signals(600, [(100, 150)])
+
+        with mock.patch.object(
+            highlights, "analyze_video", return_value=(motion, loudness)
+        ) as analyze:
+            highlights.find_highlight_clips("video.mp4", 600, True, 3)
+            # 3 clips de 60s: 0,5 * 180
+            self.assertEqual(analyze.call_args.args[2], 90)
+
+            highlights.find_highlight_clips("video.mp4", 40, True, 1)
+            # 1 clip de 20s: el mínimo fijo
+            self.assertEqual(analyze.call_args.args[2], 20)
+
+    def test_failed_analysis_falls_back_and_clears_the_cover(self):
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as cover:
+            cover.write(b"a medio escribir")
+            cover.flush()
+
+            with mock.patch.object(
+                highlights, "analyze_video", side_effect=highlights.HighlightTimeout
+            ):
+                clips = highlights.find_highlight_clips(
+                    "video.mp4", 600, True, 3, cover.name
+                )
+
+            self.assertIsNone(clips)
+            self.assertEqual(os.path.getsize(cover.name), 0)
+
+
+# =========================================================
+# PROGRESO
+# =========================================================
+class RenderProgressTests(SimpleTestCase):
+    def test_single_pass_progress_grows_from_zero(self):
+        reported = []
+        progress = RenderProgress([(0, 27), (27, 54), (54, 90)], reported.append)
+        report = progress.for_single_pass()
+
+        for second in range(0, 91, 3):
+            report(second)
+
+        self.assertAlmostEqual(reported[0], 0)
+        self.assertEqual(reported, sorted(reported))
+        self.assertAlmostEqual(reported[len(reported) // 2], 45 / 90, delta=0.05)
+        self.assertAlmostEqual(reported[-1], 1)
+
+        progress.finish()
+        self.assertEqual(reported[-1], 1)
+
+
+# =========================================================
+# FAN-OUT
+# =========================================================
+@skipIf(FFMPEG is None, "ffmpeg no está instalado")
+class VideoPipelineRollbackTests(EagerCeleryMixin, LocalMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video_path = os.path.join(self.tempdir, "original.mp4")
+        make_test_video(self.video_path)
+        self.cover_path = os.path.join(self.tempdir, "cover.jpg")
+        with open(self.cover_path, "wb") as cover:
+            cover.write(b"jpg")
+
+    def test_failed_short_rolls_back_the_whole_video(self):
+        video, job = create_processing_video()
+        clips = [{"start": 0, "end": 1.5}, {"start": 2, "end": 1}]
+
+        dispatch_video_pipeline(
+            video, job, self.video_path, self.cover_path, clips, "vertical", None
+        )
+
+        video.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(video.status, Video.Status.FAILED)
+        self.assertEqual(job.status, ProcessingJob.Status.FAILED)
+        self.assertIn("short_2", job.error_message)
+        self.assertFalse(video.shorts.exists())
+        self.assertIsNone(video.cloudinary_public_id)
+
+        # lo que llegó a subirse queda en el outbox para borrarse
+        destroyed = set(
+            MediaOperation.objects.filter(
+                action=MediaOperation.Action.DESTROY
+            ).values_list("public_id", flat=True)
+        )
+        self.assertTrue(any("_short_1" in public_id for public_id in destroyed))
+        self.assertTrue(any("_cover_1" in public_id for public_id in destroyed))
+        self.assertTrue(any(public_id.startswith("videos/original/") for public_id in destroyed))
+
+        # el original se borra recién cuando terminaron todas las tasks
+        self.assertFalse(os.path.exists(self.video_path))
+
+
+# =========================================================
+# CHECKPOINTS
+# =========================================================
+@skipIf(FFMPEG is None, "ffmpeg no está instalado")
+@override_settings(VIDEO_PIPELINE_FANOUT=False)
+class ProcessingResumeTests(EagerCeleryMixin, LocalMediaMixin, TransactionTestCase):
+    """
+    TransactionTestCase: la subida en segundo plano usa la base desde
+    otro hilo.
+    """
+
+    def test_retry_resumes_from_checkpoint_and_skips_rendered_clips(self):
+        video_path = os.path.join(self.tempdir, "original.mp4")
+        make_test_video(video_path)
+        cover_path = os.path.join(self.tempdir, "cover.jpg")
+        with open(cover_path, "wb") as cover:
+            cover.write(b"jpg")
+
+        clips = [{"start": 0, "end": 1.5}, {"start": 2, "end": 3.5}]
+        metadata = {
+            "width": 320,
+            "height": 180,
+            "aspect_ratio": "16:9",
+            "duration": 4.0,
+            "has_audio": False,
+            "video_codec": "h264",
+            "audio_codec": None,
+        }
+        rendered = generate_shorts(video_path, clips[:1], metadata=metadata)
+        missing = {"path": os.path.join(self.tempdir, "gone.mp4"), "sha256": "0"}
+
+        video, job = create_processing_video()
+        job.checkpoint = {
+            "attempt": 1,
+            "metadata": metadata,
+            "clips": clips,
+            "cover_original": checkpoint_file(cover_path),
+            "shorts": [
+                checkpoint_short(rendered[0]),
+                {**clips[1], "short": missing, "cover": missing},
+            ],
+        }
+        job.save()
+
+        with mock.patch.object(
+            services, "generate_shorts", wraps=services.generate_shorts
+        ) as render, mock.patch.object(services, "probe_video") as probe:
+            process_video_task.apply(
+                args=(video.id, video_path, "clip.mp4", "vertical"), retries=1
+            )
+
+        probe.assert_not_called()
+        # solo se renderiza el clip cuyo archivo ya no estaba
+        render.assert_called_once()
+        self.assertEqual(render.call_args.args[1], [job.checkpoint["shorts"][1]])
+
+        video.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(video.status, Video.Status.READY)
+        self.assertEqual(job.status, ProcessingJob.Status.COMPLETED)
+        self.assertEqual(
+            sorted(video.shorts.values_list("start_second", flat=True)), [0, 2]
+        )
+
+
+class PlannedVideoMixin:
+    """
+    Video en PROCESSING con metadata, clips y cover ya en el checkpoint
+    (sin ffprobe): process_video_task arranca desde el render.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.video_path = os.path.join(self.tempdir, "original.mp4")
+        make_test_video(self.video_path)
+        cover_path = os.path.join(self.tempdir, "cover.jpg")
+        with open(cover_path, "wb") as cover:
+            cover.write(b"jpg")
+
+        self.video, self.job = create_processing_video()
+        self.job.checkpoint = {
+            "metadata": {
+                "width": 320,
+                "height": 180,
+                "aspect_ratio": "16:9",
+                "duration": 4.0,
+                "has_audio": False,
+                "video_codec": "h264",
+                "audio_codec": None,
+            },
+            "clips": [{"start": 0, "end": 1.5}, {"start": 2, "end": 3.5}],
+            "cover_original": checkpoint_file(cover_path),
+        }
+        self.job.save()
+
+    def run_pipeline(self):
+        # como reintento: el video ya está en PROCESSING
+        process_video_task.apply(
+            args=(self.video.id, self.video_path, "clip.mp4", "vertical"), retries=1
+        )
+
+
+@skipIf(FFMPEG is None, "ffmpeg no está instalado")
+@override_settings(VIDEO_PIPELINE_FANOUT=False)
+class OriginalUploadOverlapTests(
+    PlannedVideoMixin, EagerCeleryMixin, LocalMediaMixin, TestCase
+):
+    """
+    Sin fan-out el original se sube mientras se renderizan los shorts.
+    """
+
+    def test_original_is_uploaded_before_shorts_finish_rendering(self):
+        during_render = {}
+
+        def render(*args, **kwargs):
+            during_render["original"] = Video.objects.get(
+                id=self.video.id
+            ).cloudinary_public_id
+            return generate_shorts(*args, **kwargs)
+
+        with mock.patch.object(services, "generate_shorts", side_effect=render):
+            self.run_pipeline()
+
+        self.assertTrue(during_render["original"].startswith("videos/original/"))
+
+        self.video.refresh_from_db()
+        self.job.refresh_from_db()
+        self.assertEqual(self.video.status, Video.Status.READY)
+        self.assertEqual(self.video.cloudinary_public_id, during_render["original"])
+        self.assertEqual(self.video.shorts.count(), 2)
+        self.assertFalse(os.path.exists(self.video_path))
+
+    @override_settings(VIDEO_PIPELINE_JOIN_TIMEOUT=0)
+    def test_finalize_fails_the_video_without_the_original(self):
+        # el original nunca dejó su resultado en el checkpoint
+        services.finalize_video_task.apply(
+            args=([], self.video.id, self.job.id, self.video_path),
+            kwargs={"join_original": True},
+        )
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ProcessingJob.Status.FAILED)
+        self.assertIn("original", self.job.error_message)
+
+
+class PipelineRoutingTests(SimpleTestCase):
+    def test_uploads_never_run_in_cpu_queues(self):
+        router = current_app.amqp.router
+        queues = {
+            name: router.route({}, f"videos.services.{name}")["queue"].name
+            for name in (
+                "process_video_task",
+                "render_short_task",
+                "publish_original_task",
+                "publish_short_task",
+                "finalize_video_task",
+            )
+        }
+        self.assertEqual(
+            queues,
+            {
+                "process_video_task": "pipeline",
+                "render_short_task": "render",
+                "publish_original_task": "publish",
+                "publish_short_task": "publish",
+                "finalize_video_task": "publish",
+            },
+        )
+
+
+# =========================================================
+# MÉTRICAS
+# =========================================================
+@skipIf(fakeredis is None, "fakeredis no está instalado")
+class PrometheusMetricsTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(
+            metrics, "get_redis", return_value=fakeredis.FakeRedis()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scrape_reads_running_aggregates(self):
+        metrics.record_job(
+            "completed",
+            {
+                "input": {"duration": 60.5, "file_size": 1000},
+                "stages": {"metadata": 0.2, "render": 12.0},
+                "encodes": [3.0, 4.0],
+                "uploads": {"original": 2.0, "short_1": 1.0, "cover_1": 0.1},
+            },
+        )
+        metrics.record_job("failed", {"stages": {"metadata": 0.4}})
+
+        with self.assertNumQueries(0):
+            text = metrics.render_prometheus()
+
+        self.assertIn("# TYPE verticalia_jobs_total counter", text)
+        self.assertIn('verticalia_jobs_total{status="completed"} 1', text)
+        self.assertIn('verticalia_jobs_total{status="failed"} 1', text)
+        self.assertIn("# TYPE verticalia_input_video_seconds_total counter", text)
+        self.assertIn("verticalia_input_video_seconds_total 60.5", text)
+        self.assertIn("verticalia_input_bytes_total 1000", text)
+        self.assertIn('verticalia_stage_seconds_bucket{stage="metadata",le="0.5"} 2', text)
+        self.assertIn('verticalia_stage_seconds_count{stage="render"} 1', text)
+        self.assertIn('verticalia_short_encode_seconds_bucket{le="2.5"} 0', text)
+        self.assertIn('verticalia_short_encode_seconds_bucket{le="5"} 2', text)
+        self.assertIn("verticalia_short_encode_seconds_sum 7.0", text)
+        self.assertIn('verticalia_upload_seconds_count{asset="short"} 1', text)
+
+
+@skipIf(FFMPEG is None or fakeredis is None, "faltan ffmpeg o fakeredis")
+@override_settings(SHORTS_RENDER_MODE="sequential")
+class PipelineTimingsTests(PlannedVideoMixin, EagerCeleryMixin, LocalMediaMixin, TestCase):
+    """
+    Los tiempos de las tasks del chord llegan a job.timings y a /metrics/.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(
+            metrics, "get_redis", return_value=fakeredis.FakeRedis()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_timings_recorded(self):
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, ProcessingJob.Status.COMPLETED)
+
+        timings = self.job.timings
+        self.assertEqual(
+            set(timings["uploads"]),
+            {"original", "cover_original", "short_1", "cover_1", "short_2", "cover_2"},
+        )
+        self.assertEqual(len(timings["encodes"]), 2)
+        self.assertIn("finalize", timings["stages"])
+
+        scrape = metrics.render_prometheus()
+        self.assertIn('verticalia_upload_seconds_count{asset="short"} 2', scrape)
+        self.assertIn('verticalia_upload_seconds_count{asset="original"} 1', scrape)
+        self.assertIn("verticalia_short_encode_seconds_count 2", scrape)
+        self.assertIn('verticalia_stage_seconds_count{stage="finalize"} 1', scrape)
+
+    @override_settings(VIDEO_PIPELINE_FANOUT=False)
+    def test_monolithic_pipeline_records_upload_and_encode_times(self):
+        self.run_pipeline()
+        self.assert_timings_recorded()
+
+    @override_settings(VIDEO_PIPELINE_FANOUT=True)
+    def test_fanout_pipeline_records_upload_and_encode_times(self):
+        self.run_pipeline()
+        self.assert_timings_recorded()
+
+
+# =========================================================
+# BENCHMARK
+# =========================================================
+@skipIf(FFMPEG is None, "ffmpeg no está instalado")
+class BenchmarkHelpersTests(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+
+    def test_synthetic_input_and_measurement(self):
+        # 8s: lo mínimo para que generate_fallback_clips arme un clip
+        path = generate_synthetic_video(self.tempdir, 160, 90, 8, audio=True)
+        modified = os.path.getmtime(path)
+
+        # el mismo video se reutiliza
+        self.assertEqual(generate_synthetic_video(self.tempdir, 160, 90, 8, True), path)
+        self.assertEqual(os.path.getmtime(path), modified)
+        self.assertEqual(directory_size(self.tempdir), files_size(path))
+
+        source = {"path": path, "duration": 8}
+        result = measure(lambda: benchmark_pipeline.render_shorts(source, None, "vertical"))
+        self.assertIsNone(result["error"])
+        self.assertEqual(result["shorts"], 1)
+        self.assertGreater(result["output_bytes"], 0)
+        self.assertGreaterEqual(result["cpu_seconds"], 0)
+
+        failed = measure(lambda: 1 / 0)
+        self.assertIn("ZeroDivisionError", failed["error"])
+
+    def test_media_store_stand_ins(self):
+        path = os.path.join(self.tempdir, "asset.jpg")
+        with open(path, "wb") as asset:
+            asset.write(b"jpg")
+
+        store_dir = os.path.join(self.tempdir, "cloudinary")
+        with cloudinary_stand_in(store_dir):
+            store = CloudinaryMediaStore()
+            upload = store.upload(path, resource_type="image", folder="f", public_id="p")
+            self.assertEqual(upload["public_id"], "f/p")
+            self.assertEqual(directory_size(store_dir), 3)
+            store.destroy_many(["f/p"], resource_type="image")
+            self.assertEqual(directory_size(store_dir), 0)
+        self.assertFalse(os.path.exists(store_dir))
+
+        with local_media_store(store_dir):
+            self.assertIsInstance(get_media_store(), LocalMediaStore)
+
+    def test_pipeline_case_restores_eager_mode(self):
+        previous = current_app.conf.task_always_eager
+        video_path = os.path.join(self.tempdir, "source.mp4")
+        make_test_video(video_path, seconds=1)
+        source = {"name": "source.mp4", "path": video_path}
+
+        with mock.patch.object(benchmark_pipeline, "measure", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                benchmark_pipeline.Command().run_pipeline(source, self.tempdir)
+
+        self.assertEqual(current_app.conf.task_always_eager, previous)
+
+
+@skipIf(FFMPEG is None, "ffmpeg no está instalado")
+class BenchmarkPipelineCleanupTests(TransactionTestCase):
+    """
+    Sin transacción de test: el on_commit de delete_video corre como en
+    el comando, apenas se confirma el borrado.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        spool = override_settings(BASE_DIR=self.tempdir)
+        spool.enable()
+        self.addCleanup(spool.disable)
+
+    def test_pipeline_case_purges_the_video_without_a_broker(self):
+        previous = current_app.conf.task_always_eager
+        video_path = os.path.join(self.tempdir, "source.mp4")
+        make_test_video(video_path, seconds=1)
+        source = {"name": "source.mp4", "path": video_path}
+        purges = []
+        apply_async = services.purge_video_task.apply_async
+
+        def record_purge(*args, **kwargs):
+            purges.append(current_app.conf.task_always_eager)
+            return apply_async(*args, **kwargs)
+
+        def pipeline_fails(run):
+            self.assertEqual(Video.objects.filter(file_name="source.mp4").count(), 1)
+            raise RuntimeError("render")
+
+        purge = mock.patch.object(
+            services.purge_video_task, "apply_async", side_effect=record_purge
+        )
+        with purge, mock.patch.object(benchmark_pipeline, "measure", side_effect=pipeline_fails):
+            with self.assertRaises(RuntimeError):
+                benchmark_pipeline.Command().run_pipeline(source, self.tempdir)
+
+        # El purge corrió en el proceso, antes de restaurar el modo eager
+        self.assertEqual(purges, [True])
+        self.assertFalse(Video.objects.exists())
+        self.assertEqual(
+            [name for name in os.listdir(get_spool_dir()) if name.startswith("benchmark_")],
+            [],
+        )
+        self.assertEqual(current_app.conf.task_always_eager, previous)
+
+
+# =========================================================
+# SUBIDA REANUDABLE A CLOUDINARY
+# =========================================================
+@override_settings(CLOUDINARY_UPLOAD_CHUNK_SIZE=100)
+class ResumableUploadTests(SimpleTestCase):
+    content = bytes(range(250))
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        self.path = os.path.join(self.tempdir, "original.mp4")
+        with open(self.path, "wb") as original:
+            original.write(self.content)
+
+        self.store_dir = self.enterContext(
+            cloudinary_stand_in(os.path.join(self.tempdir, "cloudinary"))
+        ).store_dir
+
+        self.parts = []
+        self.upload_part = services._upload_part
+
+    def upload(self, fail_at=None):
+        """
+        Sube el original anotando cada parte; la parte fail_at (1, 2...)
+        se corta como si el worker perdiera la conexión.
+        """
+
+        def upload_part(part, http_headers, options):
+            if len(self.parts) + 1 == fail_at:
+                raise services.ResumableUploadError("conexión cortada")
+            self.parts.append(dict(http_headers))
+            return self.upload_part(part, http_headers, options)
+
+        with mock.patch.object(services, "_upload_part", side_effect=upload_part):
+            return services.upload_large_resumable(
+                self.path, resource_type="video", folder="videos/original", public_id="clip"
+            )
+
+    def stored(self):
+        with open(os.path.join(self.store_dir, "videos__original__clip"), "rb") as stored:
+            return stored.read()
+
+    def test_interrupted_upload_resumes_from_checkpoint(self):
+        checkpoint_path = services.upload_checkpoint_path(self.path)
+
+        with self.assertRaises(services.ResumableUploadError):
+            self.upload(fail_at=2)
+
+        with open(checkpoint_path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        self.assertEqual(checkpoint["offset"], 100)
+
+        result = self.upload()
+
+        self.assertEqual(
+            [part["Content-Range"] for part in self.parts],
+            ["bytes 0-99/250", "bytes 100-199/250", "bytes 200-249/250"],
+        )
+        self.assertEqual(
+            {part["X-Unique-Upload-Id"] for part in self.parts}, {checkpoint["upload_id"]}
+        )
+        self.assertEqual(result["public_id"], "videos/original/clip")
+        self.assertEqual(self.stored(), self.content)
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+    def test_stale_checkpoint_for_another_public_id_is_discarded(self):
+        checkpoint_path = services.upload_checkpoint_path(self.path)
+        with open(checkpoint_path, "w") as checkpoint_file:
+            json.dump(
+                {"upload_id": "viejo", "public_id": "otro", "size": 250, "offset": 200},
+                checkpoint_file,
+            )
+
+        self.upload()
+
+        self.assertEqual(self.parts[0]["Content-Range"], "bytes 0-99/250")
+        self.assertNotIn("viejo", {part["X-Unique-Upload-Id"] for part in self.parts})
+        self.assertEqual(self.stored(), self.content)
+        self.assertFalse(os.path.exists(checkpoint_path))
+
+
+# =========================================================
+# SUBIDA MULTIPART AL SPOOL
+# =========================================================
+class SpoolUploadHandlerTests(TestCase):
+    content = b"\x00\x00\x00\x18ftypmp42" * 512
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        spool = override_settings(BASE_DIR=self.tempdir)
+        spool.enable()
+        self.addCleanup(spool.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+
+    def post_video(self):
+        return self.client.post(
+            reverse("videos:video-list"),
+            {
+                "video_file": SimpleUploadedFile(
+                    "clip.mp4", self.content, content_type="video/mp4"
+                ),
+                "file_name": "clip.mp4",
+                "type_short": Video.TypeShort.VERTICAL,
+            },
+            format="multipart",
+        )
+
+    def test_multipart_is_written_to_the_spool_and_renamed(self):
+        with mock.patch("videos.uploads.os.replace", wraps=os.replace) as replace:
+            response = self.post_video()
+
+        self.assertEqual(response.status_code, 202)
+
+        # El multipart se escribió en el spool y se renombró, sin copia
+        spool_dir = get_spool_dir()
+        (source, spool_path), _ = replace.call_args
+        self.assertEqual(os.path.dirname(source), spool_dir)
+        self.assertEqual(os.listdir(spool_dir), [os.path.basename(spool_path)])
+        with open(spool_path, "rb") as spool_file:
+            self.assertEqual(spool_file.read(), self.content)
+
+        self.assertEqual(
+            Video.objects.get(id=response.data["id"]).content_hash, sha256(self.content)
+        )
+
+    def test_handler_is_installed_only_on_create(self):
+        video = Video.objects.create(
+            user=get_user_model().objects.get(), file_name="clip.mp4", status=Video.Status.READY
+        )
+
+        with mock.patch("videos.views.SpoolUploadHandler", wraps=SpoolUploadHandler) as handler:
+            self.client.get(reverse("videos:video-list"))
+            self.client.post(reverse("videos:video-stream-token", args=[video.id]))
+            handler.assert_not_called()
+
+            self.assertEqual(self.post_video().status_code, 202)
+            handler.assert_called_once()
+
+
+# =========================================================
+# SPOOL ENTRE NODOS
+# =========================================================
+class TestClientResponse:
+    """
+    Respuesta del test client con la interfaz de requests que usa
+    download_to_spool.
+    """
+
+    def __init__(self, response):
+        self.response = response
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.response.close()
+
+    def raise_for_status(self):
+        if self.response.status_code >= 400:
+            raise requests.HTTPError(f"{self.response.status_code}")
+
+    def iter_content(self, chunk_size):
+        yield from self.response.streaming_content
+
+
+@override_settings(SPOOL_SHARED=False, SPOOL_NODE_URL="http://{node}:8000")
+class SpoolFileTransferTests(TestCase):
+    """
+    Dos nodos en el mismo proceso: cada uno con su spool (BASE_DIR). Las
+    requests del nodo que procesa van al test client como nodo dueño.
+    """
+
+    content = b"original" * 1000
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        self.owner_dir = os.path.join(self.tempdir, "web-1")
+        self.worker_dir = os.path.join(self.tempdir, "worker-2")
+
+        with self.on_node(self.owner_dir, "web-1"):
+            self.path = os.path.join(get_spool_dir(), "tmp123_clip.mp4")
+        with open(self.path, "wb") as spool_file:
+            spool_file.write(self.content)
+
+    def on_node(self, base_dir, name):
+        return override_settings(BASE_DIR=base_dir, SPOOL_NODE_NAME=name)
+
+    def owner_request(self, method, url):
+        with self.on_node(self.owner_dir, "web-1"):
+            return getattr(self.client, method)(urlsplit(url).path)
+
+    def test_bad_or_expired_token_is_not_found(self):
+        bad = reverse("videos:spool-file", args=["no-firmado"])
+        self.assertEqual(self.owner_request("get", bad).status_code, 404)
+        self.assertEqual(self.owner_request("delete", bad).status_code, 404)
+
+        url = uploads.spool_file_url("web-1", self.path)
+        with mock.patch.object(uploads, "SPOOL_URL_MAX_AGE", -1):
+            self.assertEqual(self.owner_request("get", url).status_code, 404)
+            self.assertEqual(self.owner_request("delete", url).status_code, 404)
+
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_worker_on_another_node_fetches_and_releases_the_file(self):
+        def get(url, **kwargs):
+            return TestClientResponse(self.owner_request("get", url))
+
+        def delete(url, **kwargs):
+            response = self.owner_request("delete", url)
+            self.assertEqual(response.status_code, 204)
+            return response
+
+        with mock.patch.object(uploads.requests, "get", side_effect=get):
+            with mock.patch.object(
+                uploads.requests, "delete", side_effect=delete
+            ) as released, self.on_node(self.worker_dir, "worker-2"):
+                # La task trae la ruta del nodo dueño: misma ruta, otro disco
+                task_path = os.path.join(get_spool_dir(), os.path.basename(self.path))
+                local_path = uploads.localize_spool_file(task_path, "web-1")
+
+        released.assert_called_once()
+        self.assertEqual(os.path.dirname(local_path), os.path.join(self.worker_dir, "temp"))
+        with open(local_path, "rb") as local_file:
+            self.assertEqual(local_file.read(), self.content)
+        # El nodo dueño ya no lo guarda y no quedó el .part
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(os.listdir(os.path.dirname(local_path)), ["tmp123_clip.mp4"])
+
+
+# =========================================================
+# SUBIDA POR PARTES
+# =========================================================
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class MergeRangeTests(SimpleTestCase):
+    def test_merges_out_of_order_overlapping_and_duplicate_ranges(self):
+        self.assertEqual(merge_range([[10, 20]], 0, 10), [[0, 20]])
+        self.assertEqual(merge_range([[0, 10]], 5, 15), [[0, 15]])
+        self.assertEqual(merge_range([[0, 10]], 0, 10), [[0, 10]])
+        self.assertEqual(merge_range([[0, 5], [10, 15]], 20, 25), [[0, 5], [10, 15], [20, 25]])
+        self.assertEqual(merge_range([[0, 5], [10, 15]], 4, 11), [[0, 15]])
+
+
+class ChunkedUploadMixin:
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        spool = override_settings(BASE_DIR=self.tempdir)
+        spool.enable()
+        self.addCleanup(spool.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(create_user())
+
+    def start(self, checksum=None):
+        response = self.client.post(
+            reverse("videos:video-upload-list"),
+            {
+                "file_name": "clip.mp4",
+                "total_size": len(self.content),
+                "checksum": checksum or sha256(self.content),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def put_chunk(self, upload_id, start, end, checksum=None):
+        chunk = self.content[start:end]
+        return self.client.put(
+            reverse("videos:video-upload-detail", args=[upload_id]) + f"?offset={start}",
+            chunk,
+            content_type="application/octet-stream",
+            HTTP_X_CHUNK_CHECKSUM=checksum or sha256(chunk),
+        )
+
+    def complete(self, upload_id):
+        return self.client.post(
+            reverse("videos:video-upload-complete", args=[upload_id])
+        )
+
+
+class ChunkedUploadTests(ChunkedUploadMixin, TestCase):
+    def test_out_of_order_chunks(self):
+        upload_id = self.start()
+        for start in (768, 256, 512, 0):
+            self.assertEqual(self.put_chunk(upload_id, start, start + 256).status_code, 200)
+
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 202)
+        with open(VideoUpload.objects.get(id=upload_id).spool_path, "rb") as spool_file:
+            self.assertEqual(spool_file.read(), self.content)
+
+    def test_overlapping_and_duplicate_chunks(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, 600)
+        self.put_chunk(upload_id, 400, 1024)
+        response = self.put_chunk(upload_id, 0, 600)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["received_ranges"], [[0, 1024]])
+        self.assertEqual(self.complete(upload_id).status_code, 202)
+
+    def test_chunk_checksum_mismatch_is_not_registered(self):
+        upload_id = self.start()
+        response = self.put_chunk(upload_id, 0, 512, checksum="0" * 64)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(VideoUpload.objects.get(id=upload_id).received_ranges, [])
+
+    def test_chunk_past_declared_size(self):
+        upload_id = self.start()
+        self.content += b"extra"
+        response = self.put_chunk(upload_id, 1000, 1029)
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_complete_with_missing_parts(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, 512)
+
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Faltan partes", response.data["detail"])
+
+    def test_complete_with_whole_file_hash_mismatch(self):
+        upload_id = self.start(checksum=sha256(b"otro archivo"))
+        self.put_chunk(upload_id, 0, 1024)
+
+        response = self.complete(upload_id)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("checksum", response.data["detail"])
+        self.assertEqual(
+            VideoUpload.objects.get(id=upload_id).status, VideoUpload.Status.PENDING
+        )
+
+    def test_repeated_complete_is_a_conflict(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, 1024)
+
+        self.assertEqual(self.complete(upload_id).status_code, 202)
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        self.assertEqual(self.put_chunk(upload_id, 0, 1024).status_code, 400)
+        self.assertEqual(Video.objects.count(), 1)
+
+
+class UploadSessionExpiryTests(ChunkedUploadMixin, TestCase):
+    def expire(self, upload_id):
+        VideoUpload.objects.filter(id=upload_id).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+    @override_settings(SPOOL_SHARED=True)
+    def test_beat_discards_expired_sessions_and_their_spool_files(self):
+        stale_id = self.start()
+        fresh_id = self.start()
+        self.put_chunk(stale_id, 0, 512)
+        self.expire(stale_id)
+        stale_path = VideoUpload.objects.get(id=stale_id).spool_path
+
+        self.assertEqual(expire_upload_sessions.apply().get(), 1)
+
+        self.assertFalse(VideoUpload.objects.filter(id=stale_id).exists())
+        self.assertFalse(os.path.exists(stale_path))
+        self.assertTrue(os.path.exists(VideoUpload.objects.get(id=fresh_id).spool_path))
+
+    @override_settings(SPOOL_SHARED=False, SPOOL_NODE_NAME="web-1")
+    def test_beat_routes_discards_to_the_spool_node(self):
+        upload_id = self.start()
+        self.expire(upload_id)
+
+        with mock.patch("videos.uploads.discard_upload_sessions_task.apply_async") as discard:
+            expire_upload_sessions.apply()
+
+        discard.assert_called_once_with(args=[[upload_id]], queue="spool.web-1")
+
+    def test_expired_session_rejects_chunks_and_complete(self):
+        upload_id = self.start()
+        self.put_chunk(upload_id, 0, 1024)
+        self.expire(upload_id)
+
+        response = self.put_chunk(upload_id, 0, 1024)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("expiró", response.data["detail"])
+        self.assertEqual(self.complete(upload_id).status_code, 400)
+        self.assertEqual(Video.objects.count(), 0)
+
+    def test_chunk_extends_expiry(self):
+        upload_id = self.start()
+        VideoUpload.objects.filter(id=upload_id).update(
+            expires_at=timezone.now() + timedelta(seconds=5)
+        )
+
+        self.put_chunk(upload_id, 0, 512)
+
+        self.assertGreater(
+            VideoUpload.objects.get(id=upload_id).expires_at,
+            timezone.now() + timedelta(seconds=settings.VIDEO_UPLOAD_SESSION_TTL - 60),
+        )
+
+    @override_settings(VIDEO_UPLOAD_MAX_OPEN_SESSIONS=2)
+    def test_open_sessions_are_capped_per_user(self):
+        first_id = self.start()
+        self.start()
+
+        response = self.client.post(
+            reverse("videos:video-upload-list"),
+            {"file_name": "clip.mp4", "total_size": 10, "checksum": sha256(b"x")},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(os.listdir(os.path.join(self.tempdir, "temp"))), 2)
+
+        # Las vencidas no cuentan, y otro usuario tiene su propio cupo
+        self.expire(first_id)
+        self.start()
+        self.client.force_authenticate(create_user("otro@example.com"))
+        self.start()
+
+
+# =========================================================
+# OUTBOX
+# =========================================================
+class FakeMediaStore:
+    """
+    Almacenamiento que anota los borrados; los resource_type de
+    failing fallan.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.destroyed = []
+
+    def destroy_many(self, public_ids, resource_type="image"):
+        if resource_type in self.failing:
+            raise RuntimeError(f"{resource_type} no disponible")
+        self.destroyed += public_ids
+
+
+class MediaOutboxTests(TestCase):
+    def destroys(self):
+        return MediaOperation.objects.filter(action=MediaOperation.Action.DESTROY)
+
+    def test_expired_reservations_destroy_only_unregistered_assets(self):
+        video, _ = create_processing_video()
+        video.cloudinary_public_id = "videos/original/kept"
+        video.save()
+
+        past = timezone.now() - timedelta(seconds=1)
+        outbox.reserve_upload("videos/original/kept", "video", past)
+        outbox.reserve_upload("videos/shorts/orphan", "video", past)
+        outbox.reserve_upload("videos/shorts/in_flight", "video", timezone.now() + timedelta(hours=1))
+
+        outbox.expire_upload_reservations(limit=10)
+
+        self.assertEqual(
+            list(self.destroys().values_list("public_id", flat=True)),
+            ["videos/shorts/orphan"],
+        )
+        self.assertEqual(
+            list(
+                MediaOperation.objects.filter(
+                    action=MediaOperation.Action.UPLOAD
+                ).values_list("public_id", flat=True)
+            ),
+            ["videos/shorts/in_flight"],
+        )
+
+    def test_claim_skips_locked_rows_and_hides_claimed_ones(self):
+        outbox.enqueue_destroy({"video": ["a", "b"]}, notify=False)
+        MediaOperation.objects.filter(public_id="b").update(
+            available_at=timezone.now() + timedelta(hours=1)
+        )
+
+        with mock.patch.object(
+            MediaOperation.objects,
+            "select_for_update",
+            wraps=MediaOperation.objects.select_for_update,
+        ) as select_for_update:
+            claimed = outbox.claim_destroy_batch(limit=10)
+
+        select_for_update.assert_called_once_with(skip_locked=True)
+        self.assertEqual([operation.public_id for operation in claimed], ["a"])
+        self.assertEqual(claimed[0].attempts, 1)
+        # otro dispatcher no la vuelve a tomar mientras dure el claim
+        self.assertEqual(outbox.claim_destroy_batch(limit=10), [])
+
+    @override_settings(MEDIA_DELETE_MAX_RETRIES=1)
+    def test_partial_destroy_failure_is_retried_then_marked_failed(self):
+        outbox.enqueue_destroy({"video": ["clip"], "image": ["cover"]}, notify=False)
+        store = FakeMediaStore(failing=("video",))
+
+        with mock.patch.object(outbox, "get_media_store", return_value=store):
+            self.assertEqual(outbox.run_destroy_batch(limit=10), 2)
+
+            self.assertEqual(store.destroyed, ["cover"])
+            operation = self.destroys().get()
+            self.assertEqual(operation.public_id, "clip")
+            self.assertEqual(operation.status, MediaOperation.Status.PENDING)
+            self.assertEqual(operation.attempts, 1)
+            self.assertIn("video no disponible", operation.last_error)
+            self.assertGreater(operation.available_at, timezone.now())
+
+            # backoff vencido: segundo intento, sin más reintentos
+            self.destroys().update(available_at=timezone.now())
+            outbox.run_destroy_batch(limit=10)
+
+        operation = self.destroys().get()
+        self.assertEqual(operation.attempts, 2)
+        self.assertEqual(operation.status, MediaOperation.Status.FAILED)
+
+    def test_enqueue_destroy_dedups_and_closes_reservations(self):
+        outbox.reserve_upload("videos/shorts/a", "video", timezone.now())
+
+        outbox.enqueue_destroy(
+            {"video": ["videos/shorts/a", "videos/shorts/a"]}, notify=False
+        )
+        outbox.enqueue_destroy({"video": ["videos/shorts/a"]}, notify=False)
+
+        self.assertEqual(self.destroys().count(), 1)
+        self.assertFalse(
+            MediaOperation.objects.filter(action=MediaOperation.Action.UPLOAD).exists()
+        )
+
+
+# =========================================================
+# BORRADO
+# =========================================================
+def create_processed_video(user, name="clip"):
+    """
+    Video READY con su original, cover y un short publicados.
+    """
+    video = Video.objects.create(
+        user=user,
+        file_name=f"{name}.mp4",
+        status=Video.Status.READY,
+        file_url=f"https://media.test/{name}.mp4",
+        cloudinary_public_id=f"videos/original/{name}",
+        cover_original_url=f"https://media.test/{name}.jpg",
+        cover_original_cloudinary_public_id=f"videos/covers/{name}",
+        content_hash=sha256(name.encode()),
+        type_short=Video.TypeShort.VERTICAL,
+    )
+    Short.objects.create(
+        video=video,
+        file_url=f"https://media.test/{name}_short.mp4",
+        cloudinary_public_id=f"videos/shorts/{name}_1",
+        cover_url=f"https://media.test/{name}_short.jpg",
+        cover_cloudinary_public_id=f"videos/shorts/covers/{name}_1",
+        start_second=0,
+        end_second=30,
+        status=Short.Status.READY,
+    )
+    return video
+
+
+class DeletionTests(EagerCeleryMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # El dispatcher del outbox corre (eager) contra este almacenamiento
+        self.store = FakeMediaStore()
+        patcher = mock.patch.object(outbox, "get_media_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def destroyed(self):
+        return sorted(self.store.destroyed)
+
+    def test_delete_endpoint_answers_202_and_purges_in_background(self):
+        video = create_processed_video(self.user)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(reverse("videos:video-detail", args=[video.id]))
+
+        self.assertEqual(response.status_code, 202)
+        # Todavía no se borró nada, pero la API ya no lo muestra
+        self.assertEqual(self.destroyed(), [])
+        self.assertEqual(
+            self.client.get(reverse("videos:video-detail", args=[video.id])).status_code,
+            404,
+        )
+        self.assertEqual(self.client.get(reverse("shorts:short-list")).data["count"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in callbacks:
+                callback()
+
+        self.assertFalse(Video.objects.exists())
+        self.assertFalse(Short.objects.exists())
+        self.assertEqual(
+            self.destroyed(),
+            [
+                "videos/covers/clip",
+                "videos/original/clip",
+                "videos/shorts/clip_1",
+                "videos/shorts/covers/clip_1",
+            ],
+        )
+
+    def test_shared_assets_survive_deleting_one_copy(self):
+        source = create_processed_video(self.user)
+        copy = services.clone_processed_video(source, "copia.mp4")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.delete_video(copy)
+
+        self.assertFalse(Video.objects.filter(id=copy.id).exists())
+        self.assertEqual(self.destroyed(), [])
+        self.assertEqual(source.shorts.count(), 1)
+
+        # El último dueño sí los borra
+        with self.captureOnCommitCallbacks(execute=True):
+            services.delete_video(source)
+
+        self.assertEqual(len(self.destroyed()), 4)
+
+    def test_delete_short_endpoint_keeps_the_video_and_shared_assets(self):
+        source = create_processed_video(self.user)
+        copy = services.clone_processed_video(source, "copia.mp4")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                reverse("shorts:short-detail", args=[copy.shorts.get().id])
+            )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(copy.shorts.exists())
+        self.assertTrue(Video.objects.filter(id=copy.id).exists())
+        # El short del video original sigue usando los mismos assets
+        self.assertEqual(self.destroyed(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_short(source.shorts.get())
+
+        self.assertEqual(
+            self.destroyed(), ["videos/shorts/clip_1", "videos/shorts/covers/clip_1"]
+        )
+        self.assertTrue(Video.objects.filter(id=source.id).exists())
+
+    def test_processing_video_is_purged_only_when_the_pipeline_ends(self):
+        video, job = create_processing_video("other@example.com")
+        video.cloudinary_public_id = "videos/original/clip"
+        video.save()
+        Video.objects.filter(id=video.id).update(deleted_at=timezone.now())
+
+        # Reintentos agotados: se saltea en vez de borrar la fila
+        services.purge_video_task.apply(
+            args=(video.id,), retries=settings.MEDIA_DELETE_MAX_RETRIES
+        )
+
+        self.assertTrue(Video.objects.filter(id=video.id).exists())
+        self.assertEqual(self.destroyed(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.finish_processing(video, job)
+
+        self.assertFalse(Video.objects.filter(id=video.id).exists())
+        self.assertEqual(self.destroyed(), ["videos/original/clip"])
+
+
+# =========================================================
+# DEDUPLICACIÓN POR HASH
+# =========================================================
+class DeduplicationTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.source = create_processed_video(self.user)
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        self.temp_path = os.path.join(self.tempdir, "upload.mp4")
+        with open(self.temp_path, "wb") as upload:
+            upload.write(b"clip")
+
+    def start(self, user=None):
+        with mock.patch.object(services, "enqueue_video_processing") as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                video, reused = services.start_video_processing(
+                    user or self.user,
+                    self.temp_path,
+                    self.source.content_hash,
+                    "copia.mp4",
+                    Video.TypeShort.VERTICAL,
+                )
+        return video, reused, enqueue
+
+    def test_hash_hit_clones_rows_without_reencoding(self):
+        video, reused, enqueue = self.start()
+
+        self.assertTrue(reused)
+        enqueue.assert_not_called()
+        self.assertFalse(os.path.exists(self.temp_path))
+
+        self.assertNotEqual(video.id, self.source.id)
+        self.assertEqual(video.status, Video.Status.READY)
+        self.assertEqual(video.file_name, "copia.mp4")
+        self.assertEqual(video.cloudinary_public_id, self.source.cloudinary_public_id)
+        self.assertEqual(video.generated_shorts_count, 1)
+
+        short, source_short = video.shorts.get(), self.source.shorts.get()
+        self.assertNotEqual(short.id, source_short.id)
+        self.assertEqual(short.cloudinary_public_id, source_short.cloudinary_public_id)
+        self.assertEqual(
+            short.cover_cloudinary_public_id, source_short.cover_cloudinary_public_id
+        )
+
+        job = video.processing_jobs.get()
+        self.assertEqual(job.status, ProcessingJob.Status.COMPLETED)
+        self.assertEqual(job.progress, 100)
+
+    def test_no_match_across_users(self):
+        other = create_user("other@example.com")
+        video, reused, enqueue = self.start(user=other)
+
+        self.assertFalse(reused)
+        self.assertEqual(video.status, Video.Status.UPLOADED)
+        enqueue.assert_called_once()
+        self.assertTrue(os.path.exists(self.temp_path))
+
+    def test_no_match_against_failed_or_deleted_videos(self):
+        for change in ({"status": Video.Status.FAILED}, {"deleted_at": timezone.now()}):
+            with self.subTest(**change):
+                Video.objects.filter(id=self.source.id).update(**change)
+
+                video, reused, enqueue = self.start()
+
+                self.assertFalse(reused)
+                self.assertEqual(video.status, Video.Status.UPLOADED)
+                self.assertFalse(video.shorts.exists())
+                enqueue.assert_called_once()
+
+                Video.objects.filter(id=self.source.id).update(
+                    status=Video.Status.READY, deleted_at=None
+                )
+
+
+# =========================================================
+# ESTADO EN LOTE (ETag)
+# =========================================================
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class StatusBatchTests(TestCase):
+    def setUp(self):
+        self.video, self.job = create_processing_video()
+        self.other, _ = create_processing_video("other@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.video.user)
+        cache.clear()
+
+        publish_event = mock.patch("videos.progress.publish_event")
+        publish_event.start()
+        self.addCleanup(publish_event.stop)
+
+    def status_batch(self, **headers):
+        return self.client.get(
+            reverse("videos:video-status-batch"),
+            {"ids": f"{self.video.id},{self.other.id}"},
+            headers=headers,
+        )
+
+    def test_returns_statuses_with_etag(self):
+        response = self.status_batch()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"])
+        # el video de otro usuario no aparece
+        self.assertEqual(
+            response.json(),
+            {str(self.video.id): {"status": "processing", "progress": 35, "error": None}},
+        )
+
+    def test_matching_if_none_match_returns_304(self):
+        etag = self.status_batch()["ETag"]
+
+        response = self.status_batch(**{"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertFalse(response.content)
+
+    def test_progress_update_changes_etag(self):
+        etag = self.status_batch()["ETag"]
+
+        services.advance_job(self.video, self.job, 60)
+        response = self.status_batch(**{"If-None-Match": etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()[str(self.video.id)]["progress"], 60)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class VideoStatusTests(TestCase):
+    def setUp(self):
+        self.video, self.job = create_processing_video()
+        self.client = APIClient()
+        self.client.force_authenticate(self.video.user)
+        cache.clear()
+
+        publish_event = mock.patch("videos.progress.publish_event")
+        publish_event.start()
+        self.addCleanup(publish_event.stop)
+
+    def status(self):
+        return self.client.get(reverse("videos:video-status", args=[self.video.id]))
+
+    def test_cache_hit_does_not_touch_the_database(self):
+        services.advance_job(self.video, self.job, 60)
+
+        with self.assertNumQueries(0):
+            response = self.status()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            {"id": self.video.id, "status": "processing", "progress": 60, "error": None},
+        )
+
+    def test_cache_miss_falls_back_to_the_database(self):
+        self.job.status = ProcessingJob.Status.FAILED
+        self.job.error_message = "ffmpeg falló"
+        self.job.save()
+        Video.objects.filter(id=self.video.id).update(status=Video.Status.FAILED)
+
+        response = self.status()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            {"id": self.video.id, "status": "failed", "progress": 35, "error": "ffmpeg falló"},
+        )
+
+    def test_cached_state_of_another_users_video_is_not_found(self):
+        services.advance_job(self.video, self.job, 60)
+        self.client.force_authenticate(create_user("other@example.com"))
+
+        response = self.status()
+
+        self.assertEqual(response.status_code, 404)
+
+
+# =========================================================
+# SUBIDA DIRECTA (MEDIA_STORE=local)
+# =========================================================
+# core.urls monta /media/ solo si MEDIA_STORE=local al arrancar
+urlpatterns = core_urlpatterns + [
+    path("media-upload/<str:token>", upload_media, name="media-upload"),
+    path("media/<path:path>", serve_media, name="media"),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, MEDIA_URL="http://testserver/media/")
+class LocalDirectUploadTests(LocalMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("owner@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request_ticket(self):
+        response = self.client.post(
+            reverse("videos:video-upload-direct"),
+            {"file_name": "clip.mp4"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, url, content):
+        return self.client.generic(
+            "PUT", url, data=content, content_type="application/octet-stream"
+        )
+
+    def confirm(self, ticket):
+        return self.client.post(
+            reverse("videos:video-upload-direct-confirm"),
+            {"ticket": ticket},
+            format="json",
+        )
+
+    def test_put_to_signed_url_then_confirm_starts_processing(self):
+        ticket = self.request_ticket()
+        self.assertEqual(ticket["method"], "PUT")
+        self.assertTrue(ticket["upload_url"].startswith("http://testserver/media-upload/"))
+
+        response = self.put(ticket["upload_url"], b"video" * 1000)
+        self.assertEqual(response.status_code, 201)
+        public_id = response.json()["public_id"]
+        self.assertTrue(public_id.startswith("videos/incoming/upload_"))
+        self.assertEqual(
+            get_media_store().resource(public_id, resource_type="video")["bytes"], 5000
+        )
+
+        response = self.confirm(ticket["ticket"])
+
+        self.assertEqual(response.status_code, 202)
+        video = Video.objects.get(id=response.json()["id"])
+        self.assertEqual(video.source_public_id, public_id)
+        # confirmado: el outbox ya no lo borra
+        self.assertFalse(MediaOperation.objects.filter(public_id=public_id).exists())
+
+    def test_confirm_without_upload_fails(self):
+        ticket = self.request_ticket()
+
+        self.assertEqual(self.confirm(ticket["ticket"]).status_code, 400)
+        self.assertFalse(Video.objects.exists())
+
+    def test_put_rejects_invalid_repeated_and_oversized_uploads(self):
+        ticket = self.request_ticket()
+        url = ticket["upload_url"]
+
+        self.assertEqual(self.put(url + "x", b"video").status_code, 404)
+
+        with mock.patch("videos.views.VideoUploadSerializer.MAX_FILE_SIZE", 4):
+            self.assertEqual(self.put(url, b"video").status_code, 413)
+        self.assertEqual(self.confirm(ticket["ticket"]).status_code, 400)
+
+        self.assertEqual(self.put(url, b"video").status_code, 201)
+        self.assertEqual(self.put(url, b"other").status_code, 409)
+
+
+@override_settings(ROOT_URLCONF=__name__, MEDIA_ACCEL_REDIRECT="")
+class MediaRangeTests(LocalMediaMixin, SimpleTestCase):
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "videos"))
+        self.path = os.path.join(settings.MEDIA_ROOT, "videos", "clip.mp4")
+        with open(self.path, "wb") as media_file:
+            media_file.write(self.content)
+        self.modified = http_date(os.stat(self.path).st_mtime)
+
+    def get(self, **headers):
+        response = self.client.get(
+            reverse("media", args=["videos/clip.mp4"]), headers=headers
+        )
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-99", 1024), (0, 99))
+        self.assertEqual(parse_range("bytes=1000-", 1024), (1000, 1023))
+        self.assertEqual(parse_range("bytes=-24", 1024), (1000, 1023))
+        self.assertEqual(parse_range("bytes=1000-5000", 1024), (1000, 1023))
+        self.assertIsNone(parse_range(None, 1024))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 1024))
+        self.assertIsNone(parse_range("bytes=-", 1024))
+        with self.assertRaises(ValueError):
+            parse_range("bytes=1024-", 1024)
+        with self.assertRaises(ValueError):
+            parse_range("bytes=10-5", 1024)
+
+    def test_satisfiable_range_is_206(self):
+        response = self.get(Range="bytes=100-199")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 100-199/1024")
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertEqual(self.body(response), self.content[100:200])
+
+    def test_unsatisfiable_range_is_416(self):
+        response = self.get(Range="bytes=2000-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_multiple_or_malformed_ranges_serve_the_whole_file(self):
+        for header in ("bytes=0-1,5-6", "bytes=abc", "items=0-10"):
+            with self.subTest(header=header):
+                response = self.get(Range=header)
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Length"], "1024")
+                self.assertEqual(response["Accept-Ranges"], "bytes")
+                self.assertEqual(self.body(response), self.content)
+
+    def test_if_range_must_match_last_modified(self):
+        response = self.get(Range="bytes=0-9", **{"If-Range": self.modified})
+        self.assertEqual(response.status_code, 206)
+
+        # El archivo cambió desde que el cliente guardó la primera parte
+        stale = http_date(os.stat(self.path).st_mtime - 60)
+        response = self.get(Range="bytes=0-9", **{"If-Range": stale})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT="/protected-media/")
+    def test_accel_redirect_leaves_delivery_to_nginx(self):
+        response = self.get(Range="bytes=0-9")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/videos/clip.mp4")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertEqual(response.content, b"")
+
+
+# =========================================================
+# EVENTOS (SSE)
+# =========================================================
+@skipIf(fakeredis is None, "fakeredis no está instalado")
+@override_settings(VIDEO_EVENTS_MAX_SECONDS=0)
+class ProgressEventsTests(TestCase):
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        self.redis = fakeredis.FakeRedis(server=server)
+        patchers = [
+            mock.patch.object(events, "get_redis", return_value=self.redis),
+            mock.patch.object(events, "_publish_script", None),
+            mock.patch(
+                "videos.events.redis.asyncio.Redis.from_url",
+                side_effect=lambda url: fakeredis.aioredis.FakeRedis(server=server),
+            ),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.video, _ = create_processing_video()
+        self.other_video = Video.objects.create(user=self.video.user, file_name="b.mp4")
+        self.client = APIClient()
+
+    def state(self, video, progress):
+        return {
+            "id": video.id,
+            "user_id": video.user_id,
+            "status": "processing",
+            "progress": progress,
+            "error": None,
+        }
+
+    def store_event(self, video, version, progress):
+        # como lo deja PUBLISH_EVENT_SCRIPT, sin necesitar Lua
+        self.redis.hset(
+            events.EVENTS_LATEST_KEY.format(video.user_id),
+            video.id,
+            json.dumps({**self.state(video, progress), "version": version}),
+        )
+
+    def read_stream(self, *args, **kwargs):
+        async def collect():
+            return [chunk async for chunk in events.stream_events(*args, **kwargs)]
+
+        return async_to_sync(collect)()
+
+    def sent_events(self, chunks):
+        return [
+            json.loads(line[len("data: "):])
+            for chunk in chunks
+            for line in chunk.splitlines()
+            if line.startswith("data: ")
+        ]
+
+    @skipIf(lupa is None, "lupa no está instalado")
+    def test_publish_event_numbers_events_per_user(self):
+        first = events.publish_event(self.video.user_id, self.state(self.video, 40))
+        second = events.publish_event(self.video.user_id, self.state(self.other_video, 10))
+        third = events.publish_event(self.video.user_id, self.state(self.video, 60))
+
+        self.assertEqual([first["version"], second["version"], third["version"]], [1, 2, 3])
+        latest = self.redis.hgetall(events.EVENTS_LATEST_KEY.format(self.video.user_id))
+        self.assertEqual(json.loads(latest[str(self.video.id).encode()])["progress"], 60)
+
+        chunks = self.read_stream(self.video.user_id, last_version=2)
+        self.assertEqual(
+            [(event["id"], event["version"]) for event in self.sent_events(chunks)],
+            [(self.video.id, 3)],
+        )
+
+    def test_replay_sends_only_newer_events_without_user_id(self):
+        self.store_event(self.video, 3, 60)
+        self.store_event(self.other_video, 2, 10)
+
+        chunks = self.read_stream(self.video.user_id, last_version=2)
+
+        self.assertEqual(chunks[0], "retry: 3000\n\n")
+        self.assertIn("id: 3\n", chunks[1])
+        self.assertEqual(
+            self.sent_events(chunks),
+            [{"id": self.video.id, "status": "processing", "progress": 60, "error": None, "version": 3}],
+        )
+
+    def test_live_events_follow_the_replay(self):
+        self.store_event(self.video, 1, 40)
+        live = json.dumps({**self.state(self.video, 80), "version": 2})
+
+        async def collect():
+            stream = events.stream_events(self.video.user_id)
+            chunks = [await stream.__anext__(), await stream.__anext__()]
+            # ya suscripto: lo publicado ahora llega en vivo
+            self.redis.publish(events.EVENTS_CHANNEL.format(self.video.user_id), live)
+            async for chunk in stream:
+                chunks.append(chunk)
+                if chunk.startswith("id:"):
+                    break
+            await stream.aclose()
+            return chunks
+
+        with override_settings(VIDEO_EVENTS_MAX_SECONDS=5):
+            chunks = async_to_sync(collect)()
+
+        self.assertEqual([event["progress"] for event in self.sent_events(chunks)], [40, 80])
+
+    def test_stream_token_opens_only_that_video(self):
+        self.store_event(self.video, 1, 40)
+        self.store_event(self.other_video, 2, 10)
+        self.client.force_authenticate(self.video.user)
+
+        response = self.client.post(
+            reverse("videos:video-stream-token", args=[self.video.id])
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("?token=", response.json()["url"])
+
+        self.client.force_authenticate(None)
+        response = self.client.get(
+            reverse("videos:events"), {"token": response.json()["token"]}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        async def collect():
+            return [chunk.decode() async for chunk in response.streaming_content]
+
+        chunks = async_to_sync(collect)()
+        self.assertEqual([event["id"] for event in self.sent_events(chunks)], [self.video.id])
+
+    def test_stream_token_rejects_other_users_video(self):
+        self.client.force_authenticate(create_user("other@example.com"))
+
+        response = self.client.post(
+            reverse("videos:video-stream-token", args=[self.video.id])
+        )
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_token_in_url_is_rejected(self):
+        api_token = Token.objects.create(user=self.video.user)
+
+        self.assertEqual(
+            self.client.get(reverse("videos:events"), {"token": api_token.key}).status_code,
+            401,
+        )
+        self.assertEqual(
+            self.client.get(reverse("videos:events"), {"token": "x"}).status_code, 401
+        )
+
+    @override_settings(VIDEO_EVENTS_TOKEN_TTL=-1)
+    def test_expired_stream_token_is_rejected(self):
+        token = events.create_stream_token(self.video.user_id, self.video.id)
+
+        self.assertEqual(
+            self.client.get(reverse("videos:events"), {"token": token}).status_code, 401
+        )
+
+
+class AsgiRoutingTests(SimpleTestCase):
+    def test_asgi_serves_only_the_event_stream(self):
+        from core import asgi
+
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": reverse("videos:video-list")}
+        async_to_sync(asgi.application)(scope, receive, send)
+
+        self.assertEqual(sent[0]["status"], 404)
+        self.assertEqual(asgi.EVENTS_PATH, reverse("videos:events"))
@@ -0,0 +1,500 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+import requests
+from celery import shared_task
+from django.conf import settings
+from django.core import signing
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import VideoUpload, upload_session_expiry
+from .outbox import enqueue_destroy, reserve_upload
+from .storage import MediaNotFound, get_media_store
+
+logger = logging.getLogger(__name__)
+
+READ_BLOCK_SIZE = 1024 * 1024  # 1MB
+
+
+class UploadError(ValueError):
+    """
+    Error de protocolo en una subida por partes (se responde 400).
+    """
+
+
+class UploadLimitError(UploadError):
+    """
+    El usuario ya tiene VIDEO_UPLOAD_MAX_OPEN_SESSIONS subidas abiertas
+    (se responde 429).
+    """
+
+
+# =========================================================
+# SPOOL
+# =========================================================
+def get_spool_dir():
+    """
+    Directorio donde quedan los archivos hasta que los procesa Celery.
+    """
+    spool_dir = os.path.join(settings.BASE_DIR, "temp")
+    os.makedirs(spool_dir, exist_ok=True)
+    return spool_dir
+
+
+# =========================================================
+# UBICACIÓN DEL SPOOL
+# =========================================================
+# Sin volumen compartido cada archivo queda en el spool del nodo que lo
+# recibió. Las tasks llevan ese nodo (spool_node) y, si corren en otro,
+# bajan el archivo por HTTP desde el web del nodo dueño.
+SPOOL_URL_SALT = "videos.spool"
+SPOOL_URL_MAX_AGE = 24 * 60 * 60  # la task puede esperar en la cola
+
+
+def spool_queue(node):
+    """
+    Cola de Celery que consumen los workers del nodo.
+    """
+    return f"spool.{node}"
+
+
+def local_spool_queue():
+    """
+    Cola de este nodo, o None si el spool es compartido y cualquier
+    worker ve los archivos.
+    """
+    if settings.SPOOL_SHARED:
+        return None
+    return spool_queue(settings.SPOOL_NODE_NAME)
+
+
+def spool_file_url(node, path):
+    """
+    URL firmada con la que otro nodo descarga (GET) o libera (DELETE)
+    un archivo del spool de node.
+    """
+    token = signing.dumps(os.path.basename(path), salt=SPOOL_URL_SALT)
+    base_url = settings.SPOOL_NODE_URL.format(node=node).rstrip("/")
+    return base_url + reverse("videos:spool-file", args=[token])
+
+
+def resolve_spool_file(token):
+    """
+    Ruta local del archivo de una URL de spool_file_url.
+    """
+    try:
+        name = signing.loads(token, salt=SPOOL_URL_SALT, max_age=SPOOL_URL_MAX_AGE)
+    except signing.BadSignature:
+        raise UploadError("URL de spool inválida o expirada")
+    return os.path.join(get_spool_dir(), os.path.basename(name))
+
+
+def localize_spool_file(path, node):
+    """
+    Devuelve una ruta local para un archivo que quedó en el spool de node.
+
+    Si la task cayó en otro nodo, lo descarga al spool local y libera la
+    copia del nodo dueño: desde ahí el archivo vive donde se procesa.
+    """
+    if node == settings.SPOOL_NODE_NAME or os.path.exists(path):
+        return path
+
+    local_path = os.path.join(get_spool_dir(), os.path.basename(path))
+    if os.path.exists(local_path):
+        return local_path  # reintento en este mismo nodo
+
+    url = spool_file_url(node, path)
+    logger.info(f"Archivo en el nodo {node}, descargando: {os.path.basename(path)}")
+    download_to_spool(url, local_path)
+
+    try:
+        requests.delete(url, timeout=30)
+    except requests.RequestException as e:
+        logger.warning(f"No se pudo liberar {path} en el nodo {node}: {e}")
+
+    return local_path
+
+
+class SpooledUploadedFile(TemporaryUploadedFile):
+    """
+    Archivo subido que Django escribe directamente dentro del spool,
+    con su SHA-256 calculado mientras llegaban los datos.
+    """
+
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(
+            suffix=".upload" + ext, dir=get_spool_dir()
+        )
+        # Se salta TemporaryUploadedFile.__init__, que crea el archivo
+        # en FILE_UPLOAD_TEMP_DIR
+        UploadedFile.__init__(
+            self, file, name, content_type, size, charset, content_type_extra
+        )
+        self.sha256 = None
+
+
+class SpoolUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler para la subida de videos: escribe el multipart directo
+    en el spool y calcula el hash al vuelo, así el archivo se puede
+    mover con un rename en vez de copiarlo otra vez.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super(TemporaryFileUploadHandler, self).new_file(*args, **kwargs)
+        self.file = SpooledUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.sha256 = self.digest.hexdigest()
+        return super().file_complete(file_size)
+
+
+def move_to_spool(uploaded_file):
+    """
+    Deja un archivo subido en el spool y devuelve (ruta, sha256).
+
+    Si vino por SpoolUploadHandler ya está en el mismo filesystem: se
+    renombra (atómico, sin copiar). Si no, se copia calculando el hash.
+    """
+    spool_dir = get_spool_dir()
+    fd, spool_path = tempfile.mkstemp(
+        suffix=f"_{get_valid_filename(uploaded_file.name)}", dir=spool_dir
+    )
+
+    content_hash = getattr(uploaded_file, "sha256", None)
+    if content_hash:
+        os.close(fd)
+        try:
+            os.replace(uploaded_file.temporary_file_path(), spool_path)
+            logger.info(f"Archivo movido al spool: {spool_path}")
+            return spool_path, content_hash
+        except OSError:
+            # Otro filesystem (EXDEV): se cae a la copia
+            fd = os.open(spool_path, os.O_WRONLY | os.O_TRUNC)
+
+    digest = hashlib.sha256()
+    with os.fdopen(fd, "wb") as spool_file:
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+            spool_file.write(chunk)
+
+    logger.info(f"Archivo temporal creado: {spool_path}")
+    return spool_path, digest.hexdigest()
+
+
+# =========================================================
+# SUBIDA POR PARTES
+# =========================================================
+def create_upload_session(user, file_name, total_size, checksum, type_short):
+    """
+    Crea la sesión y reserva el archivo en el spool con su tamaño final,
+    así cada parte se puede escribir en su offset sin importar el orden.
+    Cada usuario tiene como mucho VIDEO_UPLOAD_MAX_OPEN_SESSIONS
+    sesiones abiertas: cada una ocupa su tamaño en el spool.
+    """
+    open_sessions = VideoUpload.objects.filter(
+        user=user,
+        status=VideoUpload.Status.PENDING,
+        expires_at__gt=timezone.now(),
+    ).count()
+    if open_sessions >= settings.VIDEO_UPLOAD_MAX_OPEN_SESSIONS:
+        raise UploadLimitError(
+            f"Ya hay {open_sessions} subidas abiertas: completá o cancelá alguna"
+        )
+
+    upload = VideoUpload(
+        user=user,
+        file_name=file_name,
+        total_size=total_size,
+        checksum=checksum.lower(),
+        type_short=type_short,
+        spool_node=settings.SPOOL_NODE_NAME,
+    )
+    upload.spool_path = os.path.join(
+        get_spool_dir(), f"upload_{upload.id}_{get_valid_filename(file_name)}"
+    )
+
+    with open(upload.spool_path, "wb") as spool_file:
+        spool_file.truncate(total_size)
+
+    upload.save()
+    logger.info(f"Subida por partes iniciada: {upload.id} ({total_size} bytes)")
+    return upload
+
+
+def write_upload_chunk(upload, offset, stream, length, checksum):
+    """
+    Escribe una parte en su offset del spool y la registra.
+
+    La parte se escribe mientras se calcula su SHA-256; si no coincide con
+    checksum el rango no se registra (el cliente la vuelve a mandar y se
+    sobrescribe). Varias partes pueden llegar en paralelo. Cada parte
+    registrada corre el vencimiento de la sesión.
+    """
+    check_upload_open(upload)
+
+    if length <= 0 or length > settings.VIDEO_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError(
+            f"Cada parte debe tener entre 1 y "
+            f"{settings.VIDEO_UPLOAD_MAX_CHUNK_SIZE} bytes"
+        )
+
+    if offset < 0 or offset + length > upload.total_size:
+        raise UploadError("La parte queda fuera del tamaño declarado")
+
+    digest = hashlib.sha256()
+    written = 0
+
+    fd = os.open(upload.spool_path, os.O_WRONLY)
+    try:
+        while written < length:
+            block = stream.read(min(READ_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            digest.update(block)
+            os.pwrite(fd, block, offset + written)
+            written += len(block)
+    finally:
+        os.close(fd)
+
+    if written != length:
+        raise UploadError("La parte llegó incompleta")
+
+    if digest.hexdigest() != checksum.lower():
+        raise UploadError("El checksum de la parte no coincide")
+
+    with transaction.atomic():
+        locked = VideoUpload.objects.select_for_update().get(pk=upload.pk)
+        locked.received_ranges = merge_range(
+            locked.received_ranges, offset, offset + length
+        )
+        locked.expires_at = upload_session_expiry()
+        locked.save(update_fields=["received_ranges", "expires_at", "updated_at"])
+
+    return locked
+
+
+def check_upload_open(upload):
+    if upload.status != VideoUpload.Status.PENDING:
+        raise UploadError("La subida ya fue completada")
+    if upload.expires_at <= timezone.now():
+        raise UploadError("La subida expiró")
+
+
+def merge_range(ranges, start, end):
+    """
+    Agrega [start, end) a una lista de rangos y fusiona los que se tocan.
+    """
+    merged = []
+
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+
+    return merged
+
+
+def verify_upload(upload):
+    """
+    Comprueba que llegaron todas las partes y que el archivo completo
+    coincide con el checksum declarado. Devuelve el SHA-256.
+    """
+    check_upload_open(upload)
+    if upload.received_ranges != [[0, upload.total_size]]:
+        raise UploadError(
+            f"Faltan partes: recibidos {upload.received_bytes} "
+            f"de {upload.total_size} bytes"
+        )
+
+    digest = hashlib.sha256()
+    with open(upload.spool_path, "rb") as spool_file:
+        for block in iter(lambda: spool_file.read(READ_BLOCK_SIZE), b""):
+            digest.update(block)
+
+    content_hash = digest.hexdigest()
+    if content_hash != upload.checksum:
+        raise UploadError("El checksum del archivo completo no coincide")
+
+    return content_hash
+
+
+def discard_upload(upload):
+    if os.path.exists(upload.spool_path):
+        os.unlink(upload.spool_path)
+    upload.delete()
+
+
+@shared_task
+def expire_upload_sessions():
+    """
+    Beat: descarta las subidas por partes vencidas y borra su archivo
+    del spool. Sin spool compartido el archivo está en el nodo que
+    recibió la sesión: el borrado va a la cola de ese nodo.
+    """
+    expired = VideoUpload.objects.filter(
+        status=VideoUpload.Status.PENDING, expires_at__lte=timezone.now()
+    )
+
+    if settings.SPOOL_SHARED:
+        return discard_upload_sessions([upload.id for upload in expired])
+
+    by_node = {}
+    for upload in expired.only("id", "spool_node"):
+        by_node.setdefault(upload.spool_node, []).append(str(upload.id))
+    for node, upload_ids in by_node.items():
+        discard_upload_sessions_task.apply_async(
+            args=[upload_ids], queue=spool_queue(node or settings.SPOOL_NODE_NAME)
+        )
+    return 0
+
+
+@shared_task
+def discard_upload_sessions_task(upload_ids):
+    return discard_upload_sessions(upload_ids)
+
+
+def discard_upload_sessions(upload_ids):
+    """
+    Descarta las sesiones que sigan PENDING y vencidas (una parte pudo
+    llegar mientras tanto). Devuelve cuántas borró.
+    """
+    discarded = 0
+    for upload in VideoUpload.objects.filter(
+        id__in=upload_ids,
+        status=VideoUpload.Status.PENDING,
+        expires_at__lte=timezone.now(),
+    ):
+        discard_upload(upload)
+        discarded += 1
+
+    if discarded:
+        logger.info(f"🧹 {discarded} subidas por partes vencidas descartadas")
+    return discarded
+
+
+# =========================================================
+# SUBIDA DIRECTA AL ALMACENAMIENTO
+# =========================================================
+DIRECT_UPLOAD_FOLDER = "videos/incoming"
+DIRECT_UPLOAD_SALT = "videos.direct_upload"
+
+
+def create_direct_upload_ticket(user, file_name, type_short):
+    """
+    Firma una subida del cliente directo al almacenamiento: a Cloudinary
+    sin pasar los bytes por Django o, con MEDIA_STORE=local, un PUT a
+    una URL firmada. Devuelve la URL, el método, los parámetros firmados
+    que el cliente manda tal cual junto al archivo, y un ticket para
+    confirmar.
+    """
+    store = get_media_store()
+    if not store.direct_upload:
+        raise UploadError(
+            "La subida directa no está disponible con este almacenamiento"
+        )
+
+    timestamp = int(time.time())
+    public_id = f"{DIRECT_UPLOAD_FOLDER}/upload_{uuid.uuid4().hex}"
+    target = store.sign_direct_upload(public_id, "video", file_name)
+
+    # Si el ticket nunca se confirma, el outbox borra lo que haya subido
+    reserve_upload(
+        public_id,
+        "video",
+        timezone.now()
+        + timedelta(
+            seconds=settings.VIDEO_DIRECT_UPLOAD_TTL + settings.MEDIA_OUTBOX_UPLOAD_LEASE
+        ),
+    )
+
+    ticket = signing.dumps(
+        {
+            "user": user.id,
+            "public_id": public_id,
+            "file_name": file_name,
+            "type_short": type_short,
+        },
+        salt=DIRECT_UPLOAD_SALT,
+    )
+
+    return {
+        **target,
+        "ticket": ticket,
+        "expires_at": timestamp + settings.VIDEO_DIRECT_UPLOAD_TTL,
+    }
+
+
+def confirm_direct_upload(user, ticket, max_size):
+    """
+    Valida el ticket y que el archivo haya llegado al almacenamiento.
+    Devuelve (datos del ticket, recurso del almacenamiento).
+    """
+    try:
+        data = signing.loads(
+            ticket, salt=DIRECT_UPLOAD_SALT, max_age=settings.VIDEO_DIRECT_UPLOAD_TTL
+        )
+    except signing.SignatureExpired:
+        raise UploadError("El ticket de subida expiró")
+    except signing.BadSignature:
+        raise UploadError("Ticket de subida inválido")
+
+    if data["user"] != user.id:
+        raise UploadError("Ticket de subida inválido")
+
+    store = get_media_store()
+    try:
+        resource = store.resource(data["public_id"], resource_type="video")
+    except MediaNotFound:
+        raise UploadError("El archivo no llegó al almacenamiento")
+
+    if resource["bytes"] > max_size:
+        enqueue_destroy({"video": [data["public_id"]]})
+        raise UploadError(
+            f"El archivo no puede exceder {max_size // (1024*1024)} MB"
+        )
+
+    return data, resource
+
+
+def download_to_spool(url, path):
+    """
+    Descarga url en path por bloques, sin cargarla en memoria.
+    Escribe en un .part y lo renombra al terminar. Devuelve el SHA-256.
+    """
+    digest = hashlib.sha256()
+    partial_path = f"{path}.part"
+
+    try:
+        with requests.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            with open(partial_path, "wb") as spool_file:
+                for block in response.iter_content(READ_BLOCK_SIZE):
+                    digest.update(block)
+                    spool_file.write(block)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+
+    logger.info(f"Original descargado al spool: {path}")
+    return digest.hexdigest()
@@ -1,12 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import VideoViewSet
+from .views import VideoViewSet, VideoUploadViewSet, SpoolFileView, video_events
 
 router = DefaultRouter()
+# antes que VideoViewSet: si no, "uploads" se toma como id de video
+router.register(r"uploads", VideoUploadViewSet, basename="video-upload")
 router.register(r"", VideoViewSet, basename="video")  # lista de videos
 
 app_name = "videos"
 
 urlpatterns = [
+    # uso interno entre nodos (ver videos.uploads.spool_file_url)
+    path("spool/<str:token>/", SpoolFileView.as_view(), name="spool-file"),
+    # stream SSE de progreso (ASGI)
+    path("events/", video_events, name="events"),
     path("", include(router.urls)),
 ]
@@ -1,25 +1,92 @@
+import hashlib
+import hmac
+import json
 import logging
-import tempfile
 import os
+from urllib.parse import urlencode
 from django.conf import settings
+from django.db import transaction
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods, require_safe
+from rest_framework.authtoken.models import Token
 from rest_framework import viewsets, status
-from rest_framework.parsers import MultiPartParser, FormParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import BaseParser, JSONParser, MultiPartParser, FormParser
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from drf_yasg.utils import swagger_auto_schema
+from drf_yasg.utils import swagger_auto_schema, no_body
 from drf_yasg import openapi
 
-from .models import Video
+from .events import create_stream_token, read_stream_token, stream_events
+from .metrics import render_prometheus
+from .models import Video, VideoUpload
+from .progress import collect_video_status, read_progress
+from .storage import MediaNotFound, MediaTooLarge, get_media_store, media_file_response
 from .serializers import (
     VideoUploadSerializer,
     VideoResponseSerializer,
     VideoUpdateSerializer,
+    VideoUploadInitSerializer,
+    VideoUploadSessionSerializer,
+    VideoDirectUploadSerializer,
+    VideoDirectUploadConfirmSerializer,
+)
+from .uploads import (
+    UploadError,
+    UploadLimitError,
+    confirm_direct_upload,
+    create_direct_upload_ticket,
+    create_upload_session,
+    discard_upload,
+    move_to_spool,
+    resolve_spool_file,
+    SpoolUploadHandler,
+    verify_upload,
+    write_upload_chunk,
+)
+from .services import (
+    delete_video,
+    start_direct_video_processing,
+    start_video_processing,
 )
-from .services import process_video_task, delete_video
 
 logger = logging.getLogger(__name__)
 
+# Máximo de videos por consulta de status en lote
+STATUS_BATCH_MAX_IDS = 100
+
+
+def build_processing_response(video, reused):
+    """
+    Respuesta de alta de video: 202 si se encoló el procesamiento,
+    201 si se reutilizó un video idéntico ya procesado.
+    """
+    if reused:
+        message = "Video ya procesado. Se reutilizaron sus shorts."
+        status_code = status.HTTP_201_CREATED
+    else:
+        message = "Video recibido. Procesamiento iniciado."
+        status_code = status.HTTP_202_ACCEPTED
+
+    return Response(
+        {
+            "id": video.id,
+            "file_name": video.file_name,
+            "status": video.status,
+            "message": message,
+        },
+        status=status_code,
+    )
+
 
 class VideoViewSet(viewsets.ModelViewSet):
     """
@@ -29,6 +96,12 @@ class VideoViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
+    def initialize_request(self, request, *args, **kwargs):
+        # En la subida el multipart se escribe directo en el spool
+        if self.action_map.get(request.method.lower()) == "create":
+            request.upload_handlers = [SpoolUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
     # ==============================
     # Queryset
     # ==============================
@@ -36,7 +109,9 @@ class VideoViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if getattr(self, "swagger_fake_view", False):
             return Video.objects.none()
-        return Video.objects.filter(user=self.request.user).order_by("-created_at")
+        return Video.objects.filter(
+            user=self.request.user, deleted_at__isnull=True
+        ).order_by("-created_at")
 
     # ==============================
     # Serializer
@@ -56,10 +131,14 @@ class VideoViewSet(viewsets.ModelViewSet):
     @swagger_auto_schema(
         request_body=VideoUploadSerializer,
         responses={
+            201: openapi.Response(
+                description="Video ya procesado anteriormente. Se reutilizaron sus shorts.",
+                schema=VideoResponseSerializer(),
+            ),
             202: openapi.Response(
                 description="Video recibido. Procesamiento iniciado.",
                 schema=VideoResponseSerializer(),
-            )
+            ),
         },
         operation_summary="Subir video y comenzar procesamiento",
         operation_description="Sube un video y dispara procesamiento asíncrono",
@@ -68,19 +147,20 @@ class VideoViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         type_short = serializer.validated_data["type_short"]
-        video = self._create_video_instance(
+
+        temp_path, content_hash = self._save_temp_file(
+            serializer.validated_data["video_file"]
+        )
+
+        video, reused = start_video_processing(
             user=request.user,
-            validated_data=serializer.validated_data,
+            temp_path=temp_path,
+            content_hash=content_hash,
+            file_name=self._get_file_name(serializer.validated_data),
             type_short=type_short,
         )
 
-        temp_path = self._save_temp_file(serializer.validated_data["video_file"])
-
-        process_video_task.delay(video.id, temp_path, video.file_name, type_short)
-
-        return Response(
-            self._build_create_response(video), status=status.HTTP_202_ACCEPTED
-        )
+        return build_processing_response(video, reused)
 
     # ==============================
     # VIDEO STATUS
@@ -93,8 +173,21 @@ class VideoViewSet(viewsets.ModelViewSet):
     )
     @action(detail=True, methods=["get"])
     def status(self, request, pk=None):
+        # mientras se procesa, la task publica el estado en la cache
+        state = read_progress(pk)
+        if state and state["user_id"] == request.user.id:
+            return Response(
+                {
+                    "id": state["id"],
+                    "status": state["status"],
+                    "progress": state["progress"],
+                    "error": state["error"],
+                }
+            )
+
         video = self.get_object()
-        job = video.processing_jobs.last()
+        # ProcessingJob se ordena por -created_at: first() es el último
+        job = video.processing_jobs.first()
 
         return Response(
             {
@@ -105,6 +198,86 @@ class VideoViewSet(viewsets.ModelViewSet):
             }
         )
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "ids",
+                openapi.IN_QUERY,
+                description=f"IDs separados por coma (hasta {STATUS_BATCH_MAX_IDS})",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+        ],
+        responses={
+            200: openapi.Response(description="{id: {status, progress, error}}"),
+            304: openapi.Response(description="Sin cambios desde el ETag enviado"),
+        },
+        operation_summary="Consultar estado de varios videos",
+        operation_description=(
+            "Estado y progreso de varios videos en una sola consulta. "
+            "Los ids que no existen no aparecen. Con If-None-Match responde "
+            "304 si nada cambió."
+        ),
+    )
+    @action(detail=False, methods=["get"], url_path="status")
+    def status_batch(self, request):
+        try:
+            video_ids = list(
+                dict.fromkeys(
+                    int(video_id)
+                    for video_id in request.query_params.get("ids", "").split(",")
+                    if video_id.strip()
+                )
+            )
+        except ValueError:
+            return Response(
+                {"detail": "ids debe ser una lista de números separados por coma"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not video_ids or len(video_ids) > STATUS_BATCH_MAX_IDS:
+            return Response(
+                {"detail": f"Enviar entre 1 y {STATUS_BATCH_MAX_IDS} ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        statuses = collect_video_status(request.user, video_ids)
+        data = {str(video_id): statuses[video_id] for video_id in sorted(statuses)}
+
+        etag = quote_etag(
+            hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        )
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+
+        response["ETag"] = etag
+        return response
+
+    @swagger_auto_schema(
+        request_body=no_body,
+        responses={201: "url del stream con el token, token y expires_in"},
+        operation_summary="Pedir token para el stream de progreso del video",
+        operation_description=(
+            "Token firmado de corta duración para abrir el stream SSE de "
+            "este video con EventSource (?token=). Si la conexión falla "
+            "porque expiró, pedir otro."
+        ),
+    )
+    @action(detail=True, methods=["post"], url_path="stream-token")
+    def stream_token(self, request, pk=None):
+        video = self.get_object()
+        token = create_stream_token(request.user.id, video.id)
+        return Response(
+            {
+                "url": f"{settings.VIDEO_EVENTS_URL}?{urlencode({'token': token})}",
+                "token": token,
+                "expires_in": settings.VIDEO_EVENTS_TOKEN_TTL,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
     # ==============================
     # VIDEO DOWNLOAD
     # ==============================
@@ -133,59 +306,436 @@ class VideoViewSet(viewsets.ModelViewSet):
     @swagger_auto_schema(
         operation_summary="Borrar video y todo lo asociado",
         operation_description=(
-            "Borra el video original, todos los shorts y sus covers "
-            "tanto de la base de datos como de Cloudinary"
+            "Marca el video y sus shorts como eliminados. El original, los "
+            "shorts y sus covers se borran en segundo plano del "
+            "almacenamiento y de la base de datos."
         ),
         responses={
-            204: "Video eliminado correctamente",
+            202: "Video en proceso de eliminación",
             404: "Video no encontrado",
-            500: "Error eliminando recursos",
         },
     )
     def destroy(self, request, *args, **kwargs):
         video = self.get_object()
+        delete_video(video)
+        return Response(
+            {"detail": "Video en proceso de eliminación"},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    # ==============================
+    # HELPERS
+    # ==============================
+
+    def _get_file_name(self, validated_data):
+        return validated_data.get("file_name") or validated_data["video_file"].name
+
+    def _save_temp_file(self, video_file):
+        """
+        Deja el archivo subido en temp/. Retorna (ruta, hash).
+        """
+        return move_to_spool(video_file)
+
+
+class OctetStreamParser(BaseParser):
+    """
+    Deja el cuerpo crudo como stream, sin cargarlo en memoria.
+    """
+
+    media_type = "application/octet-stream"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream
+
+
+class VideoUploadViewSet(viewsets.GenericViewSet):
+    """
+    Subida por partes y reanudable de videos grandes:
+
+    1. POST   /uploads/                 -> inicia la sesión
+    2. PUT    /uploads/{id}/?offset=N   -> sube una parte (application/octet-stream)
+    3. GET    /uploads/{id}/            -> rangos recibidos (para retomar)
+    4. POST   /uploads/{id}/complete/   -> verifica y encola el procesamiento
+
+    Las partes pueden subirse en cualquier orden y en paralelo.
+
+    Alternativa sin pasar los bytes por Django:
+
+    1. POST   /uploads/direct/          -> ticket firmado
+    2. el cliente sube a upload_url con los params del ticket
+    3. POST   /uploads/direct/confirm/  -> encola el procesamiento
+    """
+
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, OctetStreamParser]
+    serializer_class = VideoUploadSessionSerializer
+    http_method_names = ["get", "post", "put", "delete"]
+
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            return VideoUpload.objects.none()
+        return VideoUpload.objects.filter(user=self.request.user)
+
+    # ==============================
+    # INIT
+    # ==============================
+
+    @swagger_auto_schema(
+        request_body=VideoUploadInitSerializer,
+        responses={
+            201: VideoUploadSessionSerializer,
+            429: "Demasiadas subidas abiertas",
+        },
+        operation_summary="Iniciar subida por partes",
+        operation_description=(
+            "Reserva el archivo en el servidor. checksum es el SHA-256 "
+            "del archivo completo. La sesión vence en expires_at si no "
+            "llegan partes nuevas."
+        ),
+    )
+    def create(self, request, *args, **kwargs):
+        serializer = VideoUploadInitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
         try:
-            delete_video(video)
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        except Exception as e:
-            return Response(
-                {"detail": f"Error eliminando video: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            upload = create_upload_session(user=request.user, **serializer.validated_data)
+        except UploadLimitError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        return Response(
+            VideoUploadSessionSerializer(upload).data, status=status.HTTP_201_CREATED
+        )
+
+    # ==============================
+    # ESTADO
+    # ==============================
+
+    @swagger_auto_schema(
+        responses={200: VideoUploadSessionSerializer},
+        operation_summary="Consultar subida por partes",
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return Response(VideoUploadSessionSerializer(self.get_object()).data)
+
+    # ==============================
+    # PARTE
+    # ==============================
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "offset",
+                openapi.IN_QUERY,
+                description="Byte del archivo donde empieza la parte",
+                type=openapi.TYPE_INTEGER,
+                required=True,
+            ),
+            openapi.Parameter(
+                "X-Chunk-Checksum",
+                openapi.IN_HEADER,
+                description="SHA-256 (hex) de la parte",
+                type=openapi.TYPE_STRING,
+                required=True,
+            ),
+        ],
+        responses={200: VideoUploadSessionSerializer},
+        operation_summary="Subir una parte",
+        operation_description="Cuerpo: bytes crudos de la parte (application/octet-stream).",
+    )
+    def update(self, request, *args, **kwargs):
+        upload = self.get_object()
+
+        try:
+            offset = int(request.query_params.get("offset", ""))
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+            checksum = request.headers.get("X-Chunk-Checksum", "")
+
+            if request.content_type != OctetStreamParser.media_type:
+                raise UploadError("Content-Type debe ser application/octet-stream")
+
+            upload = write_upload_chunk(upload, offset, request.data, length, checksum)
+        except ValueError as e:
+            # UploadError o un offset que no es número
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(VideoUploadSessionSerializer(upload).data)
+
+    # ==============================
+    # COMPLETE
+    # ==============================
+
+    @swagger_auto_schema(
+        request_body=no_body,
+        responses={
+            201: "Video ya procesado anteriormente. Se reutilizaron sus shorts.",
+            202: "Video recibido. Procesamiento iniciado.",
+            400: "Faltan partes o el checksum no coincide",
+        },
+        operation_summary="Completar subida y comenzar procesamiento",
+    )
+    @action(detail=True, methods=["post"])
+    def complete(self, request, pk=None):
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().get(pk=self.get_object().pk)
+
+            if upload.status != VideoUpload.Status.PENDING:
+                return Response(
+                    {"detail": "La subida ya fue completada"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            try:
+                content_hash = verify_upload(upload)
+            except UploadError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            video, reused = start_video_processing(
+                user=request.user,
+                temp_path=upload.spool_path,
+                content_hash=content_hash,
+                file_name=upload.file_name,
+                type_short=upload.type_short,
             )
 
+            upload.status = VideoUpload.Status.COMPLETED
+            upload.video = video
+            upload.save(update_fields=["status", "video", "updated_at"])
+
+        return build_processing_response(video, reused)
+
     # ==============================
-    # HELPERS
+    # SUBIDA DIRECTA
     # ==============================
 
-    def _create_video_instance(self, user, validated_data, type_short):
-        file_name = validated_data.get("file_name") or validated_data["video_file"].name
+    @swagger_auto_schema(
+        request_body=VideoDirectUploadSerializer,
+        responses={
+            201: "upload_url, method, params firmados, ticket y expires_at",
+            400: "El almacenamiento configurado no admite subida directa",
+        },
+        operation_summary="Pedir ticket de subida directa al almacenamiento",
+        operation_description=(
+            "Antes de expires_at, el cliente manda el archivo a upload_url "
+            "con method: POST multipart (Cloudinary) con los params tal cual "
+            "y el archivo en el campo file, o PUT (MEDIA_STORE=local) con el "
+            "archivo como cuerpo."
+        ),
+    )
+    @action(detail=False, methods=["post"])
+    def direct(self, request):
+        serializer = VideoDirectUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            ticket = create_direct_upload_ticket(
+                user=request.user, **serializer.validated_data
+            )
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Video.objects.create(
-            user=user,
-            file_name=file_name,
-            status=Video.Status.UPLOADED,
-            type_short=type_short,
+        return Response(ticket, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        request_body=VideoDirectUploadConfirmSerializer,
+        responses={
+            202: "Video recibido. Procesamiento iniciado.",
+            400: "Ticket inválido o archivo no subido",
+        },
+        operation_summary="Confirmar subida directa y comenzar procesamiento",
+    )
+    @action(detail=False, methods=["post"], url_path="direct/confirm")
+    def direct_confirm(self, request):
+        serializer = VideoDirectUploadConfirmSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            data, resource = confirm_direct_upload(
+                request.user,
+                serializer.validated_data["ticket"],
+                max_size=VideoUploadSerializer.MAX_FILE_SIZE,
+            )
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        video = start_direct_video_processing(
+            user=request.user,
+            source_public_id=data["public_id"],
+            source_url=resource["secure_url"],
+            file_name=data["file_name"],
+            type_short=data["type_short"],
         )
 
-    def _save_temp_file(self, video_file):
-        temp_dir = os.path.join(settings.BASE_DIR, "temp")
-        os.makedirs(temp_dir, exist_ok=True)
-        with tempfile.NamedTemporaryFile(
-            suffix=f"_{video_file.name}", delete=False, dir=temp_dir
-        ) as tmp_file:
-            for chunk in video_file.chunks():
-                tmp_file.write(chunk)
-        logger.info(f"Archivo temporal creado: {tmp_file.name}")
-        return tmp_file.name
-
-    def _build_create_response(self, video):
-        """
-        Retorna info básica de video recién subido
-        """
-        return {
-            "id": video.id,
-            "file_name": video.file_name,
-            "status": video.status,
-            "message": "Video recibido. Procesamiento iniciado.",
-        }
+        return build_processing_response(video, reused=False)
+
+    # ==============================
+    # CANCELAR
+    # ==============================
+
+    @swagger_auto_schema(
+        responses={204: "Subida cancelada"},
+        operation_summary="Cancelar subida por partes",
+    )
+    def destroy(self, request, *args, **kwargs):
+        upload = self.get_object()
+
+        if upload.status == VideoUpload.Status.PENDING:
+            discard_upload(upload)
+        else:
+            upload.delete()  # el archivo ya es del procesamiento
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SpoolFileView(APIView):
+    """
+    Sirve a los workers de otros nodos un archivo del spool de este nodo
+    (GET) y lo libera cuando ya lo descargaron (DELETE).
+    La URL firmada hace de credencial.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    swagger_schema = None
+
+    def _get_path(self, token):
+        try:
+            path = resolve_spool_file(token)
+        except UploadError:
+            raise Http404
+
+        if not os.path.exists(path):
+            raise Http404
+        return path
+
+    def get(self, request, token):
+        path = self._get_path(token)
+        return FileResponse(open(path, "rb"), as_attachment=True)
+
+    def delete(self, request, token):
+        path = self._get_path(token)
+        os.unlink(path)
+        logger.info(f"Archivo del spool liberado: {path}")
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# ==============================
+# EVENTOS DE PROGRESO (SSE)
+# ==============================
+
+
+async def authenticate_stream(request):
+    """
+    (user_id, video_id) del stream, o None si no es válido.
+
+    "Authorization: Token <key>" abre el de todos los videos del
+    usuario. EventSource no permite headers: ?token= es un token firmado
+    y de corta duración para un solo video (VideoViewSet.stream_token),
+    así la credencial de la API no queda en URLs ni en logs.
+    """
+    keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+    if keyword != "Token":
+        return read_stream_token(request.GET.get("token", ""))
+
+    try:
+        token = await Token.objects.select_related("user").aget(key=key)
+    except Token.DoesNotExist:
+        return None
+    return (token.user.id, None) if token.user.is_active else None
+
+
+@require_GET
+async def video_events(request):
+    """
+    Stream SSE con los cambios de status y progreso de los videos del
+    usuario, a medida que los publican las tasks. Corre en el proceso
+    ASGI (core.asgi); el resto de la API, en WSGI.
+
+    Cada evento trae una versión (id del SSE); al reconectar, el
+    Last-Event-ID (o ?last_event_id=) hace que solo lleguen los
+    estados posteriores.
+    """
+    stream = await authenticate_stream(request)
+    if stream is None:
+        return JsonResponse(
+            {"detail": "Las credenciales de autenticación no se proveyeron."},
+            status=401,
+        )
+
+    try:
+        last_version = int(
+            request.headers.get("Last-Event-ID")
+            or request.GET.get("last_event_id")
+            or 0
+        )
+    except ValueError:
+        return JsonResponse({"detail": "Last-Event-ID inválido"}, status=400)
+
+    user_id, video_id = stream
+    response = StreamingHttpResponse(
+        stream_events(user_id, last_version, video_id), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # que nginx no junte los eventos en buffer
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+# ==============================
+# MÉTRICAS (PROMETHEUS)
+# ==============================
+
+
+@require_GET
+def video_metrics(request):
+    """
+    Tiempos agregados del procesamiento en formato Prometheus.
+    Con METRICS_TOKEN configurado pide "Authorization: Bearer <token>".
+    """
+    if settings.METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse(status=401)
+
+    return HttpResponse(
+        render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# ==============================
+# ARCHIVOS LOCALES (MEDIA_STORE=local)
+# ==============================
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Assets del almacenamiento local. Atiende Range para que los
+    reproductores puedan adelantar sin bajar el video entero.
+    """
+    return media_file_response(request, path)
+
+
+@csrf_exempt
+@require_http_methods(["PUT"])
+def upload_media(request, token):
+    """
+    Destino de la subida directa con MEDIA_STORE=local: el cuerpo del
+    PUT es el archivo. La URL firmada (LocalMediaStore.sign_direct_upload)
+    hace de credencial; después se confirma con el ticket.
+    """
+    max_size = VideoUploadSerializer.MAX_FILE_SIZE
+    too_large = f"El archivo no puede exceder {max_size // (1024*1024)} MB"
+    if int(request.headers.get("Content-Length") or 0) > max_size:
+        return JsonResponse({"detail": too_large}, status=413)
+
+    try:
+        resource = get_media_store().receive_direct_upload(token, request, max_size)
+    except MediaNotFound:
+        raise Http404
+    except FileExistsError:
+        return JsonResponse({"detail": "El archivo ya fue subido"}, status=409)
+    except MediaTooLarge:
+        return JsonResponse({"detail": too_large}, status=413)
+
+    logger.info(f"📥 Subida directa local: {resource['public_id']}")
+    return JsonResponse(resource, status=201)